@@ -0,0 +1,58 @@
+"""
+Measures writing the blockdiag code of a large timeline graph to a file and
+building it as one string.
+
+Run it from the repository root with
+
+    python benchmarks/bench_blockdiag_code.py [number of edges]
+"""
+import os
+import sys
+import random
+import tempfile
+import timeit
+
+from sphinxplugin.timeline_graph import TimelineGraph
+from sphinxplugin.backends import BlockdiagBackend
+
+
+def make_graph(num_edges, seed=0):
+    rnd = random.Random(seed)
+    num_nodes = max(2, num_edges // 3)
+    graph = TimelineGraph()
+    for i in range(num_nodes):
+        graph.add_node(
+            'task-{}'.format(i), 'task {}'.format(i), 'task-{}'.format(i),
+            important=rnd.random() < .1)
+    edges = set()
+    while len(edges) < num_edges:
+        target = rnd.randint(1, num_nodes - 1)
+        edges.add((rnd.randint(0, target - 1), target))
+    for source, target in sorted(edges):
+        graph.add_edge('task-{}'.format(source), 'task-{}'.format(target))
+    return graph
+
+
+def main(num_edges):
+    graph = make_graph(num_edges)
+    backend = BlockdiagBackend()
+    fd, path = tempfile.mkstemp(suffix='.diag')
+    os.close(fd)
+
+    def write():
+        with open(path, 'wb') as f:
+            backend.write_code(graph, f)
+
+    try:
+        for label, run in [
+                ('string', lambda: backend.code(graph)),
+                ('file sink', write)]:
+            best = min(timeit.Timer(run).repeat(3, 1))
+            print '{:10s} {:6d} edges: {:8.2f} ms'.format(
+                label, num_edges, best * 1000)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 30000)
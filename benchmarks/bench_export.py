@@ -0,0 +1,34 @@
+"""
+Compares the `timeline` export builder with the HTML build of the same
+sources.
+
+Run it from the repository root with
+
+    python benchmarks/bench_export.py [source directory]
+"""
+import sys
+import time
+
+from sphinx_testing import TestApp
+
+
+def build(srcdir, buildername):
+    app = TestApp(
+        srcdir=srcdir, buildername=buildername, copy_srcdir_to_tmpdir=True,
+        status=None, warning=None)
+    try:
+        start = time.time()
+        app.builder.build_all()
+        return time.time() - start
+    finally:
+        app.cleanup()
+
+
+def main(srcdir):
+    for buildername in ['html', 'timeline']:
+        best = min(build(srcdir, buildername) for i in range(3))
+        print '{:8s} build: {:8.2f} ms'.format(buildername, best * 1000)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else 'tests/docs/complete')
@@ -0,0 +1,57 @@
+"""
+Measures the Monte Carlo forecast on a random dependency graph of tasks.
+
+Run it from the repository root with
+
+    python benchmarks/bench_forecast.py [number of tasks]
+"""
+import sys
+import random
+import timeit
+
+from sphinxplugin.timeline_chunk import TimelineChunksContainer, TimelineChunk
+from sphinxplugin.submodule_node import SubmoduleNode
+from sphinxplugin import forecast
+
+
+class Parent(object):
+
+    def __init__(self, ids):
+        self.attributes = {'ids': ids}
+
+
+def make_tasks(num_tasks, fan_in=3, seed=0):
+    rnd = random.Random(seed)
+    tcs = TimelineChunksContainer()
+    nodes = []
+    for i in range(num_tasks):
+        name = 'task-{}'.format(i)
+        tc = TimelineChunk(Parent([name]), name, name)
+        tc.time_deltas = [rnd.randint(30, 2400)]
+        if rnd.random() < 0.5:
+            tc.completeness = {0: rnd.random()}
+            tc.worked_minutes = {0: rnd.randint(1, 3000)}
+        tcs.chunks[name] = tc
+        sn = SubmoduleNode(tcs, name)
+        sn.resolved = True
+        for j in range(min(i, rnd.randint(0, fan_in))):
+            sn.children.append(nodes[rnd.randint(max(0, i - 50), i - 1)])
+        nodes.append(sn)
+    return nodes
+
+
+def main(num_tasks, samples=1000):
+    if forecast.numpy is None:
+        print "NumPy is not installed."
+        return
+
+    nodes = make_tasks(num_tasks)
+    targets = [nodes[-10:], nodes[-100:-50]]
+    timer = timeit.Timer(lambda: forecast.forecast(targets, samples))
+    best = min(timer.repeat(3, 1))
+    print 'forecast {:6d} tasks, {:6d} samples: {:8.2f} ms'.format(
+        num_tasks, samples, best * 1000)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,104 @@
+"""
+Compares the size of the timeline chunks with typed per-submodule arrays to
+the previous layout with one dictionary per field.
+
+Run it from the repository root with
+
+    python benchmarks/bench_memory.py [number of submodules]
+"""
+import sys
+import random
+import timeit
+import cPickle as pickle
+from datetime import datetime, timedelta
+
+from sphinxplugin.timeline_chunk import TimelineChunk
+
+
+SUBMODULES_PER_CHUNK = 4
+
+
+class DictChunk(object):
+    """
+    the previous layout of the timeline chunks.
+    """
+
+    def __init__(self, title):
+        self.container = None
+        self.parent = None
+        self.title = title
+        self.name = title
+        self.docname = 'tasks'
+        self.time_deltas = []
+        self.dependencies = {}
+        self.submodules = {}
+        self.worked_minutes = {}
+        self.start_times = {}
+        self.end_times = {}
+        self.completeness = {}
+        self.stats = {}
+
+
+def make_chunks(chunk_type, num_submodules, seed=0):
+    rnd = random.Random(seed)
+    now = datetime(2015, 1, 1)
+    chunks = []
+    for i in range(num_submodules // SUBMODULES_PER_CHUNK):
+        title = 'task-{}'.format(i)
+        if chunk_type is TimelineChunk:
+            tc = TimelineChunk(None, title, title, 'tasks')
+        else:
+            tc = DictChunk(title)
+        tc.time_deltas = [
+            rnd.randint(30, 2400) for j in range(SUBMODULES_PER_CHUNK)]
+        worked, start, end, done = {}, {}, {}, {}
+        for j in range(SUBMODULES_PER_CHUNK):
+            worked[j] = rnd.randint(0, 3000)
+            start[j] = now + timedelta(minutes=rnd.randint(0, 500000))
+            end[j] = start[j] + timedelta(minutes=rnd.randint(0, 50000))
+            done[j] = rnd.random()
+        tc.worked_minutes = worked
+        tc.start_times = start
+        tc.end_times = end
+        tc.completeness = done
+        chunks.append(tc)
+    return chunks
+
+
+def deep_size(obj, seen=None):
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen)
+                    for k, v in obj.iteritems())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_size(v, seen) for v in obj)
+    if hasattr(obj, '__dict__'):
+        size += deep_size(obj.__dict__, seen)
+    for cls in type(obj).__mro__:
+        for slot in getattr(cls, '__slots__', ()):
+            if hasattr(obj, slot):
+                size += deep_size(getattr(obj, slot), seen)
+    return size
+
+
+def main(num_submodules):
+    for name, chunk_type in [('dicts', DictChunk), ('arrays', TimelineChunk)]:
+        chunks = make_chunks(chunk_type, num_submodules)
+        data = pickle.dumps(chunks, pickle.HIGHEST_PROTOCOL)
+        dump = min(timeit.Timer(
+            lambda: pickle.dumps(chunks, pickle.HIGHEST_PROTOCOL))
+            .repeat(3, 1))
+        load = min(timeit.Timer(lambda: pickle.loads(data)).repeat(3, 1))
+        print ('{:6} {:6d} submodules: {:8.2f} MB in memory, '
+               '{:8.2f} MB pickled, dump {:7.2f} ms, load {:7.2f} ms'.format(
+                   name, num_submodules, deep_size(chunks) / 1e6,
+                   len(data) / 1e6, dump * 1000, load * 1000))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,52 @@
+"""
+Measures rendering the diagrams of many timelines with one and with several
+render workers.
+
+Run it from the repository root with
+
+    python benchmarks/bench_render.py [number of timelines] [workers]
+"""
+import sys
+import shutil
+import random
+import tempfile
+import time
+import multiprocessing
+
+from sphinxplugin.rendering import DiagramCache, RenderConfig, render_jobs
+
+
+def make_code(num_tasks, rnd):
+    lines = ['orientation = portrait']
+    for i in range(1, num_tasks):
+        lines.append('task{} -> task{}'.format(rnd.randint(0, i - 1), i))
+    return 'blockdiag {{\n\t{}\n}}\n'.format('\n\t'.join(lines))
+
+
+def render(codes, config, workers):
+    directory = tempfile.mkdtemp()
+    try:
+        cache = DiagramCache(directory)
+        start = time.time()
+        jobs = [(key, 'SVG', codename) for key, codename in (
+            cache.write_code('SVG', config, lambda sink: sink.write(code))
+            for code in codes)]
+        render_jobs(cache, config, jobs, workers)
+        return time.time() - start
+    finally:
+        shutil.rmtree(directory)
+
+
+def main(num_timelines, workers):
+    rnd = random.Random(0)
+    codes = [make_code(20, rnd) for i in range(num_timelines)]
+    config = RenderConfig(False, False, None, None)
+    for n in sorted(set([1, workers])):
+        print '{:3d} timelines, {:2d} workers: {:8.2f} ms'.format(
+            num_timelines, n, render(codes, config, n) * 1000)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 36,
+         int(sys.argv[2]) if len(sys.argv) > 2
+         else multiprocessing.cpu_count())
@@ -0,0 +1,76 @@
+"""
+Measures writing a random project to the SQLite store and querying it.
+
+Run it from the repository root with
+
+    python benchmarks/bench_sqlite.py [number of tasks]
+"""
+import os
+import sys
+import random
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+from sphinxplugin.timeline_chunk import TimelineChunksContainer, TimelineChunk
+from sphinxplugin.sqlite_store import TimelineStore
+
+
+class Parent(object):
+
+    def __init__(self, ids):
+        self.attributes = {'ids': ids}
+
+
+def make_tasks(num_tasks, fan_in=3, entries=5, seed=0):
+    rnd = random.Random(seed)
+    tcs = TimelineChunksContainer()
+    start = datetime(2015, 1, 1)
+    for i in range(num_tasks):
+        name = 'task-{}'.format(i)
+        tc = TimelineChunk(
+            Parent([name]), name, name, 'doc{}'.format(i // 100), tcs)
+        tc.time_deltas = [rnd.randint(30, 2400)]
+        tc.dependencies = {0: [
+            'task-{}'.format(rnd.randint(max(0, i - 50), i - 1))
+            for j in range(min(i, rnd.randint(0, fan_in)))]}
+        for j in range(rnd.randint(0, entries)):
+            tc._parse_worked_on_line(
+                '{:%Y-%m-%d}: {}min {}%'.format(
+                    start + timedelta(days=rnd.randint(0, 365)),
+                    rnd.randint(10, 240), rnd.randint(0, 100)), 0)
+        tcs._register_chunk(name, tc)
+    return tcs
+
+
+def main(num_tasks):
+    tcs = make_tasks(num_tasks)
+    directory = tempfile.mkdtemp()
+    store = TimelineStore(os.path.join(directory, 'timeline.sqlite'))
+
+    timer = timeit.Timer(lambda: store.update(tcs))
+    print 'write  {:6d} tasks: {:8.2f} ms'.format(
+        num_tasks, min(timer.repeat(1, 1)) * 1000)
+
+    with store.connection:
+        store.connection.executemany(
+            'INSERT INTO milestones VALUES (?, ?, ?, ?, ?, ?)',
+            [('index', 'milestone', 1, 'task-{}'.format(i), 0, None)
+             for i in range(num_tasks - 10, num_tasks)])
+
+    for label, query in [
+            ('open tasks blocking milestone 1',
+             lambda: store.open_tasks_blocking(1)),
+            ('hours logged in a week',
+             lambda: store.hours_logged(
+                 datetime(2015, 6, 1), datetime(2015, 6, 8)))]:
+        best = min(timeit.Timer(query).repeat(5, 1))
+        print '{:32s}: {:8.2f} ms'.format(label, best * 1000)
+
+    store.close()
+    os.remove(store.path)
+    os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
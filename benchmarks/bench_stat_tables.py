@@ -0,0 +1,46 @@
+"""
+Compares the pure python and the NumPy implementation of the stat table
+computations.
+
+Run it from the repository root with
+
+    python benchmarks/bench_stat_tables.py [number of rows]
+"""
+import sys
+import random
+import timeit
+from datetime import datetime
+
+from sphinxplugin import utils
+
+
+def make_meta(rows, seed=0):
+    rnd = random.Random(seed)
+    return [{
+        'time_req': rnd.randint(1, 6000),
+        'minutes_worked': rnd.randint(0, 9000),
+        'done': rnd.random(),
+        'time_worked': rnd.random() * 200,
+    } for i in range(rows)]
+
+
+def main(rows):
+    if utils.numpy is None:
+        print "NumPy is not installed."
+        return
+
+    meta = make_meta(rows)
+    names = ['Task {}'.format(i + 1) for i in range(rows)]
+    now = datetime.now()
+    assert (utils._make_descriptions_python(meta, names, now)
+            == utils._make_descriptions_numpy(meta, names, now))
+
+    for engine in ['python', 'numpy']:
+        func = getattr(utils, '_make_descriptions_{}'.format(engine))
+        timer = timeit.Timer(lambda: func(meta, names, now))
+        best = min(timer.repeat(5, 1))
+        print '{:8} {:6d} rows: {:8.2f} ms'.format(engine, rows, best * 1000)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,56 @@
+"""
+Measures rolling up the work stats of random projects with heavy fan-in,
+where the dependency sets of most tasks overlap.
+
+Run it from the repository root with
+
+    python benchmarks/bench_stats_scaling.py [number of tasks] [fan-in]
+"""
+import sys
+import random
+import timeit
+
+from sphinxplugin.timeline_chunk import TimelineChunksContainer, TimelineChunk
+from sphinxplugin.nodes import TimelineNode
+
+
+class Parent(object):
+
+    def __init__(self, ids):
+        self.attributes = {'ids': ids}
+
+
+def make_tasks(num_tasks, fan_in, seed=0):
+    rnd = random.Random(seed)
+    tcs = TimelineChunksContainer()
+    for i in range(num_tasks):
+        name = 'task-{}'.format(i)
+        tc = TimelineChunk(Parent([name]), name, name, 'doc', tcs)
+        tc.time_deltas = [rnd.randint(30, 2400)]
+        tc.dependencies = {0: [
+            'task-{}'.format(rnd.randint(0, i - 1))
+            for j in range(min(i, fan_in))]}
+        tcs._register_chunk(name, tc)
+    tcs.update_aliases()
+    return tcs
+
+
+def resolve(tcs):
+    tn = TimelineNode()
+    tn.resolve_all_dependencies(tcs)
+    # recompute all stats
+    tcs.stats_cache = {}
+    tn.resolve_all_stats(tcs)
+
+
+def main(num_tasks, fan_in):
+    for n in [num_tasks // 4, num_tasks // 2, num_tasks]:
+        tcs = make_tasks(n, fan_in)
+        best = min(timeit.Timer(lambda: resolve(tcs)).repeat(3, 1))
+        print '{:6d} tasks, fan-in {}: {:8.2f} ms'.format(
+            n, fan_in, best * 1000)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 3)
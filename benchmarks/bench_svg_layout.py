@@ -0,0 +1,37 @@
+"""
+Measures the layered layout and SVG writer on a random layered DAG.
+
+Run it from the repository root with
+
+    python benchmarks/bench_svg_layout.py [number of nodes]
+"""
+import sys
+import random
+import timeit
+
+from sphinxplugin.timeline_graph import TimelineGraph
+from sphinxplugin import svg_writer
+
+
+def make_graph(num_nodes, fan_in=3, seed=0):
+    rnd = random.Random(seed)
+    graph = TimelineGraph()
+    ids = ['task-{}'.format(i) for i in range(num_nodes)]
+    for i, node_id in enumerate(ids):
+        graph.add_node(node_id, 'Task {}'.format(i), href=node_id,
+                       important=rnd.random() < 0.1)
+        for j in range(min(i, rnd.randint(0, fan_in))):
+            graph.add_edge(ids[rnd.randint(max(0, i - 50), i - 1)], node_id)
+    return graph
+
+
+def main(num_nodes):
+    graph = make_graph(num_nodes)
+    timer = timeit.Timer(lambda: svg_writer.write_svg(graph))
+    best = min(timer.repeat(3, 1))
+    print 'svg {:6d} nodes, {:6d} edges: {:8.2f} ms'.format(
+        len(graph.nodes), len(graph.edges), best * 1000)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,44 @@
+"""
+Measures the parsing of worked-on lines.
+
+Run it from the repository root with
+
+    python benchmarks/bench_worked_on.py [number of lines]
+"""
+import sys
+import random
+import timeit
+from datetime import datetime, timedelta
+
+from sphinxplugin.timeline_chunk import TimelineChunk
+from sphinxplugin import utils
+
+
+def make_lines(num_lines, seed=0):
+    rnd = random.Random(seed)
+    start = datetime(2015, 1, 1)
+    formats = ['%Y-%m-%d', '%d/%m/%y', '%m/%d/%Y', '%B %d, %Y']
+    lines = []
+    for i in range(num_lines):
+        day = start + timedelta(rnd.randint(0, 1000))
+        lines.append('{}: {}h {}min {}%'.format(
+            day.strftime(rnd.choice(formats)), rnd.randint(0, 8),
+            rnd.randint(0, 59), rnd.randint(0, 100)))
+    return lines
+
+
+def main(num_lines):
+    lines = make_lines(num_lines)
+
+    def parse():
+        utils._date_cache.clear()
+        tc = TimelineChunk(None)
+        for line in lines:
+            tc._parse_worked_on_line(line, 0)
+
+    best = min(timeit.Timer(parse).repeat(3, 1))
+    print 'worked-on {:6d} lines: {:8.2f} ms'.format(num_lines, best * 1000)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
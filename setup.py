@@ -34,4 +34,7 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     install_requires=requires,
+    extras_require={
+        'numpy': ['numpy'],
+    },
 )
@@ -0,0 +1,177 @@
+import functools
+from StringIO import StringIO
+
+import docutils
+import sphinxcontrib.blockdiag
+
+from . import rendering
+from . import svg_writer
+
+
+class DiagramBackend(object):
+    """
+    Base class of the timeline diagram backends.
+
+    A backend turns the resolved TimelineGraph of a timeline into the docutils
+    node that replaces the diagram in the document.  The backend is selected
+    with the `timeline_diagram_backend` config value, which is either the
+    name of a registered backend or a DiagramBackend instance.
+    """
+
+    name = None
+
+    def prepare(self, app, timelines):
+        """
+        called with the resolved timelines of the build by docname before
+        any document is written, e.g. to render the diagrams ahead.
+        """
+        pass
+
+    def render(self, app, fromdocname, graph, ids):
+        """
+        returns the docutils node showing `graph` in the document
+        `fromdocname`.  `ids` are the ids of the replaced timeline node.
+        """
+        raise NotImplementedError
+
+
+class BlockdiagBackend(DiagramBackend):
+    """
+    renders the timeline with blockdiag.
+    """
+
+    name = 'blockdiag'
+
+    def node_line(self, node_id, node, resolve=None):
+        options = []
+        if node['group']:
+            options.append('group = "{}"'.format(node['group']))
+        if node['important']:
+            options.append('linecolor = "red"')
+        options.append('label = "{}"'.format(node['label']))
+        if node['href'] and resolve is None:
+            options.append('href = ":ref:`{}`"'.format(node['href']))
+        elif node['href']:
+            uri = resolve(node['href'])
+            if uri is not None:
+                options.append('href = "{}"'.format(uri))
+        return '{} [{}]'.format(node_id, ', '.join(options))
+
+    def edge_line(self, source, target, important):
+        ret = '{} -> {}'.format(source, target)
+        if important:
+            ret += ' [color = "red"]'
+        return ret
+
+    def group_lines(self, group):
+        return [
+            'group {}'.format(group['id']) + ' {',
+            '  label = "{}"'.format(group['label']),
+            '  color = "{}"'.format(group['color']),
+            '}']
+
+    def iter_lines(self, graph, resolve=None):
+        """
+        yields the lines of the blockdiag code of `graph`, every node and
+        edge of the graph exactly once.
+
+        `resolve` returns the URI of a reference target, or None to drop the
+        href.  Without it the hrefs are written as `:ref:` roles.
+        """
+        yield 'orientation = portrait'
+        yield ''
+        for node_id in sorted(graph.nodes):
+            yield self.node_line(node_id, graph.nodes[node_id], resolve)
+        for group in graph.groups:
+            for line in self.group_lines(group):
+                yield line
+        for edge in graph.edges:
+            yield self.edge_line(*edge)
+
+    def write_code(self, graph, sink, resolve=None):
+        """
+        writes the blockdiag code of `graph` line by line to the file-like
+        `sink`.
+        """
+        sink.write('blockdiag {\n')
+        for line in self.iter_lines(graph, resolve):
+            sink.write('\t')
+            sink.write(line)
+            sink.write('\n')
+        sink.write('}\n')
+
+    def code(self, graph):
+        """
+        returns the blockdiag code of `graph`, for the builders rendering it
+        with sphinxcontrib.blockdiag.
+
+        The nodes are sorted, so an unchanged timeline always results in the
+        same code and its rendered diagram can be taken from the cache.
+        """
+        sink = StringIO()
+        self.write_code(graph, sink)
+        return sink.getvalue()
+
+    def prepare(self, app, timelines):
+        if app.builder.format in ('html', 'slides'):
+            rendering.render_diagrams(app, (
+                (docname,
+                 functools.partial(self.write_code, timelines[docname].graph))
+                for docname in sorted(timelines)))
+
+    def render(self, app, fromdocname, graph, ids):
+        if app.builder.format in ('html', 'slides'):
+            return rendering.render_html(
+                app, fromdocname, functools.partial(self.write_code, graph),
+                ids)
+
+        # resolved by sphinxcontrib.blockdiag.on_doctree_resolved
+        code = self.code(graph)
+        node = sphinxcontrib.blockdiag.blockdiag_node()
+        node.code = code
+        node['code'] = code
+        node['options'] = {}
+        node['ids'] = ids
+        return node
+
+
+class SvgBackend(DiagramBackend):
+    """
+    writes the timeline as inline SVG with the layered layout of
+    `svg_writer`.  Builders other than html fall back to blockdiag.
+    """
+
+    name = 'svg'
+
+    def render(self, app, fromdocname, graph, ids):
+        if app.builder.format not in ('html', 'slides'):
+            return BlockdiagBackend().render(app, fromdocname, graph, ids)
+
+        svg = svg_writer.write_svg(
+            graph,
+            lambda target: rendering.resolve_reference(
+                app.builder, fromdocname, target))
+        spans = ''.join('<span id="{}"></span>'.format(i) for i in ids)
+        return docutils.nodes.raw(
+            '', u'<div>{}{}</div>\n'.format(spans, svg), format='html')
+
+
+BACKENDS = {
+    BlockdiagBackend.name: BlockdiagBackend,
+    SvgBackend.name: SvgBackend,
+}
+
+
+def get_backend(config):
+    """
+    returns the diagram backend selected by `config.timeline_diagram_backend`.
+    """
+    backend = config.timeline_diagram_backend
+    if isinstance(backend, DiagramBackend):
+        return backend
+    try:
+        return BACKENDS[backend]()
+    except KeyError:
+        raise ValueError(
+            'Unknown timeline diagram backend {!r}, use one of {}.'
+            .format(backend, ', '.join(sorted(BACKENDS))))
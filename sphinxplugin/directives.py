@@ -75,6 +75,8 @@ class TimelineRequestedDirective(TimelineChunksDirective):
 
         ttsn = TaskTableSummaryNode()
         ttsn.set_chunk(chunk.title)
+        env = self.state.document.settings.env
+        env.timeline_chunks.add_table_doc(env.docname, chunk.key)
 
         return [ttsn]
 
@@ -87,6 +89,8 @@ class TimelineRequestedDirective(TimelineChunksDirective):
 
         ttsn = TaskTableSummaryNode()
         ttsn.set_chunk(chunk.title)
+        env = inliner.document.settings.env
+        env.timeline_chunks.add_table_doc(env.docname, chunk.key)
 
         return [ttsn], []
 
@@ -151,10 +155,20 @@ class TimelineDirective(docutils.parsers.rst.Directive):
         timeline = TimelineNode()
         results = [timeline]
 
+        timeline.milestones = []
         for milestones_section in milestones_sections:
             timeline.add_milestones_from_section(milestones_section)
 
+        timeline.deadlines = []
         for deadline_section in deadlines_sections:
             timeline.add_deadlines_from_section(deadline_section)
 
+        # the timeline is resolved from the registry after all documents
+        # were read, see processing.resolve_timelines
+        env = self.state.document.settings.env
+        if not hasattr(env, 'timeline_chunks'):
+            env.timeline_chunks = TimelineChunksContainer()
+        env.timeline_chunks.add_timeline_doc(
+            env.docname, timeline.milestones, timeline.deadlines)
+
         return results
@@ -0,0 +1,196 @@
+"""
+Binary store of the individual worked-on entries of a build.
+
+The store is an append-only file of fixed-width little-endian records, one
+per entry, with the task id, the submodule, the epoch minute (MISSING_INT
+without a date), the worked minutes and the completeness (NaN if not given)
+of the entry.  The entries of a task are appended at once, so they are
+contiguous.  A JSON index next to it lists the task names, whose positions
+are the task ids, and the first record and the number of records of every
+task.
+
+The store and its index are written to temporary files next to them and
+renamed into place, the index last, so a reader that mapped the store of an
+earlier build keeps reading it unchanged.
+
+The store is read with a memory map and does not need the pickled Sphinx
+environment.  With NumPy, the entries of a task are a structured array
+viewing the map without copying it.
+"""
+import json
+import mmap
+import os
+import struct
+
+from .submodule_array import MISSING_INT, from_epoch_minutes
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+MAGIC = 'TLENTRY1'
+RECORD = struct.Struct('<iiiif')
+INDEX_SUFFIX = '.idx'
+
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+
+def temporary_path(path):
+    return '{}.{}.tmp'.format(path, os.getpid())
+
+
+class EntryWriter(object):
+    """
+    appends the entries of tasks to a new store, which replaces the store
+    `path` when the writer is closed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tasks = []
+        self.index = []
+        self.count = 0
+        self.f = open(temporary_path(path), 'wb')
+        self.f.write(MAGIC)
+
+    def append_task(self, name, entries):
+        """
+        appends the entries of the task `name`, a flat sequence of the
+        submodule, the epoch minute, the minutes and the completeness of
+        every entry, and returns its task id.
+        """
+        task = len(self.tasks)
+        count = len(entries) // 4
+        pack = RECORD.pack
+        self.f.write(''.join(
+            pack(task, int(entries[i]), int(entries[i + 1]),
+                 int(entries[i + 2]), entries[i + 3])
+            for i in xrange(0, count * 4, 4)))
+        self.tasks.append(name)
+        self.index.append((self.count, count))
+        self.count += count
+        return task
+
+    def close(self):
+        """
+        moves the new store and then its index into place.
+        """
+        self.f.close()
+        index = temporary_path(index_path(self.path))
+        with open(index, 'wb') as f:
+            json.dump({'tasks': self.tasks, 'index': self.index}, f)
+        os.rename(self.f.name, self.path)
+        os.rename(index, index_path(self.path))
+
+    def discard(self):
+        """
+        removes the new store, keeping the store `path` as it is.
+        """
+        self.f.close()
+        os.remove(self.f.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class EntryStore(object):
+    """
+    memory maps the store `path` for reading.
+    """
+
+    def __init__(self, path):
+        with open(index_path(path), 'rb') as f:
+            index = json.load(f)
+        self.tasks = index['tasks']
+        self.index = [tuple(item) for item in index['index']]
+        self.ids = dict((name, task) for task, name in enumerate(self.tasks))
+        self.count = sum(count for start, count in self.index)
+        self.f = open(path, 'rb')
+        self.map = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError('{} is no timeline entry store'.format(path))
+
+    def close(self):
+        self.map.close()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _span(self, task):
+        if isinstance(task, basestring):
+            task = self.ids[task]
+        start, count = self.index[task]
+        return len(MAGIC) + start * RECORD.size, count
+
+    def entries(self, task):
+        """
+        returns the entries of the task `task`, given by its id or name, as a
+        NumPy structured array sharing the memory of the map.  Needs NumPy.
+        """
+        offset, count = self._span(task)
+        if count == 0:
+            return numpy.zeros(0, dtype=entry_dtype())
+        return numpy.frombuffer(
+            self.map, dtype=entry_dtype(), count=count, offset=offset)
+
+    def buffer(self, task):
+        """
+        returns the records of the task `task` as a buffer of the map.
+        """
+        offset, count = self._span(task)
+        if count == 0:
+            return buffer('')
+        return buffer(self.map, offset, count * RECORD.size)
+
+    def iter_entries(self, task):
+        """
+        yields the submodule, the date, the worked minutes and the
+        completeness of the entries of the task `task`.  Missing values are
+        None.
+        """
+        offset, count = self._span(task)
+        for i in xrange(count):
+            _, submodule, minute, minutes, done = RECORD.unpack_from(
+                self.map, offset + i * RECORD.size)
+            yield (
+                submodule,
+                None if minute == MISSING_INT else from_epoch_minutes(minute),
+                minutes,
+                None if done != done else done)
+
+
+def entry_dtype():
+    return numpy.dtype([
+        ('task', '<i4'), ('submodule', '<i4'), ('minute', '<i4'),
+        ('minutes', '<i4'), ('done', '<f4')])
+
+
+def write_entry_store(path, tcs):
+    """
+    writes the entries of all timeline chunks of the container `tcs` to the
+    store `path`, the tasks ordered by their keys.
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with EntryWriter(path) as writer:
+        for key in sorted(tcs.chunks):
+            writer.append_task(key, tcs.chunks[key].entries)
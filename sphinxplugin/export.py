@@ -0,0 +1,237 @@
+"""
+The `timeline` builder exporting the resolved timelines for dashboards.
+
+It resolves the timeline of every document with a timeline directive like
+the HTML build, but writes neither HTML nor diagrams.  The timelines are
+resolved when writing instead of after reading, as the records need the
+submodule nodes that are not kept in the snapshot.  The results are
+streamed to files in the output directory:
+
+* `timeline.jsonl`: one JSON object per line for every submodule, dependency
+  edge, milestone and deadline, with its `type` and its `timeline` document,
+* `submodules.csv`: the stats and the schedule of every submodule,
+* `milestones.csv`: the rollups, ETAs and forecasts of the milestones and
+  deadlines.
+"""
+import csv
+import json
+import os
+
+from sphinx.builders import Builder
+
+from .forecast import PERCENTILES
+from .nodes import AT_RISK
+from .processing import resolve_timelines
+
+
+SUBMODULE_FIELDS = [
+    'timeline', 'id', 'task', 'submodule', 'title', 'docname',
+    'requested_hours', 'worked_hours', 'done', 'start_time', 'end_time',
+    'total_requested_hours', 'total_worked_hours', 'total_done',
+    'earliest_start', 'earliest_finish', 'latest_start', 'latest_finish',
+    'slack', 'critical', 'dependencies',
+]
+
+MILESTONE_FIELDS = [
+    'timeline', 'kind', 'number', 'label', 'date', 'tasks',
+    'requested_hours', 'worked_hours', 'done', 'days_worked',
+    'critical_path_eta', 'at_risk',
+] + ['forecast_p{}'.format(p) for p in PERCENTILES]
+
+
+def _isoformat(time):
+    return None if time is None else time.isoformat()
+
+
+def submodule_records(docname, tcs):
+    """
+    yields the records of the resolved submodules of the container `tcs`
+    for the timeline of the document `docname`, sorted by their ids.
+    """
+    nodes = sorted(
+        (sn for sn in tcs.submodule_nodes if sn.stats),
+        key=lambda sn: sn.get_full_id())
+    for sn in nodes:
+        tc = sn.timechunk
+        num = sn.submodule
+        schedule = sn.schedule or {}
+        yield {
+            'type': 'submodule',
+            'timeline': docname,
+            'id': sn.get_full_id(),
+            'task': tc.key,
+            'submodule': num + 1,
+            'title': sn.get_title_with_submodule(),
+            'docname': tc.docname,
+            'requested_hours': tc.get_requested_time(num) / 60.,
+            'worked_hours': tc.get_worked_minutes(num) / 60.,
+            'done': float(tc.get_completeness(num)),
+            'start_time': _isoformat(tc.start_times.get(num)),
+            'end_time': _isoformat(tc.end_times.get(num)),
+            'total_requested_hours': sn.total_stats['time_req'] / 60.,
+            'total_worked_hours': sn.total_stats['minutes_worked'] / 60.,
+            'total_done': (
+                float(sn.total_stats['done_time'])
+                / sn.total_stats['time_req']
+                if sn.total_stats['time_req'] else 0.),
+            'earliest_start': schedule.get('es'),
+            'earliest_finish': schedule.get('ef'),
+            'latest_start': schedule.get('ls'),
+            'latest_finish': schedule.get('lf'),
+            'slack': schedule.get('slack'),
+            'critical': bool(sn.important),
+            'dependencies': sorted(
+                child.get_full_id() for child in sn.children),
+        }
+
+
+def edge_records(docname, tcs):
+    """
+    yields a record for every resolved dependency of the container `tcs`.
+    """
+    nodes = sorted(
+        (sn for sn in tcs.submodule_nodes if sn.stats),
+        key=lambda sn: sn.get_full_id())
+    for sn in nodes:
+        for child in sorted(sn.children, key=lambda c: c.get_full_id()):
+            yield {
+                'type': 'edge',
+                'timeline': docname,
+                'from': child.get_full_id(),
+                'to': sn.get_full_id(),
+            }
+
+
+def milestone_records(docname, tn, meta, etas, forecasts):
+    """
+    yields the records of the milestones and deadlines of the resolved
+    timeline node `tn`.
+    """
+    targets = (
+        [('milestone', i + 1, item, nodes) for i, (item, nodes) in
+         enumerate(zip(tn.milestones, tn.milestone_nodes))]
+        + [('deadline', i + 1, item, nodes) for i, (item, nodes) in
+           enumerate(zip(tn.deadlines, tn.deadline_nodes))])
+    for (kind, number, item, nodes), stats, eta, percentiles in zip(
+            targets, meta, etas, forecasts):
+        at_risk = eta.endswith(AT_RISK)
+        if at_risk:
+            eta = eta[:-len(AT_RISK)]
+        record = {
+            'type': kind,
+            'timeline': docname,
+            'kind': kind,
+            'number': number,
+            'label': item['xref'],
+            'date': _isoformat(item['time']),
+            'tasks': [sn.get_full_id() for sn in nodes],
+            'requested_hours': stats['time_req'] / 60.,
+            'worked_hours': stats['minutes_worked'] / 60.,
+            'done': stats['done'],
+            'days_worked': stats['time_worked'],
+            'critical_path_eta': None if eta == 'undefined' else eta,
+            'at_risk': at_risk,
+        }
+        for p, value in zip(PERCENTILES, percentiles):
+            record['forecast_p{}'.format(p)] = (
+                None if value == 'undefined' else value)
+        yield record
+
+
+def _csv_row(record, fields):
+    row = []
+    for field in fields:
+        value = record.get(field)
+        if value is None:
+            value = ''
+        elif isinstance(value, list):
+            value = ';'.join(value)
+        elif isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        row.append(value)
+    return row
+
+
+class TimelineExportWriter(object):
+    """
+    streams the records of the timelines to the files in `outdir`.
+    """
+
+    def __init__(self, outdir):
+        if not os.path.isdir(outdir):
+            os.makedirs(outdir)
+        self.files = [
+            open(os.path.join(outdir, name), 'wb') for name in
+            ['timeline.jsonl', 'submodules.csv', 'milestones.csv']]
+        self.jsonl = self.files[0]
+        self.submodules = csv.writer(self.files[1])
+        self.milestones = csv.writer(self.files[2])
+        self.submodules.writerow(SUBMODULE_FIELDS)
+        self.milestones.writerow(MILESTONE_FIELDS)
+
+    def write(self, record):
+        self.jsonl.write(json.dumps(record, sort_keys=True))
+        self.jsonl.write('\n')
+        if record['type'] == 'submodule':
+            self.submodules.writerow(_csv_row(record, SUBMODULE_FIELDS))
+        elif record['type'] != 'edge':
+            self.milestones.writerow(_csv_row(record, MILESTONE_FIELDS))
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+
+class TimelineBuilder(Builder):
+    """
+    exports the resolved timelines as JSON Lines and CSV without writing
+    HTML or rendering diagrams.
+    """
+
+    name = 'timeline'
+    format = 'timeline'
+    epilog = 'The timeline exports are in %(outdir)s.'
+
+    def init(self):
+        pass
+
+    def get_outdated_docs(self):
+        return 'all timelines'
+
+    def get_target_uri(self, docname, typ=None):
+        return ''
+
+    def prepare_writing(self, docnames):
+        pass
+
+    def write_doc(self, docname, doctree):
+        pass
+
+    def write(self, build_docnames, updated_docnames, method='update'):
+        env = self.env
+        writer = TimelineExportWriter(self.outdir)
+        try:
+            if not hasattr(env, 'timeline_chunks'):
+                return
+            tcs = env.timeline_chunks
+            resolve_timelines(
+                self.app, tcs,
+                lambda docname, tn, meta, etas, forecasts:
+                self.write_timeline(
+                    writer, docname, tn, tcs, meta, etas, forecasts))
+        finally:
+            writer.close()
+
+    def write_timeline(self, writer, docname, tn, tcs, meta, etas,
+                       forecasts):
+        for records in [
+                submodule_records(docname, tcs),
+                edge_records(docname, tcs),
+                milestone_records(docname, tn, meta, etas, forecasts)]:
+            for record in records:
+                writer.write(record)
+
+    def finish(self):
+        pass
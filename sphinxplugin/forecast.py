@@ -0,0 +1,84 @@
+"""
+Monte Carlo forecast of the completion of milestones and deadlines.
+
+The work factor of a submodule is its worked minutes divided by the
+requested time that is done.  Every sample scales the remaining hours of a
+submodule with recorded work by its own work factor, times a noise drawn
+from the spread of all observed work factors around their geometric mean.
+Submodules without recorded work draw their factor from the observed work
+factors of the others.  The samples are propagated through the dependency
+graph like the earliest finish of the critical path method, for all samples
+at once.
+
+The forecast needs NumPy.
+"""
+from .scheduling import dependency_order, remaining_hours
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+PERCENTILES = [50, 80, 95]
+
+
+def work_factor(sn):
+    """
+    returns the work factor of the submodule node `sn`, or None if no work
+    on it has been recorded.
+    """
+    tc = sn.timechunk
+    done = float(tc.get_completeness(sn.submodule))
+    worked = float(tc.get_worked_minutes(sn.submodule))
+    requested = tc.get_requested_time(sn.submodule)
+    if done <= 0 or worked <= 0 or requested <= 0:
+        return None
+    return worked / (requested * done)
+
+
+def forecast(targets, samples=1000, seed=0):
+    """
+    returns the `PERCENTILES` of the hours until the submodules in each list
+    of `targets` are finished, estimated from `samples` random samples.
+
+    Without any recorded work, a work factor of 1 is assumed.  Returns None
+    if NumPy is not installed.
+    """
+    if numpy is None:
+        return None
+    nodes = [sn for target in targets for sn in target]
+    order = dependency_order(nodes)
+    position = dict((sn, i) for i, sn in enumerate(order))
+
+    factors = [work_factor(sn) for sn in order]
+    observed = numpy.array([f for f in factors if f is not None] or [1.])
+    spread = observed / numpy.exp(numpy.log(observed).mean())
+    # NaN for the submodules without recorded work
+    own = numpy.array([numpy.nan if f is None else f for f in factors])
+    remaining = numpy.array([remaining_hours(sn) for sn in order])
+
+    rnd = numpy.random.RandomState(seed)
+    draws = rnd.randint(len(observed), size=(len(order), samples))
+    durations = remaining[:, None] * numpy.where(
+        numpy.isnan(own)[:, None], observed[draws],
+        own[:, None] * spread[draws])
+
+    finish = numpy.empty_like(durations)
+    for i, sn in enumerate(order):
+        if sn.children:
+            children = [position[child] for child in sn.children]
+            numpy.add(
+                finish[children].max(axis=0), durations[i], out=finish[i])
+        else:
+            finish[i] = durations[i]
+
+    results = []
+    for target in targets:
+        if not target:
+            results.append([0.] * len(PERCENTILES))
+            continue
+        rows = [position[sn] for sn in target]
+        results.append(
+            list(numpy.percentile(finish[rows].max(axis=0), PERCENTILES)))
+    return results
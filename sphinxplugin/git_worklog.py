@@ -0,0 +1,215 @@
+"""
+Worked-on entries read from the `Worked-on:` trailers of git commits.
+
+A trailer names the task, the time worked and optionally the percentage done
+after the work, e.g.
+
+    Worked-on: Project timeline (II) 2h 60%
+
+or, like a worked-on line, with a colon after the task.  The date of the
+entry is the day of the commit.
+
+The log of the local repository set in the `timeline_git_worklog` config
+value is streamed from `git log`, no remote is contacted.  The trailers are
+cached in the timeline chunks container by the commit hash, and when the
+previous head is an ancestor of the current one only the new commits are
+read.  The entries are added to the timeline chunks like the rows of a
+worklog, see `worklog`, and only the documents defining the tasks named by
+new or removed commits are read again.
+"""
+import os
+import re
+import subprocess
+import tempfile
+from datetime import datetime
+
+from sphinx.util import logging
+
+from . import utils
+
+
+logger = logging.getLogger(__name__)
+
+trailer_re = re.compile(r'^\s*worked-on:\s*(.*?)\s*$', re.IGNORECASE)
+bare_number_re = re.compile(r'^(\d+(\.\d*)?|\.\d+)$')
+
+COMMIT_SEPARATOR = '\x1e'
+FIELD_SEPARATOR = '\x1f'
+
+
+def split_trailer(value):
+    """
+    returns the task, the time delta and the percentage done of the
+    `Worked-on:` trailer `value`.  Missing values are None.
+    """
+    done = None
+    match = utils.percent_re.search(value)
+    if match:
+        done = match.group(1)
+        value = value[:match.start()] + value[match.end():]
+
+    task, sep, time = value.partition(':')
+    if sep:
+        return task.strip(), time.strip() or None, done
+
+    # the time delta is the longest suffix of words that is a time delta and
+    # does not start with a number that belongs to the task, as in
+    # `milestone 2 3h`
+    words = value.split()
+    start = len(words)
+    for i in range(len(words) - 1, 0, -1):
+        suffix = ' '.join(words[i:])
+        if utils.scan_time_delta(suffix)[1] < len(suffix):
+            continue
+        if (bare_number_re.match(words[i])
+                and words[i + 1:i + 2] != []
+                and words[i + 1].lower() not in utils.TDELTA_UNITS):
+            continue
+        start = i
+    return ' '.join(words[:start]), ' '.join(words[start:]) or None, done
+
+
+def _git(repo, *args):
+    """
+    returns the output of the git command `args` in the repository `repo`,
+    or None if it fails.
+    """
+    try:
+        process = subprocess.Popen(
+            ('git',) + args, cwd=repo,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError:
+        return None
+    out, err = process.communicate()
+    if process.returncode != 0:
+        return None
+    return out
+
+
+class GitError(Exception):
+    """
+    raised if a git command fails.
+    """
+
+
+def iter_commits(repo, revisions):
+    """
+    yields the hash, the commit time and the `Worked-on:` trailer values of
+    the commits `revisions` of the repository `repo`, streaming the log.
+
+    Raises a GitError after the last commit if `git log` failed.
+    """
+    errors = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        ['git', 'log', '--format={0}%H{1}%ct{1}%B'.format(
+            COMMIT_SEPARATOR, FIELD_SEPARATOR)] + list(revisions) + ['--'],
+        cwd=repo, stdout=subprocess.PIPE, stderr=errors)
+    try:
+        commit = None
+        for line in iter(process.stdout.readline, ''):
+            if line.startswith(COMMIT_SEPARATOR):
+                if commit is not None:
+                    yield commit
+                sha, ct, line = line[1:].split(FIELD_SEPARATOR, 2)
+                commit = (sha, int(ct), [])
+            match = trailer_re.match(line)
+            if match and commit is not None:
+                commit[2].append(match.group(1).decode('utf-8'))
+        if commit is not None:
+            yield commit
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+        errors.seek(0)
+        message = errors.read().strip()
+        errors.close()
+    if returncode != 0:
+        raise GitError('git log failed in {}: {}'.format(repo, message))
+
+
+def commit_rows(ct, trailers):
+    """
+    returns the worklog rows of the `Worked-on:` trailers of a commit made
+    at the unix time `ct`.
+    """
+    day = datetime.fromtimestamp(ct).strftime('%Y-%m-%d')
+    rows = []
+    for trailer in trailers:
+        task, time, done = split_trailer(trailer)
+        rows.append({'task': task, 'date': day, 'time': time, 'done': done})
+    return rows
+
+
+def update_git_commits(tcs, repo):
+    """
+    reads the commits of the repository `repo` that are not cached in the
+    container `tcs` and returns the worklog rows of the commits that were
+    added to or removed from the history since the last call.
+    """
+    head = _git(repo, 'rev-parse', '--verify', '-q', 'HEAD')
+    if head is None:
+        logger.warning('no git repository with commits at %s', repo)
+        changed = git_rows(tcs.git_commits)
+        tcs.git_commits = {}
+        tcs.git_head = None
+        return changed
+    head = head.strip()
+    if head == tcs.git_head:
+        return []
+
+    incremental = (
+        tcs.git_head is not None and _git(
+            repo, 'merge-base', '--is-ancestor', tcs.git_head, head)
+        is not None)
+    if incremental:
+        commits = dict(tcs.git_commits)
+        revisions = [head, '^' + tcs.git_head]
+    else:
+        # the history was rewritten, cached commits that are still in it are
+        # not parsed again
+        commits = {}
+        revisions = [head]
+
+    try:
+        for sha, ct, trailers in iter_commits(repo, revisions):
+            if sha in tcs.git_commits:
+                commits[sha] = tcs.git_commits[sha]
+            else:
+                commits[sha] = (ct, commit_rows(ct, trailers))
+    except GitError as e:
+        # the cache is kept, so the missing commits are read next time
+        logger.warning('%s', e)
+        return []
+
+    changed = set(commits).symmetric_difference(tcs.git_commits)
+    changed = git_rows(dict(
+        (sha, commits.get(sha) or tcs.git_commits[sha]) for sha in changed))
+    tcs.git_commits = commits
+    tcs.git_head = head
+    return changed
+
+
+def git_rows(commits):
+    """
+    returns the worklog rows of the cached `commits` in the order of their
+    commit times.
+    """
+    return [
+        row for ct, rows in sorted(commits.itervalues(), key=lambda c: c[0])
+        for row in rows]
+
+
+def read_git_worklog(tcs, repo):
+    """
+    returns the worklog rows of the commits of the repository `repo` in the
+    order of their commit times, reading only the commits that are not
+    cached in the container `tcs`.
+    """
+    update_git_commits(tcs, repo)
+    return git_rows(tcs.git_commits)
+
+
+def git_worklog_path(app):
+    if not app.config.timeline_git_worklog:
+        return None
+    return os.path.join(app.srcdir, app.config.timeline_git_worklog)
@@ -0,0 +1,102 @@
+"""
+Algorithms on directed graphs given as dictionaries mapping each vertex to
+the list of its successors.
+
+All algorithms are iterative, so they do not hit python's recursion limit on
+long dependency chains.
+"""
+
+
+def strongly_connected_components(graph):
+    """
+    returns the strongly connected components of `graph` (Tarjan's algorithm).
+
+    The components are returned in reverse topological order, i.e. every
+    component comes after all components reachable from it.  Successors that
+    are not keys of `graph` are treated as vertices without successors.
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+
+    for root in sorted(graph):
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph.get(root, ())))]
+        while work:
+            vertex, successors = work[-1]
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = lowlink[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph.get(successor, ()))))
+                    break
+                elif successor in on_stack:
+                    lowlink[vertex] = min(lowlink[vertex], index[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[vertex])
+                if lowlink[vertex] == index[vertex]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == vertex:
+                            break
+                    components.append(component)
+
+    return components
+
+
+def find_cycles(graph):
+    """
+    returns a sorted list of all dependency cycles in `graph`.
+
+    Every cycle is the sorted list of the vertices of a strongly connected
+    component with more than one vertex or with a vertex depending on itself.
+    """
+    cycles = []
+    for component in strongly_connected_components(graph):
+        if len(component) > 1 or component[0] in graph.get(component[0], ()):
+            cycles.append(sorted(component))
+    return sorted(cycles)
+
+
+def topological_order(graph):
+    """
+    returns the vertices of the acyclic `graph` such that every vertex comes
+    after all of its successors (Kahn's algorithm).
+
+    Raises a ValueError if `graph` has a cycle.
+    """
+    predecessors = {}
+    pending = {}
+    for vertex in graph:
+        pending.setdefault(vertex, 0)
+        for successor in graph[vertex]:
+            pending[vertex] += 1
+            predecessors.setdefault(successor, []).append(vertex)
+            pending.setdefault(successor, 0)
+
+    ready = sorted(vertex for vertex in pending if pending[vertex] == 0)
+    order = []
+    while ready:
+        vertex = ready.pop()
+        order.append(vertex)
+        for predecessor in predecessors.get(vertex, ()):
+            pending[predecessor] -= 1
+            if pending[predecessor] == 0:
+                ready.append(predecessor)
+
+    if len(order) != len(pending):
+        raise ValueError('graph has a cycle')
+    return order
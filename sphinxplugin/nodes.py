@@ -1,11 +1,17 @@
 import sphinxcontrib.blockdiag
 import docutils
-import dateutil
 
-from .submodule_node import SubmoduleNode
+from .submodule_node import combine_work_stats
+from .timeline_chunk import task_stat_table
+from . import forecast
+from . import scheduling
 from . import utils
 
 
+# appended to the ETA of a deadline that is missed
+AT_RISK = ' (at risk)'
+
+
 class TimelineBlockdiagNode(sphinxcontrib.blockdiag.blockdiag_node):
     name = 'TimelineBlockdiagNode'
     """
@@ -22,9 +28,18 @@ class TaskTableSummaryNode(docutils.nodes.General, docutils.nodes.Element):
     def set_chunk(self, title):
         self.attributes['slug'] = utils.slugify(title)
 
-    def add_stat_table(self, tcs):
-        chunk = tcs.chunks[self.attributes['slug']]
-        chunk.add_stat_tables(self)
+    def add_stat_table(self, snapshot):
+        """
+        replaces this node with the stat table of its chunk in the resolved
+        timeline `snapshot`, or removes it if the chunk has no stats.
+        """
+        rows = None
+        if snapshot is not None:
+            rows = snapshot.tables.get(self.attributes['slug'])
+        if rows is None:
+            self.replace_self([])
+            return
+        self.replace_self(task_stat_table(rows))
 
 
 class TimelineNode(docutils.nodes.General, docutils.nodes.Element):
@@ -47,11 +62,9 @@ class TimelineNode(docutils.nodes.General, docutils.nodes.Element):
                 raise ValueError(
                     'Invalid format for milestone / deadline item.')
             elif len(parts) > 1:
-                try:
-                    res['time'] = dateutil.parser.parse(parts[0])
+                res['time'] = utils.parse_date(parts[0])
+                if res['time'] is not None:
                     index = 1
-                except:
-                    pass
             res['xref'] = ' '.join(parts[index:])
             res['submodules'] = name_submodule[1:]
 
@@ -59,97 +72,128 @@ class TimelineNode(docutils.nodes.General, docutils.nodes.Element):
 
         return items
 
-    def _get_available_submodules(self, timechunks):
-        available_submodules = set()
-        for tk in timechunks.chunks.keys():
-            for i in [utils.id_from_name_and_submodule(tk, y)
-                      for y in range(timechunks.chunks[tk].num_submodules())]:
-                available_submodules.add(i)
-        return available_submodules
-
     def resolve_all_dependencies(self, timechunks):
-        # gather all root elements (nodes without parents)
-        submodules_with_parents = set()
-        for tc in timechunks.chunks.itervalues():
-            alldeps = reduce(
-                lambda x, y: x + y, tc.dependencies.itervalues(), [])
-            for dep in alldeps:
-                try:
-                    depnames = timechunks.get_chunk_id(dep, True, True)
-                    for dn in depnames:
-                        submodules_with_parents.add(dn)
-                except KeyError:
-                    print "could not resolve dependency {}".format(dep)
-
-        available_submodules = self._get_available_submodules(timechunks)
-
-        root_elements = available_submodules - submodules_with_parents
-        if len(root_elements) == 0:
-            # TODO: make this a parser error
-            raise ValueError(
-                "All timeline chunks are a dependant of another chunk."
-                "Cyclic dependencies?  Root elements are {}."
-                .format(repr(root_elements)))
+        root_elements = timechunks.resolve_dependencies()
         self.root_chunks = [
-            SubmoduleNode(timechunks, el) for el in root_elements]
-
-        for rc in self.root_chunks:
-            rc.visit_dependency_resolution(timechunks, [])
+            timechunks.get_submodule_node(el) for el in root_elements]
 
-    def _resolve_milestone(self, milestone, timechunks, stats):
+    def _resolve_milestone(self, milestone, timechunks):
         mn = milestone[0]
         ms = milestone[1]
         ms_key = timechunks.get_chunk_id(ms['xref'])
         ms_chunk = timechunks.chunks[ms_key[0][0]]
         submodules = ms['submodules'] or range(ms_chunk.num_submodules())
+        nodes = []
         for sm in submodules:
             submodule = ms_chunk.get_submodule(sm)
-            submodule.compute_work_stats(stats)
-            submodule.set_important()
+            submodule.set_rendered()
             submodule.group = 'Milestone{}'.format(mn)
+            nodes.append(submodule)
+        return nodes
 
     def resolve_all_stats(self, timechunks):
         for rc in self.root_chunks:
-            rc.compute_work_stats({})
+            rc.compute_work_stats()
+        timechunks.prune_stats_cache()
 
     def resolve_milestones(self, timechunks):
-        grouplines = []
+        groups = []
         stats = []
+        self.milestone_nodes = []
         for milestone in enumerate(self.milestones):
-            mstats = {}
-            self._resolve_milestone(milestone, timechunks, mstats)
-            stats.append(utils.add_stats(mstats))
-            grouplines += [
-                'group Milestone{}'.format(milestone[0]) + ' {',
-                '  label = "Milestone {}"'.format(milestone[0] + 1),
-                '  color = "#aaaaaa"',
-                '}']
-        return grouplines, stats
-
-    def _resolve_deadline(self, deadline, timechunks, stats):
+            nodes = self._resolve_milestone(milestone, timechunks)
+            self.milestone_nodes.append(nodes)
+            stats.append(utils.add_stats(combine_work_stats(nodes)))
+            groups.append({
+                'id': 'Milestone{}'.format(milestone[0]),
+                'label': 'Milestone {}'.format(milestone[0] + 1),
+                'color': '#aaaaaa',
+            })
+        return groups, stats
+
+    def _resolve_deadline(self, deadline, timechunks):
         dn = deadline[0]
         dl = deadline[1]
         dl_key = timechunks.get_chunk_id(dl['xref'])
         dl_chunk = timechunks.chunks[dl_key[0][0]]
         submodules = dl['submodules'] or range(dl_chunk.num_submodules())
+        nodes = []
         for sm in submodules:
             submodule = dl_chunk.get_submodule(sm)
-            submodule.compute_work_stats(stats)
+            submodule.set_rendered()
             submodule.group = 'Deadline{}'.format(dn)
+            nodes.append(submodule)
+        return nodes
 
     def resolve_deadlines(self, timechunks):
-        grouplines = []
+        groups = []
         stats = []
+        self.deadline_nodes = []
         for deadline in enumerate(self.deadlines):
-            dstats = {}
-            self._resolve_deadline(deadline, timechunks, dstats)
-            stats.append(utils.add_stats(dstats))
-            grouplines += [
-                'group Deadline{}'.format(deadline[0]) + ' {',
-                '  label = "Deadline {}"'.format(deadline[1]['time']),
-                '  color = "#bbbbbb"',
-                '}']
-        return grouplines, stats
+            nodes = self._resolve_deadline(deadline, timechunks)
+            self.deadline_nodes.append(nodes)
+            stats.append(utils.add_stats(combine_work_stats(nodes)))
+            groups.append({
+                'id': 'Deadline{}'.format(deadline[0]),
+                'label': 'Deadline {}'.format(deadline[1]['time']),
+                'color': '#bbbbbb',
+            })
+        return groups, stats
+
+    def resolve_critical_paths(self, hours_per_day, now=None):
+        """
+        schedules the remaining work with the critical path method and marks
+        the submodules on the critical paths of the milestones and deadlines
+        as important.
+
+        Returns the critical path ETAs of the milestones followed by those of
+        the deadlines.  Deadlines that are missed by their ETA are marked as
+        at risk.  The remaining work is scheduled once per resolution of the
+        dependencies, timelines sharing the root chunks reuse the schedule.
+        """
+        if any(rc.schedule is None for rc in self.root_chunks):
+            scheduling.schedule(self.root_chunks)
+        etas = []
+        for nodes, deadline_time in self._targets():
+            hours, critical = scheduling.critical_path(nodes)
+            for sn in critical:
+                sn.important = True
+            eta = self._eta(hours, hours_per_day, now)
+            description = 'undefined' if eta is None else eta
+            if deadline_time is not None and (
+                    eta is None or eta > deadline_time.date().isoformat()):
+                description += AT_RISK
+            etas.append(description)
+        return etas
+
+    def resolve_forecasts(self, hours_per_day, samples, seed, now=None):
+        """
+        returns the forecast completion dates of the milestones followed by
+        those of the deadlines for each of `forecast.PERCENTILES`.
+
+        The dates are undefined if NumPy is not installed.
+        """
+        targets = [nodes for nodes, deadline_time in self._targets()]
+        hours = forecast.forecast(targets, samples, seed)
+        if hours is None:
+            return [['undefined'] * len(forecast.PERCENTILES)] * len(targets)
+        return [
+            [self._eta(h, hours_per_day, now) or 'undefined' for h in row]
+            for row in hours]
+
+    def _targets(self):
+        targets = [(nodes, None) for nodes in self.milestone_nodes]
+        targets += [
+            (nodes, deadline['time'])
+            for nodes, deadline in zip(self.deadline_nodes, self.deadlines)]
+        return targets
+
+    def _eta(self, hours, hours_per_day, now):
+        try:
+            return scheduling.eta(hours, hours_per_day, now).strftime(
+                '%Y-%m-%d')
+        except (OverflowError, ValueError):
+            return None
 
     def _parse_list_items_from_doctree(self, enumeration):
         strings = utils.parse_list_items(enumeration)
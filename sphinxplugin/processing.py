@@ -1,15 +1,140 @@
 import docutils
 import sphinxcontrib.blockdiag
+from collections import namedtuple
+from datetime import date
 
 from .nodes import TimelineNode, TaskTableSummaryNode
+from .timeline_graph import TimelineGraph
+from .sqlite_store import get_store
+from . import backends
 from . import utils
 
 
+# the resolved timeline of a document: the graph of its diagram and the rows
+# of its milestone table
+ResolvedTimeline = namedtuple('ResolvedTimeline', ['graph', 'rows'])
+
+# the results of resolving all timelines of a build that are read by the
+# writers: the resolved timelines by docname and the rows of the stat tables
+# by chunk key
+TimelineSnapshot = namedtuple('TimelineSnapshot', ['timelines', 'tables'])
+
+
+def task_stat_rows(tcs):
+    """
+    returns the rows of the stat tables of all chunks shown in a stat table
+    by their keys.
+
+    The rows of all tables are computed in a single call.  The rows of a
+    chunk whose inputs did not change since they were computed are reused.
+    """
+    keys = set()
+    for table_keys in tcs.table_docs.itervalues():
+        keys.update(table_keys)
+
+    tables = {}
+    chunks = []
+    metas = []
+    today = date.today().toordinal()
+    for key in sorted(keys):
+        chunk = tcs.chunks.get(key)
+        if chunk is None or len(chunk.stats) == 0:
+            continue
+        signature = (chunk.input_hash(), today)
+        cached = tcs.table_cache.get(key)
+        if cached is not None and cached[0] == signature:
+            tables[key] = cached[1]
+        else:
+            chunks.append((chunk, signature))
+            metas.append(chunk.get_stat_meta())
+
+    descriptions = utils.make_descriptions_from_metas(metas, 'Task')
+    for (chunk, signature), description in zip(chunks, descriptions):
+        tcs.table_cache[chunk.key] = (signature, description)
+        tables[chunk.key] = description
+    return tables
+
+
+def resolve_timelines(app, tcs, visit=None):
+    """
+    resolves the dependency graph, the stats and the schedule of all
+    submodules once, then the milestones and deadlines of every timeline with
+    their critical paths and forecasts, and returns the TimelineSnapshot.
+
+    `visit(docname, tn, meta, etas, forecasts)` is called for the timeline
+    node `tn` of every document while its submodules are marked.  The
+    submodule nodes are dropped afterwards, so they are not pickled with the
+    environment.
+    """
+    if len(tcs.timeline_docs) == 0 and len(tcs.table_docs) == 0:
+        return TimelineSnapshot({}, {})
+    if len(tcs.timeline_docs) > 0 and len(tcs.chunks) == 0:
+        # TODO: make this a parser error!
+        raise ValueError("no timeline chunks for the timeline found!")
+
+    tcs.update_aliases()
+    resolved = TimelineNode()
+    resolved.resolve_all_dependencies(tcs)
+    resolved.resolve_all_stats(tcs)
+    tables = task_stat_rows(tcs)
+
+    config = app.config
+    store = get_store(app)
+    timelines = {}
+    for docname in sorted(tcs.timeline_docs):
+        tcs.reset_marks()
+        tn = TimelineNode()
+        tn.milestones, tn.deadlines = tcs.timeline_targets[docname]
+        tn.root_chunks = resolved.root_chunks
+
+        groups, meta = tn.resolve_milestones(tcs)
+        groups2, meta2 = tn.resolve_deadlines(tcs)
+        groups += groups2
+        meta += meta2
+        etas = tn.resolve_critical_paths(config.timeline_hours_per_day)
+        forecasts = tn.resolve_forecasts(
+            config.timeline_hours_per_day, config.timeline_forecast_samples,
+            config.timeline_forecast_seed)
+
+        rows = utils.make_descriptions_from_meta(meta, 'Milestone')
+        for row, eta, percentiles in zip(rows, etas, forecasts):
+            row.append(eta)
+            row += percentiles
+        timelines[docname] = ResolvedTimeline(
+            TimelineGraph.from_submodules(tn.root_chunks, groups), rows)
+
+        tcs.set_timeline_reads(docname)
+        if store is not None:
+            store.update_milestones(docname, tn)
+        if visit is not None:
+            visit(docname, tn, meta, etas, forecasts)
+
+    if store is not None:
+        store.update_stats(tcs.submodule_nodes)
+    tcs.reset_submodules()
+
+    return TimelineSnapshot(timelines, tables)
+
+
 def process_timelines(app, doctree, fromdocname):
     """
     replace TimelineNode with their children, replace TimelineBlockdiag with
     sphinxcontrib.blockdiag and call its handler function...
+
+    The timelines are only read from the snapshot resolved after all
+    documents were read, so writers do not change any shared state.  Only
+    documents in the registry of the timeline chunks container are
+    traversed.
     """
+    tcs = getattr(app.env, 'timeline_chunks', None)
+    if tcs is None:
+        return
+    snapshot = getattr(app.env, 'timeline_snapshot', None)
+    if fromdocname in tcs.table_docs:
+        for tnsn in doctree.traverse(TaskTableSummaryNode):
+            tnsn.add_stat_table(snapshot)
+    if fromdocname not in tcs.timeline_docs:
+        return
 
     tn = doctree.traverse(TimelineNode)
     if len(tn) == 0:
@@ -19,31 +144,12 @@ def process_timelines(app, doctree, fromdocname):
         raise ValueError("Only one timeline per file allowed!")
     tn = tn[0]
 
-    env = app.env
-    if not hasattr(env, 'timeline_chunks'):
-        # TODO: make this a parser error!
+    resolved = None
+    if snapshot is not None:
+        resolved = snapshot.timelines.get(fromdocname)
+    if resolved is None:
         tn.replace_self([])
-        raise ValueError("no timeline chunks for the timeline found!")
-
-    tcs = env.timeline_chunks
-    tcs.update_aliases()
-
-    tn.resolve_all_dependencies(tcs)
-
-    lines, meta = tn.resolve_milestones(tcs)
-    lines2, meta2 = tn.resolve_deadlines(tcs)
-    lines += lines2
-    meta += meta2
-    tn.resolve_all_stats(tcs)
-
-    tnsns = doctree.traverse(TaskTableSummaryNode)
-    for tnsn in tnsns:
-        tnsn.add_stat_table(tcs)
-
-    nodes = set()
-    for rc in tn.root_chunks:
-        rc.traverse_edge_lines(lines)
-        rc.get_blockdiag_nodes(nodes)
+        return
 
     headers = [
         '              ',
@@ -57,23 +163,22 @@ def process_timelines(app, doctree, fromdocname):
         'Advance / week',
         'ETA           ',
         'ETA 2         ',
+        'Critical path ETA',
+        'Forecast P50  ',
+        'Forecast P80  ',
+        'Forecast P95  ',
     ]
     widths = [16] * len(headers)
-    descriptions1 = utils.make_descriptions_from_meta(meta, 'Milestone')
-
-    table1 = utils.description_table(descriptions1, widths, headers)
+    widths[11] = 24
 
-    lines = ['orientation = portrait', ''] + list(nodes) + lines
+    table1 = utils.description_table(resolved.rows, widths, headers)
 
     paragraph = docutils.nodes.paragraph()
-    tn.blockdiag = sphinxcontrib.blockdiag.blockdiag_node()
+    backend = backends.get_backend(app.config)
+    tn.blockdiag = backend.render(
+        app, fromdocname, resolved.graph, tn['ids'])
     paragraph += tn.blockdiag
     paragraph += table1
-    tn.blockdiag.code = (
-        'blockdiag {{\n\t{}\n}}\n'.format('\n\t'.join(lines)))
-    tn.blockdiag['code'] = tn.blockdiag.code
-    tn.blockdiag['options'] = {}
-    tn.blockdiag['ids'] = tn['ids']
 
     tn.replace_self(paragraph)
 
@@ -1,22 +1,45 @@
+import os
 from .timeline_chunk import TimelineChunksContainer
 from .nodes import (
     TaskTableSummaryNode, TimelineBlockdiagNode, TimelineNode)
 from .directives import (
     TimelineWorkedOnDirective, TimelineRequestedDirective,
     TimelineDependencyDirective, TimelineDirective)
-from .processing import process_timelines
+from .processing import process_timelines, resolve_timelines
+from .worklog import outdated_worklog_docs, update_worklogs
+from .entry_store import write_entry_store
+from .sqlite_store import get_store
+from .export import TimelineBuilder
+from .rendering import evict_diagrams
+from .backends import get_backend
 
 
 def purge_timelines(app, env, docname):
     """
     purge all environment variables created from the document `docname`.
     """
+    store = get_store(app)
+    if store is not None:
+        store.purge(docname)
+
     if not hasattr(env, 'timeline_chunks'):
         return
 
     env.timeline_chunks.purge(docname)
 
 
+def merge_timelines(app, env, docnames, other):
+    """
+    merge the timeline chunks read from `docnames` by a parallel worker.
+    """
+    if not hasattr(other, 'timeline_chunks'):
+        return
+    if not hasattr(env, 'timeline_chunks'):
+        env.timeline_chunks = TimelineChunksContainer()
+
+    env.timeline_chunks.merge(docnames, other.timeline_chunks)
+
+
 def task_group_role(name, rawtext, text, lineno, inliner,
                     options={}, content=[]):
 
@@ -25,11 +48,46 @@ def task_group_role(name, rawtext, text, lineno, inliner,
     if not hasattr(env, 'timeline_chunks'):
         env.timeline_chunks = TimelineChunksContainer()
 
-    env.timeline_chunks.add_group(text, inliner.parent, inliner.docname)
+    env.timeline_chunks.add_group(text, inliner.parent, env.docname)
 
     return [], []
 
 
+def get_outdated_timelines(app, env, added, changed, removed):
+    """
+    returns the documents showing timeline data that changed, i.e. the
+    documents reading from changed documents or changed worklogs.
+    """
+    docs = set(outdated_worklog_docs(app, env, added, changed, removed))
+    # some Sphinx versions pass the builder instead of the environment
+    tcs = getattr(app.env, 'timeline_chunks', None)
+    if tcs is not None:
+        docs.update(tcs.outdated_docs(added, docs.union(changed), removed))
+    return sorted(docs)
+
+
+def update_timelines(app, env):
+    """
+    adds the worklogs to the timeline chunks after all documents were read,
+    writes the entry store and the SQLite store and resolves the timelines
+    into the snapshot read by the writers.
+    """
+    update_worklogs(app, env)
+    if not hasattr(env, 'timeline_chunks'):
+        return
+    if app.config.timeline_entry_store:
+        write_entry_store(
+            os.path.join(app.outdir, app.config.timeline_entry_store),
+            env.timeline_chunks)
+    store = get_store(app)
+    if store is not None:
+        store.update(env.timeline_chunks)
+    if app.builder.name != TimelineBuilder.name:
+        # the timeline builder resolves the timelines itself when writing
+        env.timeline_snapshot = resolve_timelines(app, env.timeline_chunks)
+        get_backend(app.config).prepare(app, env.timeline_snapshot.timelines)
+
+
 def on_builder_inited(self):
     pass
 #    config = self.builder.config
@@ -55,9 +113,23 @@ def setup(app):
         lambda *args: TimelineDependencyDirective.role(*args))
     app.add_directive('dependent-tasks', TimelineDependencyDirective)
     app.add_directive('timeline', TimelineDirective)
+    app.add_builder(TimelineBuilder)
+    app.add_config_value('timeline_diagram_backend', 'blockdiag', 'html')
+    app.add_config_value('timeline_hours_per_day', 8, 'html')
+    app.add_config_value('timeline_forecast_samples', 1000, 'html')
+    app.add_config_value('timeline_forecast_seed', 0, 'html')
+    app.add_config_value('timeline_worklogs', [], 'env')
+    app.add_config_value('timeline_git_worklog', None, 'env')
+    app.add_config_value('timeline_entry_store', None, '')
+    app.add_config_value('timeline_sqlite', None, '')
+    app.add_config_value('timeline_render_workers', None, '')
     app.connect('doctree-resolved', process_timelines)
     app.connect('builder-inited', on_builder_inited)
     app.connect('env-purge-doc', purge_timelines)
+    app.connect('env-merge-info', merge_timelines)
+    app.connect('env-get-outdated', get_outdated_timelines)
+    app.connect('env-updated', update_timelines)
+    app.connect('build-finished', evict_diagrams)
 
     # TODO:
     # - [ ] add javascript source code in order to manipulate the progress
@@ -0,0 +1,404 @@
+import os
+import json
+import shutil
+import hashlib
+import posixpath
+import tempfile
+import multiprocessing
+from collections import namedtuple
+
+import docutils
+from sphinx import addnodes
+from sphinx.util import logging
+from sphinx.util.osutil import ensuredir, relative_uri
+from blockdiag.utils.bootstrap import Application, detectfont
+from blockdiag.utils.fontmap import FontMap
+import sphinxcontrib.blockdiag
+
+
+logger = logging.getLogger(__name__)
+
+# the blockdiag config values diagrams are rendered with, picklable for the
+# render workers
+RenderConfig = namedtuple('RenderConfig', [
+    'blockdiag_antialias', 'blockdiag_transparency', 'blockdiag_fontpath',
+    'blockdiag_fontmap'])
+
+# stands in for the builder when rendering outside of Sphinx, only its
+# config is read by blockdiag
+RenderBuilder = namedtuple('RenderBuilder', ['config'])
+
+
+def resolve_reference(builder, fromdocname, target):
+    """
+    returns the URI of the label `target` relative to the document
+    `fromdocname`, or None if the label is undefined.
+    """
+    env = builder.env
+    node = addnodes.pending_xref(refexplicit=False)
+    xref = env.domains['std'].resolve_xref(
+        env, fromdocname, builder, 'ref', target, node, node)
+    if not xref:
+        logger.warning('undefined label: %s', target)
+        return None
+    if 'refid' in xref:
+        return '#' + xref['refid']
+    return xref['refuri']
+
+
+class HashingSink(object):
+    """
+    file-like sink writing the blockdiag code to the file `f` and updating
+    the hash `digest` with it on the way.
+    """
+
+    def __init__(self, f, digest):
+        self.f = f
+        self.digest = digest
+
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        self.digest.update(data)
+        self.f.write(data)
+
+
+class DiagramCache(object):
+    """
+    persistent cache of rendered timeline diagrams.
+
+    Every diagram is stored under a hash of the image format, the blockdiag
+    options and its blockdiag code, so an unchanged diagram is reused without
+    laying it out again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def digest(self, image_format, config):
+        """
+        returns the hash of the image format and the blockdiag options, which
+        is updated with the blockdiag code to get the key of a diagram.
+        """
+        options = [
+            config.blockdiag_antialias,
+            config.blockdiag_transparency,
+            config.blockdiag_fontpath,
+            config.blockdiag_fontmap,
+        ]
+        digest = hashlib.sha1(u'\0'.join(
+            [image_format.upper()] + [repr(o) for o in options]
+        ).encode('utf-8'))
+        digest.update('\0')
+        return digest
+
+    def write_code(self, image_format, config, write):
+        """
+        writes the blockdiag code written by `write(sink)` to a job file in
+        the cache, hashing it on the way.  Returns the key of the diagram and
+        the name of the job file.
+        """
+        ensuredir(self.path)
+        fd, codename = tempfile.mkstemp(dir=self.path, suffix='.diag')
+        with os.fdopen(fd, 'wb') as f:
+            sink = HashingSink(f, self.digest(image_format, config))
+            write(sink)
+        return sink.digest.hexdigest(), codename
+
+    def filename(self, key, ext):
+        return os.path.join(self.path, '{}.{}'.format(key, ext))
+
+    def has(self, key, ext):
+        return os.path.isfile(self.filename(key, ext))
+
+    def read(self, key, ext):
+        with open(self.filename(key, ext), 'rb') as f:
+            return f.read()
+
+    def write(self, key, ext, data):
+        ensuredir(self.path)
+        # write atomically, so concurrent builds never see partial files
+        fd, tmpname = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.rename(tmpname, self.filename(key, ext))
+
+    def write_file(self, key, ext, render):
+        """
+        stores the file written by `render(filename)` and returns the result
+        of `render`.
+        """
+        ensuredir(self.path)
+        fd, tmpname = tempfile.mkstemp(dir=self.path, suffix='.' + ext)
+        os.close(fd)
+        result = render(tmpname)
+        os.rename(tmpname, self.filename(key, ext))
+        return result
+
+    def evict(self, keys):
+        """
+        removes the rendered diagrams whose key is not in `keys`.  Files of
+        concurrent builds that are still being written are left alone.
+        """
+        if not os.path.isdir(self.path):
+            return
+        for name in os.listdir(self.path):
+            key, ext = os.path.splitext(name)
+            if ext in ('.svg', '.png', '.json') and key not in keys:
+                os.remove(os.path.join(self.path, name))
+
+
+def get_cache(app):
+    return DiagramCache(os.path.join(app.doctreedir, 'timeline_diagrams'))
+
+
+def _use_key(app, key):
+    """
+    records that the current build shows the diagram `key`.
+    """
+    keys = getattr(app, 'timeline_diagram_keys', None)
+    if keys is not None:
+        keys.add(key)
+
+
+def evict_diagrams(app, exception):
+    """
+    removes the diagrams not shown by the build from the diagram cache, once
+    the build finished.  The diagrams of all timelines are rendered ahead by
+    `render_diagrams`, so the diagrams of documents that were not written
+    again are kept as well.
+    """
+    keys = getattr(app, 'timeline_diagram_keys', None)
+    app.timeline_diagram_keys = None
+    if exception is None and keys is not None:
+        get_cache(app).evict(keys)
+
+
+def _read_code(codename):
+    """
+    returns the blockdiag code of the job file `codename` and removes it.
+    """
+    with open(codename, 'rb') as f:
+        code = f.read().decode('utf-8')
+    os.remove(codename)
+    return code
+
+
+def _write_job(cache, builder, fromdocname, image_format, write):
+    """
+    writes the blockdiag code written by `write(sink, resolve)` for the
+    document `fromdocname` to a job file.  `resolve` returns the URIs of the
+    referenced labels relative to the document, so the rendered diagram only
+    depends on the code.
+    """
+    def resolve(target):
+        return resolve_reference(builder, fromdocname, target)
+
+    return cache.write_code(
+        image_format, builder.config, lambda sink: write(sink, resolve))
+
+
+def _render_svg(builder, code):
+    node = sphinxcontrib.blockdiag.blockdiag_node(code=code, options={})
+    with Application():
+        image = node.to_drawer(
+            'SVG', builder, filename=None, nodoctype=True)
+        image.draw()
+        return image.save(image.pagesize())
+
+
+def _render_png(builder, code, filename):
+    node = sphinxcontrib.blockdiag.blockdiag_node(code=code, options={})
+    with Application():
+        image = node.to_drawer('PNG', builder, filename=filename)
+        image.draw()
+        image.save()
+        size = image.pagesize()
+        areas = []
+        for diagram_node in image.nodes:
+            if diagram_node.href:
+                areas.append(
+                    list(image.metrics.cell(diagram_node))
+                    + [diagram_node.href])
+    return {'width': size.width, 'height': size.height, 'areas': areas}
+
+
+def _svg_html(svg, ids):
+    spans = ''.join('<span id="{}"></span>'.format(i) for i in ids)
+    return u'<div>{}{}</div>\n'.format(spans, svg.decode('utf-8'))
+
+
+def _png_html(builder, fromdocname, key, meta, ids):
+    name = 'timeline-{}.png'.format(key)
+    imgpath = relative_uri(
+        builder.get_target_uri(fromdocname), builder.imagedir)
+    relpath = posixpath.join(imgpath, name)
+
+    html = ['<div>']
+    html += ['<span id="{}"></span>'.format(i) for i in ids]
+    usemap = ''
+    if meta['areas']:
+        usemap = ' usemap="#map_{}"'.format(key)
+        html.append('<map name="map_{}">'.format(key))
+        for x1, y1, x2, y2, href in meta['areas']:
+            html.append(
+                '<area shape="rect" coords="{},{},{},{}" href="{}">'
+                .format(x1, y1, x2, y2, href))
+        html.append('</map>')
+    html.append(
+        '<img src="{}" width="{}" height="{}"{} />'
+        .format(relpath, meta['width'], meta['height'], usemap))
+    html.append('</div>\n')
+    return u''.join(html), name
+
+
+def render_config(config):
+    return RenderConfig(
+        *[getattr(config, name) for name in RenderConfig._fields])
+
+
+def _render_to_cache(builder, cache, key, image_format, code):
+    if image_format.upper() == 'SVG':
+        cache.write(key, 'svg', _render_svg(builder, code))
+    else:
+        meta = cache.write_file(
+            key, 'png',
+            lambda filename: _render_png(builder, code, filename))
+        cache.write(key, 'json', json.dumps(meta))
+
+
+def _is_cached(cache, key, image_format):
+    if image_format.upper() == 'SVG':
+        return cache.has(key, 'svg')
+    return cache.has(key, 'png') and cache.has(key, 'json')
+
+
+# the builder of a render worker, set up once per worker process
+_worker_builder = None
+
+
+def _init_worker(config):
+    """
+    sets up the fonts of a render worker once, so they stay loaded for all
+    diagrams it renders.  Forked workers inherit the fonts of Sphinx.
+    """
+    global _worker_builder
+    _worker_builder = RenderBuilder(config)
+    if sphinxcontrib.blockdiag.fontmap is not None:
+        return
+    try:
+        fontmap = FontMap(config.blockdiag_fontmap)
+    except Exception:
+        fontmap = FontMap(None)
+    fontpath = config.blockdiag_fontpath
+    if isinstance(fontpath, basestring):
+        fontpath = [fontpath]
+    if fontpath:
+        fontmap.set_default_font(
+            detectfont(namedtuple('Config', 'font')(fontpath)))
+    sphinxcontrib.blockdiag.fontmap = fontmap
+
+
+def _render_job(job):
+    cache_path, key, image_format, codename = job
+    _render_to_cache(
+        _worker_builder, DiagramCache(cache_path), key, image_format,
+        _read_code(codename))
+    return key
+
+
+def render_jobs(cache, config, jobs, workers=1):
+    """
+    renders the diagrams `jobs`, tuples of the cache key, the image format
+    and the job file written by `DiagramCache.write_code`, into the diagram
+    cache `cache` with the RenderConfig `config`.  The job files are removed
+    once they are read.
+
+    With several `workers` the diagrams are rendered concurrently in a pool
+    of as many processes.
+    """
+    jobs = [(cache.path, key, image_format, code)
+            for key, image_format, code in jobs]
+    workers = min(workers, len(jobs))
+    if workers <= 1:
+        _init_worker(config)
+        for job in jobs:
+            _render_job(job)
+        return
+
+    pool = multiprocessing.Pool(workers, _init_worker, (config,))
+    try:
+        # one diagram per task, as their sizes vary
+        pool.map(_render_job, jobs, chunksize=1)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def render_diagrams(app, writers):
+    """
+    renders the diagrams of the html documents `writers`, pairs of the
+    docname and a callable writing the blockdiag code with
+    `write(sink, resolve)`, that are not in the diagram cache yet.
+
+    The diagrams are rendered before the documents are written, in a pool of
+    `timeline_render_workers` processes, by default as many as parallel jobs
+    (`-j`).  The documents then take them from the cache.
+    """
+    builder = app.builder
+    image_format = sphinxcontrib.blockdiag.get_image_format_for(builder)
+    cache = get_cache(app)
+    app.timeline_diagram_keys = set()
+    jobs = {}
+    # undefined labels are reported when the documents are written
+    with logging.LogCollector().collect():
+        for fromdocname, write in writers:
+            key, codename = _write_job(
+                cache, builder, fromdocname, image_format, write)
+            _use_key(app, key)
+            if key in jobs or _is_cached(cache, key, image_format):
+                os.remove(codename)
+            else:
+                jobs[key] = (key, image_format, codename)
+
+    workers = app.config.timeline_render_workers or app.parallel
+    try:
+        render_jobs(
+            cache, render_config(builder.config),
+            [jobs[key] for key in sorted(jobs)], workers)
+    finally:
+        for _, _, codename in jobs.values():
+            if os.path.exists(codename):
+                os.remove(codename)
+
+
+def render_html(app, fromdocname, write, ids):
+    """
+    returns a raw html node with the rendered timeline diagram written by
+    `write(sink, resolve)`.
+
+    Rendered diagrams are taken from the diagram cache if possible.
+    """
+    builder = app.builder
+    image_format = sphinxcontrib.blockdiag.get_image_format_for(builder)
+    cache = get_cache(app)
+    key, codename = _write_job(
+        cache, builder, fromdocname, image_format, write)
+    _use_key(app, key)
+
+    if _is_cached(cache, key, image_format):
+        os.remove(codename)
+    else:
+        _render_to_cache(
+            builder, cache, key, image_format, _read_code(codename))
+    if image_format.upper() == 'SVG':
+        html = _svg_html(cache.read(key, 'svg'), ids)
+    else:
+        meta = json.loads(cache.read(key, 'json'))
+        html, name = _png_html(builder, fromdocname, key, meta, ids)
+        target = os.path.join(builder.outdir, builder.imagedir, name)
+        if not os.path.isfile(target):
+            ensuredir(os.path.dirname(target))
+            shutil.copyfile(cache.filename(key, 'png'), target)
+
+    return docutils.nodes.raw('', html, format='html')
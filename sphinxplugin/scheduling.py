@@ -0,0 +1,120 @@
+"""
+Critical path method (CPM) over the resolved submodule dependency graph.
+
+Every submodule takes its remaining hours of work.  A submodule can start as
+soon as all of its dependencies are finished, so its earliest start is the
+latest earliest finish of its dependencies.  The latest start and finish are
+the latest times that do not delay the project, and the slack is the
+difference between the latest and the earliest start.  All times are hours of
+work from now.
+"""
+from datetime import datetime, timedelta
+
+from .graph import topological_order
+
+
+# slack below this number of hours counts as zero
+SLACK_TOLERANCE = 1e-6
+
+
+def remaining_hours(sn):
+    """
+    returns the hours of work left on the submodule node `sn`, i.e. the
+    requested time that is not done yet.
+    """
+    tc = sn.timechunk
+    done = min(max(float(tc.get_completeness(sn.submodule)), 0.), 1.)
+    return tc.get_requested_time(sn.submodule) / 60. * (1. - done)
+
+
+def dependency_order(nodes):
+    """
+    returns the submodule nodes `nodes` and all submodules they depend on,
+    every submodule after all of its dependencies.
+    """
+    graph = {}
+    stack = list(nodes)
+    while stack:
+        sn = stack.pop()
+        if sn.index in graph:
+            continue
+        graph[sn.index] = [child.index for child in sn.children]
+        stack += [child for child in sn.children if child.index not in graph]
+
+    submodule_nodes = nodes[0].container.submodule_nodes if nodes else []
+    return [submodule_nodes[i] for i in topological_order(graph)]
+
+
+def schedule(nodes):
+    """
+    computes the schedule of the submodule nodes `nodes` and all submodules
+    they depend on in O(V + E).
+
+    Sets the `schedule` dictionary of every node to its duration, earliest
+    start (`es`) and finish (`ef`), latest start (`ls`) and finish (`lf`) and
+    slack in hours, and returns the hours until all of them are finished.
+    """
+    order = dependency_order(nodes)
+    for position, sn in enumerate(order):
+        duration = remaining_hours(sn)
+        es = max([child.schedule['ef'] for child in sn.children] or [0.])
+        sn.schedule = {
+            'order': position,
+            'duration': duration,
+            'es': es,
+            'ef': es + duration,
+            'dependants': [],
+        }
+        for child in sn.children:
+            child.schedule['dependants'].append(sn)
+
+    finish = max([sn.schedule['ef'] for sn in order] or [0.])
+    for sn in reversed(order):
+        s = sn.schedule
+        s['lf'] = min(
+            [dependant.schedule['ls'] for dependant in s['dependants']]
+            or [finish])
+        s['ls'] = s['lf'] - s['duration']
+        s['slack'] = s['ls'] - s['es']
+    return finish
+
+
+def critical_path(targets):
+    """
+    returns the hours until the scheduled submodule nodes `targets` are
+    finished and the set of submodules on their critical path, i.e. the
+    submodules without slack with respect to the finish of `targets`.
+    """
+    finish = max([sn.schedule['ef'] for sn in targets] or [0.])
+
+    closure = set()
+    stack = list(targets)
+    while stack:
+        sn = stack.pop()
+        if sn not in closure:
+            closure.add(sn)
+            stack += sn.children
+
+    latest_start = {}
+    critical = set()
+    ordered = sorted(closure, key=lambda sn: sn.schedule['order'])
+    for sn in reversed(ordered):
+        lf = min(
+            [latest_start[dependant]
+             for dependant in sn.schedule['dependants']
+             if dependant in latest_start]
+            or [finish])
+        latest_start[sn] = lf - sn.schedule['duration']
+        if lf - sn.schedule['ef'] < SLACK_TOLERANCE:
+            critical.add(sn)
+    return finish, critical
+
+
+def eta(hours, hours_per_day, now=None):
+    """
+    returns the date at which `hours` of work are done when working
+    `hours_per_day` hours a day from `now` on.
+    """
+    if now is None:
+        now = datetime.now()
+    return now + timedelta(days=hours / float(hours_per_day))
@@ -0,0 +1,293 @@
+"""
+SQLite mirror of the timeline model for queries outside of Sphinx.
+
+Set the `timeline_sqlite` config value to a path relative to the output
+directory to keep the database up to date.  The chunks, submodules, aliases,
+dependencies and worked-on entries of a document are written in one
+transaction after all documents were read and are purged by docname when the
+document is read again.  The resolved dependency edges, the computed stats
+and the milestones and deadlines are replaced when a timeline is resolved.
+
+Dates are stored as minutes since the epoch, see `submodule_array`.
+
+    >>> store = TimelineStore('_build/html/timeline.sqlite')
+    >>> store.open_tasks_blocking(2)
+    >>> store.hours_logged(datetime(2015, 2, 2), datetime(2015, 2, 9))
+"""
+import os
+import sqlite3
+
+from .submodule_array import MISSING_INT, to_epoch_minutes
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    docname TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    key TEXT PRIMARY KEY,
+    docname TEXT NOT NULL REFERENCES documents ON DELETE CASCADE,
+    title TEXT NOT NULL,
+    label TEXT
+);
+CREATE INDEX IF NOT EXISTS chunks_docname ON chunks (docname);
+CREATE TABLE IF NOT EXISTS submodules (
+    chunk TEXT NOT NULL REFERENCES chunks ON DELETE CASCADE,
+    submodule INTEGER NOT NULL,
+    requested INTEGER NOT NULL,
+    worked INTEGER NOT NULL,
+    completeness REAL NOT NULL,
+    start_minute INTEGER,
+    end_minute INTEGER,
+    PRIMARY KEY (chunk, submodule)
+);
+CREATE INDEX IF NOT EXISTS submodules_completeness
+    ON submodules (completeness);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT NOT NULL,
+    chunk TEXT NOT NULL REFERENCES chunks ON DELETE CASCADE,
+    PRIMARY KEY (alias, chunk)
+);
+CREATE INDEX IF NOT EXISTS aliases_chunk ON aliases (chunk);
+CREATE TABLE IF NOT EXISTS dependencies (
+    chunk TEXT NOT NULL REFERENCES chunks ON DELETE CASCADE,
+    submodule INTEGER NOT NULL,
+    dependency TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dependencies_chunk
+    ON dependencies (chunk, submodule);
+CREATE TABLE IF NOT EXISTS entries (
+    chunk TEXT NOT NULL REFERENCES chunks ON DELETE CASCADE,
+    submodule INTEGER NOT NULL,
+    minute INTEGER,
+    minutes INTEGER NOT NULL,
+    done REAL
+);
+CREATE INDEX IF NOT EXISTS entries_chunk ON entries (chunk, submodule);
+CREATE INDEX IF NOT EXISTS entries_minute ON entries (minute);
+CREATE TABLE IF NOT EXISTS edges (
+    chunk TEXT NOT NULL REFERENCES chunks ON DELETE CASCADE,
+    submodule INTEGER NOT NULL,
+    dependency_chunk TEXT NOT NULL REFERENCES chunks ON DELETE CASCADE,
+    dependency_submodule INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS edges_chunk ON edges (chunk, submodule);
+CREATE INDEX IF NOT EXISTS edges_dependency_chunk ON edges (dependency_chunk);
+CREATE TABLE IF NOT EXISTS stats (
+    chunk TEXT NOT NULL REFERENCES chunks ON DELETE CASCADE,
+    submodule INTEGER NOT NULL,
+    total_requested INTEGER NOT NULL,
+    total_worked INTEGER NOT NULL,
+    total_done REAL NOT NULL,
+    earliest_start REAL,
+    earliest_finish REAL,
+    slack REAL,
+    PRIMARY KEY (chunk, submodule)
+);
+CREATE TABLE IF NOT EXISTS milestones (
+    docname TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    chunk TEXT NOT NULL,
+    submodule INTEGER NOT NULL,
+    date_minute INTEGER
+);
+CREATE INDEX IF NOT EXISTS milestones_number ON milestones (kind, number);
+"""
+
+OPEN_TASKS_BLOCKING = """
+WITH RECURSIVE blocking (chunk, submodule) AS (
+    SELECT chunk, submodule FROM milestones
+    WHERE kind = ? AND number = ? AND (? IS NULL OR docname = ?)
+    UNION
+    SELECT edges.dependency_chunk, edges.dependency_submodule
+    FROM edges JOIN blocking
+    ON edges.chunk = blocking.chunk AND edges.submodule = blocking.submodule
+)
+SELECT submodules.chunk, submodules.submodule, chunks.title,
+       submodules.completeness
+FROM blocking
+JOIN submodules ON submodules.chunk = blocking.chunk
+    AND submodules.submodule = blocking.submodule
+JOIN chunks ON chunks.key = submodules.chunk
+WHERE submodules.completeness < 1
+ORDER BY submodules.chunk, submodules.submodule
+"""
+
+
+def _minute(time):
+    return None if time is None else to_epoch_minutes(time)
+
+
+class TimelineStore(object):
+    """
+    the SQLite database `path` mirroring the timeline model.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def documents(self):
+        return set(
+            row[0] for row in
+            self.connection.execute('SELECT docname FROM documents'))
+
+    def purge(self, docname):
+        """
+        removes the document `docname` and everything defined in it.
+        """
+        with self.connection:
+            self.connection.execute(
+                'DELETE FROM documents WHERE docname = ?', (docname,))
+
+    def update_document(self, docname, tcs):
+        """
+        replaces the timeline chunks of the document `docname` with the ones
+        of the container `tcs` in one transaction.
+        """
+        chunks = [
+            tcs.chunks[key]
+            for key in sorted(tcs.docname_chunks.get(docname, ()))]
+        with self.connection as c:
+            c.execute('DELETE FROM documents WHERE docname = ?', (docname,))
+            c.execute('INSERT INTO documents VALUES (?)', (docname,))
+            c.executemany(
+                'INSERT INTO chunks VALUES (?, ?, ?, ?)',
+                [(tc.key, docname, tc.title, tc.ref_target() if tc.ids
+                  else None) for tc in chunks])
+            c.executemany(
+                'INSERT INTO submodules VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(tc.key, sm, tc.get_requested_time(sm),
+                  tc.get_worked_minutes(sm), tc.get_completeness(sm),
+                  _minute(tc.start_times.get(sm)),
+                  _minute(tc.end_times.get(sm)))
+                 for tc in chunks for sm in range(tc.num_submodules())])
+            c.executemany(
+                'INSERT OR IGNORE INTO aliases VALUES (?, ?)',
+                [(alias, tc.key) for tc in chunks
+                 for alias in tcs.alias_index.get(tc.key, (None, ()))[1]])
+            c.executemany(
+                'INSERT INTO dependencies VALUES (?, ?, ?)',
+                [(tc.key, sm, dependency) for tc in chunks
+                 for sm, dependencies in sorted(tc.dependencies.iteritems())
+                 for dependency in dependencies])
+            c.executemany(
+                'INSERT INTO entries VALUES (?, ?, ?, ?, ?)',
+                [(tc.key, int(e[i]),
+                  None if e[i + 1] == MISSING_INT else int(e[i + 1]),
+                  int(e[i + 2]), None if e[i + 3] != e[i + 3] else e[i + 3])
+                 for tc in chunks for e in [tc.entries]
+                 for i in xrange(0, len(e), 4)])
+
+    def update(self, tcs):
+        """
+        writes the documents of the container `tcs` that are not stored yet,
+        purges the ones that no longer define timeline chunks and replaces
+        the dependency edges.
+        """
+        tcs.update_aliases()
+        stored = self.documents()
+        for docname in sorted(stored.difference(tcs.docname_chunks)):
+            self.purge(docname)
+        for docname in sorted(set(tcs.docname_chunks).difference(stored)):
+            self.update_document(docname, tcs)
+        self.update_edges(tcs)
+
+    def update_edges(self, tcs):
+        symbols = tcs.symbols
+        with self.connection as c:
+            c.execute('DELETE FROM edges')
+            c.executemany(
+                'INSERT INTO edges VALUES (?, ?, ?, ?)',
+                [(symbols.name(sid), symbols.submodule(sid),
+                  symbols.name(child), symbols.submodule(child))
+                 for sid, children in tcs.dependency_graph().iteritems()
+                 for child in children])
+
+    def update_stats(self, submodule_nodes):
+        """
+        replaces the stats with the ones of the resolved `submodule_nodes`.
+        """
+        rows = []
+        for sn in submodule_nodes:
+            if sn.total_stats is None:
+                continue
+            schedule = sn.schedule or {}
+            rows.append((
+                sn.timechunk.key, sn.submodule,
+                sn.total_stats['time_req'], sn.total_stats['minutes_worked'],
+                sn.total_stats['done_time'], schedule.get('es'),
+                schedule.get('ef'), schedule.get('slack')))
+        with self.connection as c:
+            c.execute('DELETE FROM stats')
+            c.executemany(
+                'INSERT INTO stats VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def update_milestones(self, docname, tn):
+        """
+        replaces the milestones and deadlines of the timeline node `tn` of
+        the document `docname`.
+        """
+        rows = []
+        for kind, items, nodes in [
+                ('milestone', tn.milestones, tn.milestone_nodes),
+                ('deadline', tn.deadlines, tn.deadline_nodes)]:
+            for number, (item, sns) in enumerate(zip(items, nodes)):
+                rows += [
+                    (docname, kind, number + 1, sn.timechunk.key,
+                     sn.submodule, _minute(item['time'])) for sn in sns]
+        with self.connection as c:
+            c.execute('DELETE FROM milestones WHERE docname = ?', (docname,))
+            c.executemany(
+                'INSERT INTO milestones VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def resolve_alias(self, alias):
+        """
+        returns the keys of the chunks referenced by `alias`.
+        """
+        return [row[0] for row in self.connection.execute(
+            'SELECT chunk FROM aliases WHERE alias = ? ORDER BY chunk',
+            (alias.lower(),))]
+
+    def open_tasks_blocking(self, number, kind='milestone', docname=None):
+        """
+        returns the chunk key, the submodule, the title and the completeness
+        of the unfinished submodules of the milestone (or deadline) `number`
+        and of all submodules it depends on.  Milestones are numbered from 1.
+        """
+        return self.connection.execute(
+            OPEN_TASKS_BLOCKING, (kind, number, docname, docname)).fetchall()
+
+    def hours_logged(self, start, end):
+        """
+        returns the hours of the worked-on entries dated from `start` up to,
+        but not including, `end`.
+        """
+        minutes = self.connection.execute(
+            'SELECT TOTAL(minutes) FROM entries'
+            ' WHERE minute >= ? AND minute < ?',
+            (to_epoch_minutes(start), to_epoch_minutes(end))).fetchone()[0]
+        return minutes / 60.
+
+
+def get_store(app):
+    """
+    returns the TimelineStore of the `timeline_sqlite` config value, or None
+    if it is not set.
+    """
+    if not app.config.timeline_sqlite:
+        return None
+    path = os.path.join(app.outdir, app.config.timeline_sqlite)
+    store = getattr(app, 'timeline_store', None)
+    if store is None or store.path != path:
+        store = app.timeline_store = TimelineStore(path)
+    return store
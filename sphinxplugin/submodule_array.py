@@ -0,0 +1,158 @@
+"""
+Compact per-submodule storage for the fields of the timeline chunks.
+
+The values of a field are kept in one typed array indexed by the submodule
+number instead of a dictionary of python objects, which keeps the pickled
+environment small for projects with many submodules.  Submodules without a
+value hold the `missing` marker of the array.
+"""
+from array import array
+from datetime import datetime, timedelta
+
+
+# marks unset integer entries; 'l' arrays are at least 32 bits wide
+MISSING_INT = -2 ** 31
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_minutes(value):
+    """
+    returns the minutes since the epoch of the datetime `value`, dropping
+    seconds and the time zone.
+    """
+    delta = value.replace(tzinfo=None) - EPOCH
+    return delta.days * 1440 + delta.seconds // 60
+
+
+def from_epoch_minutes(minutes):
+    return EPOCH + timedelta(minutes=minutes)
+
+
+class SubmoduleArray(object):
+    """
+    a mapping from submodule numbers to values stored in a typed array.
+    """
+
+    __slots__ = ('values',)
+
+    typecode = 'l'
+    missing = MISSING_INT
+
+    def __init__(self, items=()):
+        self.values = array(self.typecode)
+        if hasattr(items, 'items'):
+            items = items.items()
+        for num, value in items:
+            self[num] = value
+
+    def __getstate__(self):
+        return self.values.tostring()
+
+    def __setstate__(self, state):
+        self.values = array(self.typecode)
+        self.values.fromstring(state)
+
+    def tostring(self):
+        return self.values.tostring()
+
+    @classmethod
+    def fromstring(cls, data):
+        """
+        returns the SubmoduleArray of the raw buffer `data` written by
+        `tostring`.
+        """
+        self = cls.__new__(cls)
+        self.values = array(cls.typecode, data)
+        return self
+
+    def _is_missing(self, stored):
+        return stored == self.missing
+
+    def _load(self, stored):
+        return stored
+
+    def _store(self, value):
+        return value
+
+    def __getitem__(self, num):
+        if 0 <= num < len(self.values):
+            stored = self.values[num]
+            if not self._is_missing(stored):
+                return self._load(stored)
+        raise KeyError(num)
+
+    def __setitem__(self, num, value):
+        if num >= len(self.values):
+            self.values.extend(
+                [self.missing] * (num + 1 - len(self.values)))
+        self.values[num] = self._store(value)
+
+    def __contains__(self, num):
+        return (0 <= num < len(self.values)
+                and not self._is_missing(self.values[num]))
+
+    def get(self, num, default=None):
+        if num in self:
+            return self[num]
+        return default
+
+    def keys(self):
+        return [
+            num for num, stored in enumerate(self.values)
+            if not self._is_missing(stored)]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(num, self[num]) for num in self.keys()]
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def __eq__(self, other):
+        if hasattr(other, 'items'):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, dict(self.items()))
+
+
+class FloatArray(SubmoduleArray):
+    """
+    a SubmoduleArray of floats, unset entries are NaN.
+    """
+
+    __slots__ = ()
+
+    typecode = 'd'
+    missing = float('nan')
+
+    def _is_missing(self, stored):
+        return stored != stored
+
+
+class DatetimeArray(SubmoduleArray):
+    """
+    a SubmoduleArray of datetimes stored as minutes since the epoch.
+
+    Seconds and time zones are dropped.
+    """
+
+    __slots__ = ()
+
+    def _load(self, stored):
+        return from_epoch_minutes(stored)
+
+    def _store(self, value):
+        return to_epoch_minutes(value)
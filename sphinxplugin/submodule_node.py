@@ -1,146 +1,265 @@
-import re
+import hashlib
 from datetime import datetime
+
 from . import utils
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class SubmoduleNode(object):
 
+    __slots__ = (
+        'symbol', 'name', 'timechunk', 'submodule', 'children', 'resolved',
+        'rendered', 'important', 'group', 'stats', 'total_stats',
+        'descendants', 'num_descendants', 'schedule', 'container', 'index',
+        'stats_key')
+
     def __init__(self, tcs, fullid):
-        parts = utils.split_name_and_submodule(fullid)
-        self.name = parts[0]
-        self.timechunk = tcs.chunks[parts[0]]
-        if len(parts) > 1:
-            self.submodule = parts[1]
-        else:
-            self.submodule = 0
+        if isinstance(fullid, basestring):
+            fullid = tcs.symbols.intern_id(fullid)
+        self.symbol = fullid
+        self.name = tcs.symbols.name(fullid)
+        self.timechunk = tcs.chunks[self.name]
+        self.submodule = tcs.symbols.submodule(fullid)
         self.timechunk.submodules[self.submodule] = self
         self.children = []
+        self.resolved = False
+        self.rendered = False
         self.important = False
         self.group = None
+        self.schedule = None
         self.stats = None
+        self.total_stats = None
+        self.stats_key = None
+        self.container = tcs
+        self.index = tcs.add_submodule_node(self)
 
-    def set_important(self):
-        self.important = True
-        for child in self.children:
-            if not child.important:
-                child.set_important()
+    def set_rendered(self):
+        """
+        marks this submodule and all submodules it depends on for rendering.
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if not node.rendered:
+                node.rendered = True
+                stack += node.children
 
     def get_full_id(self, nowhitespace=False):
-        ret = utils.id_from_name_and_submodule(self.name, self.submodule)
         if nowhitespace:
-            ret = re.sub(r'[()]', r'', ret)
-            ret = re.sub(r'\W+', r'-', ret)
-        return ret
-
-    def compute_work_stats(self, stats):
-        if self.stats is None:
-            tc = self.timechunk
-            sn = self.submodule
-            time_req = tc.get_requested_time(sn)
-            minutes_worked = tc.get_worked_minutes(sn)
-            time_worked = tc.get_worked_time(sn)  # in days
-            complete = tc.get_completeness(sn)
-            self.stats = {
-                'time_req': time_req,
-                'minutes_worked': minutes_worked,
-                'time_worked': time_worked,
-                'done': complete,
-            }
+            return self.container.symbols.blockdiag_id(self.symbol)
+        return self.container.symbols.display_id(self.symbol)
 
-            self.timechunk.add_stats(self.submodule, self.stats)
+    def compute_work_stats(self):
+        """
+        computes the stats of this submodule and the rolled-up stats of all
+        submodules it depends on in a single iterative post-order pass.
 
-            total_stats = {
-                'start_time': datetime.now(), 'time_req': {},
-                'minutes_worked': {}, 'done': {}
-            }
-            for child in self.children:
-                child.compute_work_stats(total_stats)
-
-            fi = self.get_full_id()
-            start_time = tc.get_start_time(sn)
-            if 'start_time' in total_stats:
-                total_stats['start_time'] = min(
-                    start_time, total_stats['start_time'])
+        Every submodule is visited exactly once, even if several submodules
+        depend on it.  Returns the rolled-up stats of this submodule.
+        """
+        stack = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if node.total_stats is not None:
+                continue
+            if expanded:
+                node._aggregate_stats()
             else:
-                total_stats['start_time'] = start_time
-            total_stats['time_req'][fi] = time_req
-            total_stats['minutes_worked'][fi] = minutes_worked
-            total_stats['done'][fi] = complete
-
-            self.total_stats = total_stats
-        self.merge_stats(stats)
-
-    def merge_stats(self, stats, other_stats=None):
-        if other_stats is None:
-            ts = self.total_stats
-        else:
-            ts = other_stats
-        if len(stats) == 0:
-            stats.update(ts)
-        else:
-            stats['start_time'] = min(ts['start_time'], stats['start_time'])
-            for key in ['time_req', 'minutes_worked', 'done']:
-                stats[key].update(ts[key])
+                stack.append((node, True))
+                stack += [
+                    (child, False) for child in node.children
+                    if child.total_stats is None]
+        return self.total_stats
+
+    def _aggregate_stats(self):
+        """
+        computes the stats of this submodule after those of its children.
+
+        The stats are reused from the stats cache of the container if
+        neither the inputs of this submodule nor those of any submodule it
+        depends on changed, so only changed submodules and the submodules
+        depending on them are recomputed.
+        """
+        tcs = self.container
+        tc = self.timechunk
+        sn = self.submodule
+        # the symbol ids are part of the key, as the cached descendants are
+        # a bitmask of them and released ids are reused
+        self.stats_key = hashlib.md5('{}:{}:{}:{}'.format(
+            self.symbol, tcs.input_hash(tc), sn,
+            ''.join(child.stats_key for child in self.children))).digest()
+        cached = tcs.stats_cache.get(self.symbol)
+        if cached is not None and cached[0] == self.stats_key:
+            (_, self.stats, self.total_stats, self.descendants,
+             self.num_descendants) = cached
+            tc.add_stats(sn, self.stats)
+            return
+
+        time_req = tc.get_requested_time(sn)
+        minutes_worked = tc.get_worked_minutes(sn)
+        time_worked = tc.get_worked_time(sn)  # in days
+        complete = tc.get_completeness(sn)
+        self.stats = {
+            'time_req': time_req,
+            'minutes_worked': minutes_worked,
+            'time_worked': time_worked,
+            'done': complete,
+        }
+
+        self.timechunk.add_stats(self.submodule, self.stats)
+
+        self.total_stats, self.descendants, self.num_descendants = (
+            _sum_stats([self], self.children, self.container))
+        tcs.stats_cache[self.symbol] = (
+            self.stats_key, self.stats, self.total_stats, self.descendants,
+            self.num_descendants)
 
     def get_title_with_submodule(self):
         return utils.id_from_name_and_submodule(
             self.timechunk.title, self.submodule)
 
-    def visit_dependency_resolution(self, timechunks, parents):
-        tc = self.timechunk
-        for dep in tc.get_dependencies(self.submodule):
-            try:
-                depname = timechunks.get_chunk_id(dep, True, True)
-                for sn in depname:
-                    if sn in parents:
-                        # TODO: make this a parser error
-                        raise ValueError(
-                            "Cyclic dependency in graph!"
-                            "  {} depends on istself. {} -> {}"
-                            .format(sn, sn, ' -> '.join(parents)))
-                    self.children.append(SubmoduleNode(timechunks, sn))
-            except KeyError:
-                print "Could not resolve dependency {}".format(dep)
-        #        tc.submodules[self.submodule] = self
-        for child in self.children:
-            child.visit_dependency_resolution(
-                timechunks, parents + [self.get_full_id()])
-
-    def traverse_edge_lines(self, lines):
-        fi = self.get_full_id(True)
-        for child in self.children:
-            lines.append(
-                self.blockdiag_edge_format(fi, child.get_full_id(True)))
-            child.traverse_edge_lines(lines)
-
-    def blockdiag_edge_format(self, fi, ci):
-        if not self.important:
-            return ""
-        ret = '{} -> {}'.format(ci, fi)
-        options = []
-        if self.important:
-            options.append('color = "red"')
-        if len(options) > 0:
-            ret += ' [{}]'.format(', '.join(options))
-        return ret
-
-    def blockdiag_node_format(self):
-        if not self.important:
-            return ""
-        ret = self.get_full_id(True)
-        pref = self.timechunk.parent.attributes['ids'][-1]
-        options = []
-        if self.group:
-            options.append('group = "{}"'.format(self.group))
-        if self.important:
-            options.append('linecolor = "red"')
-        options.append('label = "{}"'.format(self.get_title_with_submodule()))
-        options.append('href = ":ref:`{}`"'.format(pref))
-        if len(options) > 0:
-            ret += ' [{}]'.format(', '.join(options))
-        return ret
-
-    def get_blockdiag_nodes(self, nodes):
-        nodes.add(self.blockdiag_node_format())
-        for child in self.children:
-            child.get_blockdiag_nodes(nodes)
+
+def iter_submodules(nodes):
+    """
+    yields the submodule nodes `nodes` and all submodules they depend on,
+    every submodule exactly once, in depth-first order.
+    """
+    visited = set()
+    stack = list(reversed(nodes))
+    while stack:
+        node = stack.pop()
+        if node in visited:
+            continue
+        visited.add(node)
+        yield node
+        stack.extend(reversed(node.children))
+
+
+class OwnStats(object):
+    """
+    the own stats of all submodules of the container `tcs` in flat lists
+    indexed by their symbol ids, with NumPy arrays of them if it is
+    installed.
+
+    Submodules without a start time start `now`, which is taken once for all
+    submodules.
+    """
+
+    def __init__(self, tcs, now=None):
+        if now is None:
+            now = datetime.now()
+        submodules = [
+            (tcs.symbols.intern(key, sm), tc, sm)
+            for key, tc in tcs.chunks.iteritems()
+            for sm in range(tc.num_submodules())]
+        size = len(tcs.symbols)
+        self.start_times = [now] * size
+        # the start times as seconds since `now` to find the minimum
+        self.starts = [0.] * size
+        self.time_req = [0] * size
+        self.minutes_worked = [0] * size
+        self.done_time = [0.] * size
+        for sid, tc, sm in submodules:
+            start = tc.start_times.get(sm)
+            if start is not None:
+                self.start_times[sid] = start
+                self.starts[sid] = (start - now).total_seconds()
+            time_req = tc.get_requested_time(sm)
+            self.time_req[sid] = time_req
+            self.minutes_worked[sid] = tc.get_worked_minutes(sm)
+            self.done_time[sid] = tc.get_completeness(sm) * time_req
+        self.arrays = None
+        if numpy is not None:
+            self.arrays = [
+                numpy.array(values) for values in [
+                    self.starts, self.time_req, self.minutes_worked,
+                    self.done_time]]
+
+    def get(self, sid):
+        return {
+            'start_time': self.start_times[sid],
+            'time_req': self.time_req[sid],
+            'minutes_worked': self.minutes_worked[sid],
+            'done_time': self.done_time[sid],
+        }
+
+    def sum(self, mask):
+        """
+        returns the summed stats of the submodules in the bitmask `mask`.
+        """
+        # the bits of the mask, the lowest first
+        bits = bin(mask)[:1:-1]
+        if self.arrays is not None:
+            selected = numpy.frombuffer(bits, dtype='S1') == '1'
+            starts, time_req, minutes_worked, done_time = [
+                values[:len(bits)][selected] for values in self.arrays]
+            first = int(starts.argmin())
+            return {
+                'start_time': self.start_times[
+                    int(numpy.flatnonzero(selected)[first])],
+                'time_req': time_req.sum().item(),
+                'minutes_worked': minutes_worked.sum().item(),
+                'done_time': float(done_time.sum()),
+            }
+
+        sids = [sid for sid, bit in enumerate(bits) if bit == '1']
+        first = min(sids, key=self.starts.__getitem__)
+        return {
+            'start_time': self.start_times[first],
+            'time_req': sum(self.time_req[sid] for sid in sids),
+            'minutes_worked': sum(self.minutes_worked[sid] for sid in sids),
+            'done_time': sum(self.done_time[sid] for sid in sids),
+        }
+
+
+def _sum_stats(own_nodes, nodes, tcs):
+    """
+    sums the rolled-up stats of `nodes` and the own stats of `own_nodes`,
+    counting every submodule in their dependency sets only once.
+
+    The dependency sets are bitmasks over the symbol ids of the submodules,
+    which are kept for the whole build, so they can be cached.  If the
+    sets are disjoint, the rolled-up stats of `nodes` are simply added up.
+    Otherwise, the own stats of the submodules in their union are summed
+    from the flat per-symbol lists of OwnStats, in linear time.
+
+    Returns the summed stats, the union of the dependency sets and its size.
+    """
+    descendants = 0
+    count = 0
+    for node in own_nodes:
+        descendants |= 1 << node.symbol
+        count += 1
+    for node in nodes:
+        descendants |= node.descendants
+        count += node.num_descendants
+    num_descendants = bin(descendants).count('1')
+
+    own_stats = tcs.get_own_stats()
+    if num_descendants != count:
+        return own_stats.sum(descendants), descendants, num_descendants
+
+    parts = [own_stats.get(node.symbol) for node in own_nodes]
+    parts += [node.total_stats for node in nodes]
+    total_stats = {
+        'start_time': min(part['start_time'] for part in parts)}
+    for key in ['time_req', 'minutes_worked', 'done_time']:
+        total_stats[key] = sum(part[key] for part in parts)
+
+    return total_stats, descendants, num_descendants
+
+
+def combine_work_stats(nodes):
+    """
+    returns the rolled-up stats of the union of the submodules `nodes` and
+    all submodules they depend on.
+    """
+    for node in nodes:
+        node.compute_work_stats()
+    if len(nodes) == 1:
+        return nodes[0].total_stats
+    return _sum_stats([], nodes, nodes[0].container)[0]
@@ -0,0 +1,195 @@
+"""
+A layered layout and SVG writer for timeline graphs.
+
+It needs no external binaries and lays out graphs with thousands of nodes
+in linear time per sweep: nodes are assigned to layers by the longest path
+from the tasks without dependencies and ordered within their layers by a few
+barycenter sweeps.
+"""
+from collections import deque
+from xml.sax.saxutils import escape, quoteattr
+
+
+NODE_WIDTH = 176
+NODE_HEIGHT = 36
+H_GAP = 24
+V_GAP = 48
+MARGIN = 16
+FONT_SIZE = 11
+LEGEND_HEIGHT = 24
+MAX_LABEL_LENGTH = 28
+SWEEPS = 4
+
+DEFAULT_COLOR = '#ffffff'
+IMPORTANT_COLOR = 'red'
+EDGE_COLOR = '#333333'
+
+
+def assign_layers(graph):
+    """
+    returns the list of layers of `graph`, each a list of node ids.
+
+    Every node is placed one layer below the lowest of its dependencies.
+    """
+    ids = sorted(graph.nodes)
+    dependants = dict((node_id, []) for node_id in ids)
+    in_degree = dict((node_id, 0) for node_id in ids)
+    for source, target, important in graph.edges:
+        dependants[source].append(target)
+        in_degree[target] += 1
+
+    layer = dict((node_id, 0) for node_id in ids)
+    queue = deque(node_id for node_id in ids if in_degree[node_id] == 0)
+    ordered = []
+    while queue:
+        node_id = queue.popleft()
+        ordered.append(node_id)
+        for target in dependants[node_id]:
+            layer[target] = max(layer[target], layer[node_id] + 1)
+            in_degree[target] -= 1
+            if in_degree[target] == 0:
+                queue.append(target)
+    # nodes on cycles never reach in-degree zero; keep them in their layer
+    ordered += [node_id for node_id in ids if in_degree[node_id] > 0]
+
+    layers = [[] for i in range(max(layer.values() or [0]) + 1)]
+    for node_id in ordered:
+        layers[layer[node_id]].append(node_id)
+    return layers
+
+
+def _order_layers(graph, layers):
+    dependencies = dict((node_id, []) for node_id in graph.nodes)
+    dependants = dict((node_id, []) for node_id in graph.nodes)
+    for source, target, important in graph.edges:
+        dependencies[target].append(source)
+        dependants[source].append(target)
+
+    position = {}
+    for nodes in layers:
+        for i, node_id in enumerate(nodes):
+            position[node_id] = i
+
+    def sort_layer(nodes, neighbours):
+        def barycenter(node_id):
+            adjacent = neighbours[node_id]
+            if not adjacent:
+                return position[node_id]
+            return sum(position[n] for n in adjacent) / float(len(adjacent))
+        nodes.sort(key=lambda node_id: (barycenter(node_id), node_id))
+        for i, node_id in enumerate(nodes):
+            position[node_id] = i
+
+    for sweep in range(SWEEPS):
+        for nodes in layers[1:]:
+            sort_layer(nodes, dependencies)
+        for nodes in reversed(layers[:-1]):
+            sort_layer(nodes, dependants)
+    return layers
+
+
+def layout(graph):
+    """
+    returns a dictionary with the top left corner of every node of `graph`,
+    and the total width and height of the diagram.
+    """
+    layers = _order_layers(graph, assign_layers(graph))
+    columns = max([len(nodes) for nodes in layers] or [0])
+    top = MARGIN + (LEGEND_HEIGHT if graph.groups else 0)
+
+    positions = {}
+    for row, nodes in enumerate(layers):
+        offset = (columns - len(nodes)) * (NODE_WIDTH + H_GAP) / 2.
+        for column, node_id in enumerate(nodes):
+            positions[node_id] = (
+                MARGIN + offset + column * (NODE_WIDTH + H_GAP),
+                top + row * (NODE_HEIGHT + V_GAP))
+
+    width = 2 * MARGIN + max(columns * (NODE_WIDTH + H_GAP) - H_GAP, 0)
+    height = top + MARGIN + max(
+        len(layers) * (NODE_HEIGHT + V_GAP) - V_GAP, 0)
+    return positions, width, height
+
+
+def _label(label):
+    if len(label) > MAX_LABEL_LENGTH:
+        label = label[:MAX_LABEL_LENGTH - 3] + u'...'
+    return escape(label)
+
+
+def write_svg(graph, resolve_href=None):
+    """
+    returns the SVG document of `graph` as a unicode string.
+
+    `resolve_href` maps the reference targets of the nodes to URIs, nodes
+    without an URI are not linked.
+    """
+    positions, width, height = layout(graph)
+    colors = dict((group['id'], group['color']) for group in graph.groups)
+
+    out = [
+        u'<svg xmlns="http://www.w3.org/2000/svg" '
+        u'xmlns:xlink="http://www.w3.org/1999/xlink" class="timeline" '
+        u'width="{0}" height="{1}" viewBox="0 0 {0} {1}">'
+        .format(width, height),
+        u'<defs>',
+    ]
+    for name, color in [('arrow', EDGE_COLOR),
+                        ('arrow-important', IMPORTANT_COLOR)]:
+        out.append(
+            u'<marker id="timeline-{}" markerWidth="8" markerHeight="8" '
+            u'refX="8" refY="4" orient="auto">'
+            u'<path d="M0,0 L8,4 L0,8 z" fill="{}"/></marker>'
+            .format(name, color))
+    out.append(u'</defs>')
+
+    x = MARGIN
+    for group in graph.groups:
+        out.append(
+            u'<rect x="{}" y="{}" width="12" height="12" fill={} '
+            u'stroke="{}"/><text x="{}" y="{}" font-size="{}">{}</text>'
+            .format(x, MARGIN, quoteattr(group['color']), EDGE_COLOR, x + 16,
+                    MARGIN + 10, FONT_SIZE, escape(group['label'])))
+        x += 16 + 8 * len(group['label']) + 16
+
+    out.append(u'<g class="edges" fill="none">')
+    for source, target, important in graph.edges:
+        x1, y1 = positions[source]
+        x2, y2 = positions[target]
+        x1 += NODE_WIDTH / 2.
+        x2 += NODE_WIDTH / 2.
+        y1 += NODE_HEIGHT
+        middle = (y1 + y2) / 2.
+        name = 'arrow-important' if important else 'arrow'
+        out.append(
+            u'<path d="M{},{} C{},{} {},{} {},{}" stroke="{}" '
+            u'marker-end="url(#timeline-{})"/>'
+            .format(x1, y1, x1, middle, x2, middle, x2, y2,
+                    IMPORTANT_COLOR if important else EDGE_COLOR, name))
+    out.append(u'</g>')
+
+    out.append(u'<g class="nodes" font-size="{}">'.format(FONT_SIZE))
+    for node_id in sorted(graph.nodes):
+        node = graph.nodes[node_id]
+        x, y = positions[node_id]
+        href = None
+        if resolve_href is not None and node['href']:
+            href = resolve_href(node['href'])
+        if href:
+            out.append(u'<a xlink:href={}>'.format(quoteattr(href)))
+        out.append(
+            u'<g><title>{}</title>'
+            u'<rect x="{}" y="{}" width="{}" height="{}" rx="4" fill={} '
+            u'stroke="{}"/>'
+            u'<text x="{}" y="{}" text-anchor="middle">{}</text></g>'
+            .format(escape(node['label']), x, y, NODE_WIDTH, NODE_HEIGHT,
+                    quoteattr(colors.get(node['group'], DEFAULT_COLOR)),
+                    IMPORTANT_COLOR if node['important'] else EDGE_COLOR,
+                    x + NODE_WIDTH / 2.,
+                    y + NODE_HEIGHT / 2. + FONT_SIZE / 3.,
+                    _label(node['label'])))
+        if href:
+            out.append(u'</a>')
+    out.append(u'</g>')
+    out.append(u'</svg>')
+    return u'\n'.join(out)
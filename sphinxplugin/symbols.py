@@ -0,0 +1,112 @@
+import re
+import heapq
+
+from . import utils
+
+
+class SymbolTable(object):
+    """
+    interns the ids of the task submodules.
+
+    Every pair of a chunk key and a submodule number gets an integer id, the
+    resolution and rendering code passes these ids around instead of
+    formatting and parsing id strings.  The display id (`task (II)`) and the
+    blockdiag-safe id (`task-II`) of every submodule are computed once, when
+    it is interned.
+
+    The ids of submodules that no longer exist are released and reused, so
+    the ids stay dense as chunks are removed and renamed across builds.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.id_strings = {}
+        self.names = []
+        self.submodules = []
+        self.display_ids = []
+        self.blockdiag_ids = []
+        # released ids below len(self), reused lowest first
+        self.free = []
+
+    def __len__(self):
+        """
+        returns the upper bound of the ids in use.
+        """
+        return len(self.names)
+
+    def intern(self, name, submodule=0):
+        """
+        returns the id of the submodule `submodule` of the chunk `name`.
+        """
+        key = (name, submodule)
+        try:
+            return self.ids[key]
+        except KeyError:
+            pass
+        display_id = utils.id_from_name_and_submodule(name, submodule)
+        values = [
+            name, submodule, display_id,
+            re.sub(r'\W+', r'-', re.sub(r'[()]', r'', display_id))]
+        columns = [
+            self.names, self.submodules, self.display_ids, self.blockdiag_ids]
+        if self.free:
+            sid = heapq.heappop(self.free)
+            for column, value in zip(columns, values):
+                column[sid] = value
+        else:
+            sid = len(self.names)
+            for column, value in zip(columns, values):
+                column.append(value)
+        self.ids[key] = sid
+        return sid
+
+    def release(self, keep):
+        """
+        releases the ids of the submodules for which `keep(name, submodule)`
+        is false, so they are reused by the submodules interned next.
+        Returns the set of released ids.
+        """
+        released = set(
+            sid for key, sid in self.ids.iteritems() if not keep(*key))
+        if not released:
+            return released
+        for sid in released:
+            del self.ids[(self.names[sid], self.submodules[sid])]
+        self.id_strings = dict(
+            (fullid, sid) for fullid, sid in self.id_strings.iteritems()
+            if sid not in released)
+        free = released.union(self.free)
+        # drop the released ids at the end of the table
+        while self.names and len(self.names) - 1 in free:
+            free.remove(len(self.names) - 1)
+            for column in [self.names, self.submodules, self.display_ids,
+                           self.blockdiag_ids]:
+                column.pop()
+        self.free = sorted(free)
+        return released
+
+    def intern_id(self, fullid):
+        """
+        returns the id of the submodule with the display id `fullid`, e.g.
+        `task (II)`.  A plain chunk name refers to its first submodule.
+        """
+        try:
+            return self.id_strings[fullid]
+        except KeyError:
+            pass
+        parts = utils.split_name_and_submodule(fullid)
+        sid = self.intern(parts[0], parts[1] if len(parts) > 1 else 0)
+        self.id_strings[fullid] = sid
+        return sid
+
+    def name(self, sid):
+        return self.names[sid]
+
+    def submodule(self, sid):
+        return self.submodules[sid]
+
+    def display_id(self, sid):
+        return self.display_ids[sid]
+
+    def blockdiag_id(self, sid):
+        return self.blockdiag_ids[sid]
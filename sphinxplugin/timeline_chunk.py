@@ -1,10 +1,17 @@
-import re
 import docutils
-from datetime import datetime
-import dateutil.parser
-import roman
+import hashlib
+from array import array
+from datetime import date, datetime
+from sphinx.util import logging
 from . import utils
-from .submodule_node import SubmoduleNode
+from . import graph
+from .submodule_node import SubmoduleNode, OwnStats
+from .symbols import SymbolTable
+from .submodule_array import (
+    SubmoduleArray, FloatArray, DatetimeArray, MISSING_INT, to_epoch_minutes)
+
+
+logger = logging.getLogger(__name__)
 
 
 class TimelineChunksContainer(object):
@@ -14,25 +21,168 @@ class TimelineChunksContainer(object):
         self.chunks = {}
         self.aliases = {}
         self.groups = {}
+        # per-docname index of the chunk keys and group names defined there
+        self.docname_chunks = {}
+        self.docname_groups = {}
+        # chunks and groups indexed by the key of the section enclosing the
+        # chunk, see utils.section_key
+        self.section_chunks = {}
+        self.section_groups = {}
+        # inverted alias index: chunk key -> (alias value, alias keys)
+        self.alias_index = {}
+        self.outdated_aliases = set()
+        # submodule nodes of the current resolution, indexed by creation,
+        # and the own stats of all submodules, see get_own_stats
+        self.submodule_nodes = []
+        self.own_stats = None
+        # interned submodule ids, kept for the whole build
+        self.symbols = SymbolTable()
+        # cached worklog aggregates by path, the chunks they were added to
+        # and the signature of the worklog files, see worklog
+        self.worklogs = {}
+        self.worklog_chunks = set()
+        self.worklog_signature = ()
+        # trailers of the git worklog by commit hash and the head read last
+        self.git_commits = {}
+        self.git_head = None
+        # stats of the previous resolution by symbol id and stat table rows
+        # by chunk key, each with the hash of the inputs they were computed
+        # from, see input_hash
+        self.stats_cache = {}
+        self.table_cache = {}
+        self.input_hashes = {}
+        # registry of the documents showing timeline data: the documents with
+        # a timeline, their milestones and deadlines, the documents they read
+        # from and the chunk keys of the stat tables of every document
+        self.timeline_docs = set()
+        self.timeline_targets = {}
+        self.timeline_reads = {}
+        self.table_docs = {}
 
     def purge(self, docname):
-        self.chunks = dict(
-            [(key, chunk) for (key, chunk) in self.chunks.iteritems()
-             if chunk.docname != docname])
-        self.groups = dict(
-            [(key, group) for (key, group) in self.groups.iteritems()
-             if group.docname != docname])
-
-        self.aliases = {}
-        self.update_aliases()
+        for key in list(self.docname_chunks.get(docname, ())):
+            self._remove_chunk(key)
+        self.docname_chunks.pop(docname, None)
+
+        for name in self.docname_groups.pop(docname, ()):
+            group = self.groups.get(name)
+            if group is not None and group['docname'] == docname:
+                self._remove_group(name)
+
+        self.timeline_docs.discard(docname)
+        self.timeline_targets.pop(docname, None)
+        self.timeline_reads.pop(docname, None)
+        self.table_docs.pop(docname, None)
+
+    def merge(self, docnames, other):
+        """
+        merges the timeline chunks and task groups defined in the documents
+        `docnames` of the container `other`, e.g. the container read by a
+        parallel worker process.
+
+        Conflicts are resolved like a serial read would resolve them: A chunk
+        title defined in several documents belongs to the document read first
+        and a task group name to the document read last.  As documents are
+        read in sorted order, the result does not depend on the order in
+        which the workers finish.
+        """
+        for docname in sorted(docnames):
+            for key in sorted(other.docname_chunks.get(docname, ())):
+                tc = other.chunks[key]
+                if key in self.chunks:
+                    existing = self.chunks[key]
+                    logger.warning(
+                        'timeline chunk %s defined in %s and %s',
+                        key, existing.docname, docname)
+                    if existing.docname <= docname:
+                        continue
+                    self._remove_chunk(key)
+                tc.container = self
+                self._register_chunk(key, tc)
+
+            for name in sorted(other.docname_groups.get(docname, ())):
+                group = other.groups[name]
+                if group['docname'] != docname:
+                    continue
+                if name in self.groups:
+                    existing = self.groups[name]
+                    logger.warning(
+                        'task group %s defined in %s and %s',
+                        name, existing['docname'], docname)
+                    if existing['docname'] > docname:
+                        continue
+                self._add_group(name, group['section'], docname)
+
+            if docname in other.timeline_docs:
+                self.add_timeline_doc(
+                    docname, *other.timeline_targets[docname])
+            if docname in other.table_docs:
+                self.table_docs[docname] = other.table_docs[docname]
+
+    def _register_chunk(self, key, tc):
+        self.chunks[key] = tc
+        self.docname_chunks.setdefault(tc.docname, set()).add(key)
+        self.section_chunks.setdefault(tc.parent_section(), set()).add(key)
+        self.outdated_aliases.add(key)
+
+    def _remove_chunk(self, key):
+        tc = self.chunks.pop(key)
+        self._unindex_chunk_aliases(key)
+        self.outdated_aliases.discard(key)
+        self.worklog_chunks.discard(key)
+        self.table_cache.pop(key, None)
+        for index, index_key in [
+                (self.docname_chunks, tc.docname),
+                (self.section_chunks, tc.parent_section())]:
+            keys = index.get(index_key)
+            if keys is not None:
+                keys.discard(key)
+                if len(keys) == 0:
+                    del index[index_key]
+
+    def _index_chunk_aliases(self, key):
+        tc = self.chunks[key]
+        value = tc.alias_value()
+        alias_keys = tc.alias_keys(
+            self.section_groups.get(tc.parent_section(), ()))
+        for alias_key in alias_keys:
+            if alias_key in self.aliases:
+                self.aliases[alias_key].add(value)
+            else:
+                self.aliases[alias_key] = set([value])
+        self.alias_index[key] = (value, alias_keys)
+
+    def _unindex_chunk_aliases(self, key):
+        if key not in self.alias_index:
+            return
+        value, alias_keys = self.alias_index.pop(key)
+        for alias_key in alias_keys:
+            values = self.aliases.get(alias_key)
+            if values is None:
+                continue
+            values.discard(value)
+            if len(values) == 0:
+                del self.aliases[alias_key]
+
+    def _outdate_section(self, section):
+        self.outdated_aliases.update(self.section_chunks.get(section, ()))
+
+    def _remove_group(self, name):
+        group = self.groups.pop(name)
+        names = self.section_groups.get(group['section'])
+        if names is not None:
+            names.discard(name)
+            if len(names) == 0:
+                del self.section_groups[group['section']]
+        self._outdate_section(group['section'])
 
     def get_chunk_id(self, name, allow_groups=False, submodule_ids=False):
         parts = utils.split_name_and_submodule(name)
         # TODO: use pending_xrefs to resolve the links
         try:
-            possible_alias = list(self.aliases[parts[0].lower()])
+            possible_alias = sorted(self.aliases[parts[0].lower()])
         except KeyError:
-            possible_alias = list(self.aliases[utils.slugify(parts[0])])
+            possible_alias = sorted(self.aliases[utils.slugify(parts[0])])
 
         if not allow_groups and len(possible_alias) > 1:
             # TODO: add a parser warning
@@ -81,35 +231,330 @@ class TimelineChunksContainer(object):
                      .traverse(docutils.nodes.title)[0]
                      .traverse(docutils.nodes.Text))]))
 
-        if utils.slugify(title) not in self.chunks:
-            self.chunks[utils.slugify(title)] = TimelineChunk(
-                parent, title, parent_name, docname, self)
+        key = utils.slugify(title)
+        if key not in self.chunks:
+            self._register_chunk(
+                key, TimelineChunk(parent, title, parent_name, docname, self))
+        elif self.chunks[key].docname != docname:
+            logger.warning(
+                'timeline chunk %s defined in %s and %s',
+                key, self.chunks[key].docname, docname)
 
-        return self.chunks[utils.slugify(title)]
+        return self.chunks[key]
 
     def add_group(self, name, parent, docname):
+        self._add_group(name, utils.section_key(parent, docname), docname)
+
+    def _add_group(self, name, section, docname):
+        if name in self.groups:
+            self._remove_group(name)
         self.groups[name] = {
-            'parent': parent,
+            'section': section,
             'docname': docname
         }
+        self.docname_groups.setdefault(docname, set()).add(name)
+        self.section_groups.setdefault(section, set()).add(name)
+        self._outdate_section(section)
+
+    def add_timeline_doc(self, docname, milestones, deadlines):
+        self.timeline_docs.add(docname)
+        self.timeline_targets[docname] = (milestones, deadlines)
+
+    def add_table_doc(self, docname, key):
+        self.table_docs.setdefault(docname, set()).add(key)
+
+    def set_timeline_reads(self, docname):
+        """
+        records the documents defining the submodules shown by the timeline
+        of the document `docname` after it was resolved.
+        """
+        self.timeline_reads[docname] = set(
+            sn.timechunk.docname for sn in self.submodule_nodes
+            if sn.rendered or sn.important)
+
+    def outdated_docs(self, added, changed, removed):
+        """
+        returns the documents showing timeline data read from the documents
+        `added`, `changed` or `removed`.
+
+        Added or removed documents may add or remove tasks any timeline
+        depends on, so they outdate all timelines.
+        """
+        touched = set(changed).union(added, removed)
+        outdated = set()
+        for docname in self.timeline_docs:
+            reads = self.timeline_reads.get(docname)
+            if reads is None or added or removed or reads & touched:
+                outdated.add(docname)
+        for docname, keys in self.table_docs.iteritems():
+            if any(self.chunks[key].docname in touched
+                   for key in keys if key in self.chunks):
+                outdated.add(docname)
+        return outdated.difference(removed, changed)
+
+    def outdate_aliases(self, tc):
+        """
+        marks the aliases of the timeline chunk `tc` for re-indexing, e.g.
+        after its number of submodules changed.
+        """
+        self.outdated_aliases.add(tc.key)
 
     def update_aliases(self):
-        for tc in self.chunks.values():
-            tc.update_aliases_with_backreference(self.aliases, self.groups)
+        """
+        re-indexes the aliases of all chunks that were added or changed since
+        the last call.
+        """
+        keys = self.outdated_aliases.union(
+            set(self.chunks.iterkeys()).difference(self.alias_index))
+        for key in keys:
+            self._unindex_chunk_aliases(key)
+            if key in self.chunks:
+                self._index_chunk_aliases(key)
+        self.outdated_aliases = set()
+
+    def get_submodule_node(self, sid):
+        """
+        returns the interned submodule node for the symbol id `sid` or the
+        display id of a submodule.
+        """
+        if isinstance(sid, basestring):
+            sid = self.symbols.intern_id(sid)
+        tc = self.chunks[self.symbols.name(sid)]
+        submodule = self.symbols.submodule(sid)
+        if submodule not in tc.submodules:
+            # registers itself in tc.submodules
+            SubmoduleNode(self, sid)
+        return tc.submodules[submodule]
+
+    def dependency_graph(self):
+        """
+        returns a dictionary mapping the symbol id of every submodule to the
+        symbol ids of the submodules it depends on.
+        """
+        symbols = self.symbols
+        resolved = {}
+        dependencies = {}
+        for key in sorted(self.chunks.iterkeys()):
+            tc = self.chunks[key]
+            for sm in range(tc.num_submodules()):
+                children = []
+                for dep in tc.get_dependencies(sm):
+                    if dep not in resolved:
+                        try:
+                            resolved[dep] = [
+                                symbols.intern(name, dsm) for name, dsm
+                                in self.get_chunk_id(dep, True)]
+                        except KeyError:
+                            logger.warning(
+                                'Could not resolve dependency %s', dep)
+                            resolved[dep] = []
+                    children += [
+                        ci for ci in resolved[dep] if ci not in children]
+                dependencies[symbols.intern(key, sm)] = children
+
+        for children in dependencies.values():
+            for child in children:
+                dependencies.setdefault(child, [])
+        return dependencies
+
+    def resolve_dependencies(self):
+        """
+        resolves the dependencies of all submodules into a DAG of interned
+        submodule nodes and returns the symbol ids of its root submodules,
+        sorted by their display ids.
+
+        Raises a ValueError listing every dependency cycle with the documents
+        the involved tasks are defined in.
+        """
+        self.reset_submodules()
+        self.release_symbols()
+        dependencies = self.dependency_graph()
+
+        cycles = graph.find_cycles(dependencies)
+        if len(cycles) > 0:
+            # TODO: make this a parser error
+            raise ValueError(
+                "Cyclic dependencies in graph!\n{}"
+                .format(self._format_cycles(cycles)))
+
+        dependants = set()
+        for sid, children in dependencies.iteritems():
+            sn = self.get_submodule_node(sid)
+            sn.children = [self.get_submodule_node(ci) for ci in children]
+            sn.resolved = True
+            dependants.update(children)
+
+        return sorted(
+            set(dependencies) - dependants, key=self.symbols.display_id)
+
+    def _format_cycles(self, cycles):
+        cycles = sorted(
+            sorted(self.symbols.display_id(sid) for sid in cycle)
+            for cycle in cycles)
+        lines = []
+        for i, cycle in enumerate(cycles):
+            tasks = []
+            for fi in cycle:
+                name = utils.split_name_and_submodule(fi)[0]
+                tasks.append('{} [{}]'.format(fi, self.chunks[name].docname))
+            lines.append('  cycle {}: {}'.format(i + 1, ', '.join(tasks)))
+        return '\n'.join(lines)
+
+    def add_submodule_node(self, sn):
+        """
+        registers the submodule node `sn` and returns its index.
+        """
+        self.submodule_nodes.append(sn)
+        return len(self.submodule_nodes) - 1
+
+    def reset_submodules(self):
+        """
+        drops the submodule nodes and stats of a previous resolution.
+
+        The stats stay in the `stats_cache` and are reused for submodules
+        whose inputs did not change.
+        """
+        self.submodule_nodes = []
+        self.own_stats = None
+        self.input_hashes = {}
+        for tc in self.chunks.itervalues():
+            tc.submodules = {}
+            tc.stats = {}
+
+    def release_symbols(self):
+        """
+        releases the symbol ids of the submodules that no longer exist, e.g.
+        of removed or renamed chunks, and drops their cached stats.  Called
+        when no submodule nodes hold symbol ids.
+        """
+        chunks = self.chunks
+        released = self.symbols.release(
+            lambda name, submodule: name in chunks
+            and submodule < chunks[name].num_submodules())
+        for sid in released:
+            self.stats_cache.pop(sid, None)
+
+    def get_own_stats(self):
+        """
+        returns the OwnStats of all submodules, computed once per resolution.
+        """
+        if self.own_stats is None:
+            self.own_stats = OwnStats(self)
+        return self.own_stats
+
+    def reset_marks(self):
+        """
+        clears the rendering, group and critical path marks of the submodule
+        nodes, e.g. before the milestones of another timeline are resolved.
+        """
+        for sn in self.submodule_nodes:
+            sn.rendered = False
+            sn.important = False
+            sn.group = None
+
+    def input_hash(self, tc):
+        """
+        returns the hash of the inputs of the timeline chunk `tc` and of the
+        current day, memoized for the current resolution.
+
+        The stats of unfinished tasks depend on the current time, so cached
+        stats are reused on the day they were computed only.
+        """
+        key = tc.key
+        if key not in self.input_hashes:
+            self.input_hashes[key] = '{}:{}'.format(
+                tc.input_hash(), date.today().toordinal())
+        return self.input_hashes[key]
+
+    def prune_stats_cache(self):
+        """
+        drops the cached stats of submodules without stats in the current
+        resolution, e.g. of removed chunks.
+        """
+        self.stats_cache = dict(
+            (sn.symbol, self.stats_cache[sn.symbol])
+            for sn in self.submodule_nodes
+            if sn.stats is not None and sn.symbol in self.stats_cache)
 
     def add_stat_tables(self):
         for tc in self.chunks.values():
             tc.add_stat_tables()
 
 
+def task_stat_table(descriptions):
+    """
+    returns a paragraph with the stat table of a task for the rows
+    `descriptions`.
+    """
+    headers = [
+        '              ',
+        'Requested time',
+        'Percent done  ',
+        'Spent work hrs',
+        'Hours left I  ',
+        'Hours left II ',
+        'Spent days    ',
+        'Work factor   ',
+        'Advance / week',
+        'ETA           ',
+        'ETA 2         ',
+        ]
+    widths = [16] * len(headers)
+
+    paragraph = docutils.nodes.paragraph()
+    paragraph += utils.description_table(descriptions, widths, headers)
+    return paragraph
+
+
+def _array_property(name, array_type):
+    def fget(self):
+        return getattr(self, name)
+
+    def fset(self, items):
+        setattr(self, name, array_type(items))
+    return property(fget, fset)
+
+
 class TimelineChunk(object):
+    """
+    The tasks of one section with their submodules.
+
+    The per-submodule fields are stored in typed arrays, see
+    `submodule_array`.  They can be assigned from dictionaries mapping the
+    submodule numbers to the values, or a list for `time_deltas`.
+
+    Every worked-on entry is also kept in `entries`, a flat array of the
+    submodule, the epoch minute (MISSING_INT without a date), the worked
+    minutes and the completeness (NaN if not given) of each entry.
+    """
+
+    # the slots pickled as they are and the arrays pickled as raw buffers,
+    # with the typecode of the plain arrays or the SubmoduleArray type
+    _plain_slots = (
+        'container', 'ids', 'section', 'title', 'key', 'name', 'docname',
+        'dependencies', 'submodules', 'stats')
+    _array_slots = (
+        ('_time_deltas', 'l'),
+        ('_worked_minutes', SubmoduleArray),
+        ('_start_times', DatetimeArray),
+        ('_end_times', DatetimeArray),
+        ('_completeness', FloatArray),
+        ('entries', 'd'))
+
+    __slots__ = _plain_slots + tuple(slot for slot, kind in _array_slots)
 
     def __init__(self, parent,
                  title='unknown', name='unknown', docname='unknown',
                  container=None):
         self.container = container
-        self.parent = parent
+        # only the ids of the section and the key of its enclosing section
+        # are kept, so no doctree nodes end up in the pickled environment
+        self.ids = (
+            list(parent.attributes['ids']) if parent is not None else [])
+        self.section = utils.section_key(
+            getattr(parent, 'parent', None), docname)
         self.title = title
+        self.key = utils.slugify(title)
         self.name = name
         self.time_deltas = []
         self.dependencies = {}
@@ -119,31 +564,55 @@ class TimelineChunk(object):
         self.start_times = {}
         self.end_times = {}
         self.completeness = {}
+        self.entries = array('d')
         self.stats = {}
 
-    def add_stat_tables(self, ttsn):
-
-        headers = [
-            '              ',
-            'Requested time',
-            'Percent done  ',
-            'Spent work hrs',
-            'Hours left I  ',
-            'Hours left II ',
-            'Spent days    ',
-            'Work factor   ',
-            'Advance / week',
-            'ETA           ',
-            'ETA 2         ',
-            ]
-        widths = [16] * len(headers)
-        meta = [self.stats[key] for key in sorted(self.stats.keys())]
-        descriptions1 = utils.make_descriptions_from_meta(meta, 'Task')
-
-        paragraph = docutils.nodes.paragraph()
-        table = utils.description_table(descriptions1, widths, headers)
-        paragraph += table
-        ttsn.replace_self(paragraph)
+    def __reduce__(self):
+        # one call per chunk with the raw buffers of all its arrays, instead
+        # of pickling every array as an object of its own
+        return (_load_chunk, (
+            tuple(getattr(self, slot) for slot in self._plain_slots),
+            tuple(getattr(self, slot).tostring()
+                  for slot, kind in self._array_slots)))
+
+    # requested minutes of the submodules
+    @property
+    def time_deltas(self):
+        return self._time_deltas
+
+    @time_deltas.setter
+    def time_deltas(self, values):
+        self._time_deltas = array('l', values)
+
+    worked_minutes = _array_property('_worked_minutes', SubmoduleArray)
+    start_times = _array_property('_start_times', DatetimeArray)
+    end_times = _array_property('_end_times', DatetimeArray)
+    completeness = _array_property('_completeness', FloatArray)
+
+    def input_hash(self):
+        """
+        returns a hash of the requested times, the worked-on state and the
+        dependencies of this timeline chunk, i.e. of the inputs of its
+        stats.
+        """
+        h = hashlib.md5()
+        for values in [
+                self._time_deltas, self._worked_minutes.values,
+                self._start_times.values, self._end_times.values,
+                self._completeness.values]:
+            h.update(values.tostring())
+            h.update('|')
+        h.update(repr(sorted(self.dependencies.items())))
+        return h.hexdigest()
+
+    def get_stat_meta(self):
+        return [self.stats[key] for key in sorted(self.stats.keys())]
+
+    def add_stat_tables(self, ttsn, descriptions1=None):
+        if descriptions1 is None:
+            descriptions1 = utils.make_descriptions_from_meta(
+                self.get_stat_meta(), 'Task')
+        ttsn.replace_self(task_stat_table(descriptions1))
 
     def get_dependencies(self, num):
         if num in self.dependencies:
@@ -201,45 +670,35 @@ class TimelineChunk(object):
             else:
                 self.end_times[num] = time
 
+    def add_entry(self, submodule, time, minutes, done):
+        """
+        records a worked-on entry, missing values are None.
+        """
+        self.entries.extend([
+            submodule,
+            MISSING_INT if time is None else to_epoch_minutes(time),
+            minutes or 0,
+            float('nan') if done is None else done])
+
     def num_submodules(self):
 #        assert len(self.time_deltas) > max(self.dependencies.keys())
         return len(self.time_deltas)
 
     def get_submodule(self, num):
-        if num in self.submodules:
-            return self.submodules[num]
-        else:
-            sm = SubmoduleNode(
-                self.container,
-                utils.id_from_name_and_submodule(
-                    utils.slugify(self.title), num))
-            sm.visit_dependency_resolution(self.container, [])
-            return sm
+        if num not in self.submodules or not self.submodules[num].resolved:
+            self.container.resolve_dependencies()
+        return self.submodules[num]
 
     def _parse_worked_on_line(self, line, submodule):
-        parts = re.split(r':', line, 2)
-        lindex = 0
-        time = None
-        try:
-            time = dateutil.parser.parse(parts[0])
+        time, done, minutes = utils.parse_worked_on_line(line)
+        self.add_entry(submodule, time, minutes, done)
+        if time is not None:
             self.set_start_time(submodule, time)
-            lindex = 1
-        except:
-            pass
-
-        nline = ':'.join(parts[lindex:])
-        res = re.search(r'([\d\.]+) *%', nline)
-        if res:
-            nline = nline[0:res.start()]
-            self.set_completeness(submodule, float(res.groups()[0])/100., time)
-        try:
-            time_delta = utils.parse_time_delta(nline)
-            if submodule in self.worked_minutes:
-                self.worked_minutes[submodule] += time_delta
-            else:
-                self.worked_minutes[submodule] = time_delta
-        except ValueError:
-            pass
+        if done is not None:
+            self.set_completeness(submodule, done, time)
+        if minutes is not None:
+            self.worked_minutes[submodule] = (
+                self.get_worked_minutes(submodule) + minutes)
 
     def _parse_worked_strings(self, worked_strings, submodule):
         for ws in worked_strings:
@@ -247,7 +706,7 @@ class TimelineChunk(object):
 
     def parse_worked_on(self, text_or_node, submodule):
 
-        submodule = roman.fromRoman(submodule) - 1
+        submodule = utils.from_roman(submodule) - 1
 
         worked_strings = []
         if isinstance(text_or_node, basestring):
@@ -261,7 +720,7 @@ class TimelineChunk(object):
 
     def parse_dependencies(self, text_or_node, submodule):
 
-        submodule = roman.fromRoman(submodule) - 1
+        submodule = utils.from_roman(submodule) - 1
 
         dep_strings = []
         if isinstance(text_or_node, basestring):
@@ -287,19 +746,47 @@ class TimelineChunk(object):
         self.time_deltas = [
             utils.parse_time_delta(time_string)
             for time_string in time_strings]
-
-    def update_aliases_with_backreference(self, aliases, groups):
-        arg = (utils.slugify(self.title), self.num_submodules())
-        for cid in [utils.slugify(self.title)] + self.parent.attributes['ids']:
-            if cid in aliases.keys():
-                aliases[cid.lower()].add(arg)
-            else:
-                aliases[cid.lower()] = set([arg])
-
-        for gk, gv in groups.iteritems():
-            if self.parent.parent == gv['parent']:
-                if gk in aliases.keys():
-                    aliases[gk.lower()].add(arg)
-                else:
-                    aliases[gk.lower()] = set([arg])
-        return aliases
+        if self.container is not None:
+            self.container.outdate_aliases(self)
+
+    def parent_section(self):
+        """
+        returns the key of the section enclosing the section of this
+        timeline chunk.
+        """
+        return self.section
+
+    def ref_target(self):
+        """
+        returns the label referencing the section of this timeline chunk.
+        """
+        return self.ids[-1]
+
+    def alias_value(self):
+        return (self.key, self.num_submodules())
+
+    def alias_keys(self, group_names=()):
+        """
+        returns the set of keys this timeline chunk can be referenced by.
+
+        These are the slugified title, the ids of the parent section and the
+        names of the task groups defined in the enclosing section.
+        """
+        keys = [self.key] + self.ids
+        keys += list(group_names)
+        return frozenset(key.lower() for key in keys)
+
+
+def _load_chunk(state, buffers):
+    """
+    returns the TimelineChunk pickled by `TimelineChunk.__reduce__`.
+    """
+    tc = TimelineChunk.__new__(TimelineChunk)
+    for slot, value in zip(TimelineChunk._plain_slots, state):
+        setattr(tc, slot, value)
+    for (slot, kind), data in zip(TimelineChunk._array_slots, buffers):
+        if isinstance(kind, str):
+            setattr(tc, slot, array(kind, data))
+        else:
+            setattr(tc, slot, kind.fromstring(data))
+    return tc
@@ -0,0 +1,55 @@
+from .submodule_node import iter_submodules
+
+
+class TimelineGraph(object):
+    """
+    The resolved timeline graph that is handed to the diagram backends.
+
+    `nodes` maps the node ids to dictionaries with the label, the reference
+    target (`href`), the group and whether a submodule is on a critical path
+    (`important`).  `edges` is a list of `(dependency, dependant, important)`
+    tuples of node ids and `groups` a list of dictionaries with the id, label
+    and color of the milestone and deadline groups.  Every edge is added
+    once.
+    """
+
+    def __init__(self, groups=None):
+        self.nodes = {}
+        self.edges = []
+        self.groups = groups or []
+
+    def add_node(self, node_id, label, href=None, group=None,
+                 important=False):
+        self.nodes[node_id] = {
+            'label': label,
+            'href': href,
+            'group': group,
+            'important': important,
+        }
+
+    def add_edge(self, source, target, important=False):
+        self.edges.append((source, target, important))
+
+    @classmethod
+    def from_submodules(cls, root_chunks, groups=None):
+        """
+        builds the graph of the rendered submodules reachable from the
+        submodule nodes `root_chunks`.
+
+        Only submodules marked for rendering or on a critical path are
+        rendered, every submodule node and edge is visited exactly once.  An
+        edge is important if it connects two submodules on a critical path.
+        """
+        graph = cls(groups)
+        for sn in iter_submodules(root_chunks):
+            if sn.rendered or sn.important:
+                fi = sn.get_full_id(True)
+                graph.add_node(
+                    fi, sn.get_title_with_submodule(),
+                    sn.timechunk.ref_target(), sn.group,
+                    sn.important)
+                for child in sn.children:
+                    graph.add_edge(
+                        child.get_full_id(True), fi,
+                        sn.important and child.important)
+        return graph
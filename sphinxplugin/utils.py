@@ -1,18 +1,116 @@
 import re
 import math
+from collections import OrderedDict
 from docutils import nodes
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import docutils
+import dateutil.parser
 import roman
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 submodule_split_re = re.compile(
     r'(?P<name>[^(]+)\(?(?P<submodule>[IVX, ]*)?\)?', re.IGNORECASE)
 submodules_split_re = re.compile(r'[^IVX]*', re.IGNORECASE)
-tdelta_hours_re = re.compile(
-    r'(?P<hours>[\d\.]+)\W*(?!\d*\W*m)(h|hr|hrs)?')
-tdelta_minutes_re = re.compile(
-    r'(?P<minutes>[\d]+)\W*(m|min|mins)')
+tdelta_term_re = re.compile(
+    r'[\s,;+]*(?:and\b[\s,;+]*)?'
+    r'(?:(?P<number>\d+(?:,\d+|\.\d*)?|\.\d+)\s*(?P<unit>[a-z]+)?)?',
+    re.IGNORECASE)
+# the start of a number that is not part of a word
+tdelta_start_re = re.compile(r'(?<![\w.])(?:\d|\.\d)')
+slug_re = re.compile(r'[\W_]+')
+percent_re = re.compile(r'([\d\.]+) *%')
+iso_date_re = re.compile(r'^\s*(\d{4})([-/])(\d{1,2})\2(\d{1,2})\s*$')
+short_date_re = re.compile(
+    r'^\s*(\d{1,2})([-/])(\d{1,2})\2(\d{1,2}|\d{4})\s*$')
+
+# working hours of a day and working days of a week in time deltas
+WORK_HOURS_PER_DAY = 8
+WORK_DAYS_PER_WEEK = 5
+TDELTA_UNITS = {}
+for _units, _minutes in [
+        (['m', 'min', 'mins', 'minute', 'minutes'], 1),
+        (['h', 'hr', 'hrs', 'hour', 'hours'], 60),
+        (['d', 'day', 'days'], 60 * WORK_HOURS_PER_DAY),
+        (['w', 'wk', 'wks', 'week', 'weeks'],
+         60 * WORK_HOURS_PER_DAY * WORK_DAYS_PER_WEEK)]:
+    for _unit in _units:
+        TDELTA_UNITS[_unit] = _minutes
+
+# precomputed roman numerals of the submodule numbers
+ROMAN_TABLE_SIZE = 256
+ROMAN_NUMERALS = [None] + [
+    roman.toRoman(number) for number in range(1, ROMAN_TABLE_SIZE)]
+ROMAN_VALUES = dict(
+    (numeral, number) for number, numeral in enumerate(ROMAN_NUMERALS)
+    if numeral is not None)
+
+# maximal number of memoized dates, time deltas and slugs
+DATE_CACHE_SIZE = 4096
+TDELTA_CACHE_SIZE = 4096
+SLUG_CACHE_SIZE = 4096
+
+# minimal number of stat table rows for which NumPy is used
+NUMPY_MIN_ROWS = 32
+ETA_MIN_ORDINAL = date(1900, 1, 1).toordinal()
+ETA_MAX_ORDINAL = date.max.toordinal()
+
+
+class LRUCache(object):
+    """
+    a mapping keeping the `maxsize` most recently used entries.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self.data.pop(key)
+        except KeyError:
+            return default
+        self.data[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self.data.pop(key, None)
+        self.data[key] = value
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        self.data.clear()
+
+
+_date_cache = LRUCache(DATE_CACHE_SIZE)
+_tdelta_cache = LRUCache(TDELTA_CACHE_SIZE)
+_slug_cache = LRUCache(SLUG_CACHE_SIZE)
+
+
+class TimeDeltaError(ValueError):
+    """
+    raised for time delta strings that cannot be parsed.  `position` is the
+    index of the offending character in `string`.
+    """
+
+    def __init__(self, string, position, reason):
+        ValueError.__init__(
+            self, 'Could not parse the time string {!r}: {} at position {}'
+            .format(string, reason, position))
+        self.string = string
+        self.position = position
+        self.reason = reason
 
 
 def node_is_section_with_title(node, title):
@@ -23,10 +121,46 @@ def node_is_section_with_title(node, title):
         and node[0][0].lower() == title.lower())
 
 
-def make_descriptions_from_meta(meta, name):
+def make_descriptions_from_meta(meta, name, now=None):
+    """
+    returns the rows of a stat table for the stats in `meta`.
+
+    The rows are computed with NumPy for larger tables if it is installed.
+    """
+    return make_descriptions_from_metas([meta], name, now)[0]
+
+
+def make_descriptions_from_metas(metas, name, now=None):
+    """
+    returns the rows of the stat tables for each list of stats in `metas`.
+
+    All rows of all tables are computed in one call, with NumPy if it is
+    installed and there are at least `NUMPY_MIN_ROWS` of them.
+    """
+    if now is None:
+        now = datetime.now()
+    meta = []
+    names = []
+    for table_meta in metas:
+        meta += table_meta
+        names += ['{} {}'.format(name, i + 1) for i in range(len(table_meta))]
+
+    if numpy is not None and len(meta) >= NUMPY_MIN_ROWS:
+        rows = _make_descriptions_numpy(meta, names, now)
+    else:
+        rows = _make_descriptions_python(meta, names, now)
+
+    tables = []
+    start = 0
+    for table_meta in metas:
+        tables.append(rows[start:start + len(table_meta)])
+        start += len(table_meta)
+    return tables
+
+
+def _make_descriptions_python(meta, names, now):
     rows = []
-    for i, mrow in enumerate(meta):
-        nam = '{} {}'.format(name, i + 1)
+    for nam, mrow in zip(names, meta):
         r_req_time = float(mrow['time_req']) / 60.
         r_worked = float(mrow['minutes_worked']) / 60.
         r_done = float(mrow['done'])
@@ -43,7 +177,10 @@ def make_descriptions_from_meta(meta, name):
             r_ETA = float('inf')
         else:
             advancement_week = (r_done / (r_days / 7.))
-            r_ETA = (1. - r_done) * (r_days / (r_done))  # in days
+            if r_done == 0:
+                r_ETA = float('inf')
+            else:
+                r_ETA = (1. - r_done) * (r_days / (r_done))  # in days
 
         req_time = '{:0.2f} h'.format(r_req_time)
         hrs_spent = '{:0.2f} h'.format(r_worked)
@@ -59,12 +196,12 @@ def make_descriptions_from_meta(meta, name):
             ETA2 = 'undefined'
         else:
             try:
-                r_ETA1 = datetime.now() + timedelta(int(r_ETA))
+                r_ETA1 = now + timedelta(int(r_ETA))
                 ETA = '{}'.format(r_ETA1.strftime('%Y-%m-%d'))
             except:
                 ETA = 'undefined'
             try:
-                r_ETA2 = datetime.now() + timedelta(int(r_ETA/r_factor))
+                r_ETA2 = now + timedelta(int(r_ETA/r_factor))
                 ETA2 = '{}'.format(r_ETA2.strftime('%Y-%m-%d'))
             except:
                 ETA2 = 'undefined'
@@ -76,6 +213,67 @@ def make_descriptions_from_meta(meta, name):
     return rows
 
 
+def _format_eta_numpy(r_ETA, now):
+    # mirrors `now + timedelta(int(r_ETA))` and its strftime(), which fail
+    # for non-finite values, more than 999999999 days and years outside of
+    # 1900 - 9999 (strftime() does not support years before 1900).
+    valid = numpy.isfinite(r_ETA) & (numpy.abs(r_ETA) < 1e9)
+    days = numpy.trunc(numpy.where(valid, r_ETA, 0.)).astype(numpy.int64)
+    ordinals = now.toordinal() + days
+    valid &= (ordinals >= ETA_MIN_ORDINAL) & (ordinals <= ETA_MAX_ORDINAL)
+
+    etas = numpy.empty(len(r_ETA), dtype=object)
+    etas[:] = 'undefined'
+    dates = (
+        numpy.datetime64(date.fromordinal(ETA_MIN_ORDINAL), 'D')
+        + (ordinals[valid] - ETA_MIN_ORDINAL))
+    etas[valid] = [str(d) for d in numpy.datetime_as_string(dates, unit='D')]
+    return etas
+
+
+def _make_descriptions_numpy(meta, names, now):
+    def column(key):
+        return numpy.array([float(mrow[key]) for mrow in meta])
+
+    r_req_time = column('time_req') / 60.
+    r_worked = column('minutes_worked') / 60.
+    r_done = column('done')
+    r_days = column('time_worked')
+
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        r_factor = numpy.where(
+            r_done == 0, 0., r_worked / (r_req_time * r_done))
+
+        # at least 5 minutes of recorded work
+        recorded = numpy.floor(r_days * 288) != 0
+        advancement_week = numpy.where(
+            recorded, r_done / (r_days / 7.), 0.)
+        r_ETA = numpy.where(
+            recorded & (r_done != 0),
+            (1. - r_done) * (r_days / r_done), numpy.inf)  # in days
+        ETA = _format_eta_numpy(r_ETA, now)
+        ETA2 = _format_eta_numpy(r_ETA / r_factor, now)
+
+    def fmt(pattern, values):
+        return numpy.char.mod(pattern, values).tolist()
+
+    columns = [
+        names,
+        fmt('%0.2f h', r_req_time),
+        fmt('%2.1f %%', r_done * 100),
+        fmt('%0.2f h', r_worked),
+        fmt('%0.2f h', numpy.maximum(r_req_time - r_worked, 0)),
+        fmt('%0.2f h', numpy.maximum(r_req_time * r_factor - r_worked, 0)),
+        # adding 0. turns the -0. of truncated negative days into 0.
+        fmt('%0.2f d', numpy.trunc(r_days) + 0.),
+        fmt('%0.2f', r_factor),
+        fmt('%0.0f %%', advancement_week * 100),
+        ETA.tolist(),
+        ETA2.tolist(),
+    ]
+    return [list(row) for row in zip(*columns)]
+
+
 def description_table(descriptions, widths, headers):
     # generate table-root
     tgroup = nodes.tgroup(cols=len(widths))
@@ -116,33 +314,188 @@ def dt_to_float_days(dt):
     return float(dt.days + dt.seconds / 3600.)
 
 
-def parse_time_delta(string):
-    hours = tdelta_hours_re.search(string)
-    minutes = tdelta_minutes_re.search(string)
-    res = hours.groupdict() if hours is not None else {'hours': 0}
-    res.update(
-        minutes.groupdict() if minutes is not None else {'minutes': 0})
+def _two_digit_year(year):
+    # like dateutil: the year within 50 years of the current year
+    now = datetime.now().year
+    year += now - now % 100
+    if year >= now + 50:
+        year -= 100
+    elif year < now - 50:
+        year += 100
+    return year
+
+
+def _parse_numeric_date(string):
+    match = iso_date_re.match(string)
+    if match:
+        year, month, day = match.group(1, 3, 4)
+        return datetime(int(year), int(month), int(day))
+
+    match = short_date_re.match(string)
+    if match is None:
+        raise LookupError(string)
+    fields = [int(v) for v in match.group(1, 3, 4)]
+    # resolves the order of the fields like dateutil without dayfirst
+    if fields[0] > 31:
+        year, month, day = 0, 1, 2
+    elif fields[0] > 12:
+        day, month, year = 0, 1, 2
+    else:
+        month, day, year = 0, 1, 2
+    if len(match.group(4)) == 4:
+        # like dateutil, two digit years are only expanded without a century
+        full_year = fields[year]
+    else:
+        full_year = _two_digit_year(fields[year])
+    return datetime(full_year, fields[month], fields[day])
+
+
+def parse_date(string):
+    """
+    returns the datetime in `string`, or None if it is not a date.
+
+    ISO dates and numeric short dates like 15/01/01 are parsed directly,
+    everything else with dateutil.  The results are memoized.
+    """
+    result = _date_cache.get(string, _date_cache)
+    if result is not _date_cache:
+        return result
+
+    try:
+        result = _parse_numeric_date(string)
+    except ValueError:
+        result = None
+    except LookupError:
+        try:
+            result = dateutil.parser.parse(string)
+        except (ValueError, OverflowError, TypeError):
+            result = None
+
+    _date_cache[string] = result
+    return result
+
+
+def parse_worked_on_line(line):
+    """
+    returns the date, the completeness and the worked minutes of a worked-on
+    line like `2015-01-01: 2hrs 30min 90%`.
+
+    The first number followed by `%` is the completeness, the first time
+    delta before it the worked minutes.  Text around the time delta, like
+    `implemented the parser, 3 hrs`, is ignored.  Missing values are None.
+    """
+    head, sep, rest = line.partition(':')
+    time = parse_date(head)
+    if time is None:
+        rest = line
+
+    done = None
+    match = percent_re.search(rest)
+    if match:
+        done = float(match.group(1)) / 100.
+        rest = rest[:match.start()]
+
+    minutes = 0
+    for match in tdelta_start_re.finditer(rest):
+        minutes = scan_time_delta(rest[match.start():])[0]
+        if minutes:
+            break
+    return time, done, int(minutes) or None
+
+
+def scan_time_delta(string):
+    """
+    reads the time delta at the start of `string` in a single scan, e.g.
+    `1d 2h 30min`, `1.5 hrs` or `1,5 hrs`.  A number without a unit is hours
+    if it comes first and minutes if it follows hours, like `1h30`.  The scan
+    stops at any other number without a unit.
+
+    Returns the minutes and the position at which the scan stopped.  The
+    results are memoized.
+    """
+    result = _tdelta_cache.get(string)
+    if result is not None:
+        return result
+
+    minutes = 0.
+    position = 0
+    # the factor of the previous term, None before the first term and 0
+    # after a number without a unit
+    previous = None
+    while position < len(string):
+        match = tdelta_term_re.match(string, position)
+        if match.group('number') is None:
+            break
+        unit = match.group('unit')
+        if unit is not None:
+            factor = TDELTA_UNITS.get(unit.lower())
+        elif previous is None:
+            factor = 60
+        elif previous == 60:
+            factor = 1
+        else:
+            break
+        if factor is None:
+            break
+        minutes += float(match.group('number').replace(',', '.')) * factor
+        previous = factor if unit is not None else 0
+        position = match.end()
+    else:
+        position = len(string)
+    if string[position:].strip(' \t\n,;+') == '':
+        position = len(string)
 
-    res = dict(
-        [(key, float(value)) for (key, value) in res.iteritems()])
+    result = (minutes, position)
+    _tdelta_cache[string] = result
+    return result
 
-    total_minutes = int(res['hours'] * 60. + res['minutes'])
+
+def parse_time_delta(string):
+    """
+    returns the number of minutes of the time delta `string`.
+
+    Like in worked-on lines, the time delta starts at the first number and
+    ends before any text, so `about 3 hrs of work` is 180 minutes.  Raises a
+    TimeDeltaError if it is zero or followed by a number with an unknown
+    unit or without a unit.
+    """
+    start = tdelta_start_re.search(string)
+    if start is None:
+        raise TimeDeltaError(string, 0, 'no time given')
+    minutes, position = scan_time_delta(string[start.start():])
+    position += start.start()
+    match = tdelta_term_re.match(string, position)
+    if match.group('unit') is not None:
+        raise TimeDeltaError(
+            string, match.start('unit'),
+            'unknown unit {!r}'.format(match.group('unit')))
+    if match.group('number') is not None:
+        raise TimeDeltaError(
+            string, match.start('number'),
+            'number {!r} without a unit'.format(match.group('number')))
+
+    total_minutes = int(minutes)
     if total_minutes == 0:
         # TODO: make this a parser error
-        raise ValueError('Could not parse the requested time string')
+        raise TimeDeltaError(string, 0, 'no time given')
 
     return total_minutes
 
 
 def add_stats(stats):
+    """
+    converts rolled-up work stats into the stats shown in the stat tables.
+
+    `stats` holds the earliest start time and the sums of the requested
+    time, the worked minutes and the completeness weighted by the requested
+    time of a set of submodules.
+    """
     res = {}
     for key in ['time_req', 'minutes_worked']:
-        res[key] = sum(stats[key].itervalues())
+        res[key] = stats[key]
     res['time_worked'] = dt_to_float_days(
         datetime.now() - stats['start_time'])
-    res['done'] = 1. / res['time_req'] * sum(
-        [float(stats['done'][key] * stats['time_req'][key])
-         for key in stats['done'].keys()])
+    res['done'] = 1. / res['time_req'] * float(stats['done_time'])
     return res
 
 
@@ -151,8 +504,21 @@ def is_list_or_enumeration(node):
             or isinstance(node, docutils.nodes.enumerated_list))
 
 
+def to_roman(number):
+    if 0 < number < ROMAN_TABLE_SIZE:
+        return ROMAN_NUMERALS[number]
+    return roman.toRoman(number)
+
+
+def from_roman(numeral):
+    try:
+        return ROMAN_VALUES[numeral]
+    except KeyError:
+        return roman.fromRoman(numeral)
+
+
 def id_from_name_and_submodule(name, submodule):
-    return '{} ({})'.format(name, roman.toRoman(submodule + 1))
+    return '{} ({})'.format(name, to_roman(submodule + 1))
 
 
 def split_name_and_submodule(name):
@@ -165,13 +531,27 @@ def split_name_and_submodule(name):
         submodules = submodules_split_re.split(
             parts[1])
         parts = [parts[0]] + [
-            roman.fromRoman(submodule.upper()) - 1
+            from_roman(submodule.upper()) - 1
             for submodule in submodules]
     return parts
 
 
 def slugify(name):
-    return re.sub(r'[\W_]+', r'-', name.lower())
+    slug = _slug_cache.get(name)
+    if slug is None:
+        slug = slug_re.sub(r'-', name.lower())
+        _slug_cache[name] = slug
+    return slug
+
+
+def section_key(node, docname):
+    """
+    returns a picklable key identifying the docutils `node` in the document
+    `docname`, or None if `node` is None.
+    """
+    if node is None:
+        return None
+    return (docname, node.tagname, tuple(node.get('ids', ())))
 
 
 def parse_list_items(enumeration):
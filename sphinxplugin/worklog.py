@@ -0,0 +1,271 @@
+"""
+Worked-on entries read from the CSV or JSONL exports of a time tracker.
+
+The files listed in the `timeline_worklogs` config value are streamed row by
+row, so only the aggregate of every task is kept in memory.  A row has the
+fields
+
+* `task`: the title or an alias of the task, optionally with a submodule,
+  e.g. `Project timeline (II)`,
+* `date`: the day of the work, like the date of a worked-on line,
+* `time`: the time worked, e.g. `2h 30min`,
+* `done`: optionally, the percentage of the task done after the work.
+
+The aggregates are cached in the timeline chunks container by the path, the
+modification time and the size of each file, so unchanged logs are not read
+again.  The `Worked-on:` trailers of git commits are cached by the
+commit, see `git_worklog`.  The entries are added to the worked minutes,
+start times and completeness of a timeline chunk once after the chunk was
+read.
+"""
+import csv
+import io
+import json
+import os
+
+from sphinx.util import logging
+
+from . import utils
+from .git_worklog import git_rows, git_worklog_path, update_git_commits
+
+
+logger = logging.getLogger(__name__)
+
+
+def iter_rows(path):
+    """
+    yields the rows of the worklog `path` as dictionaries, reading a CSV file
+    with a header line or a JSONL file depending on the file extension.
+    """
+    if os.path.splitext(path)[1].lower() in ('.jsonl', '.json'):
+        with io.open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, 'rb') as f:
+            for row in csv.DictReader(f):
+                yield dict(
+                    (key, value.decode('utf-8'))
+                    for key, value in row.iteritems()
+                    if key is not None and value is not None)
+
+
+def parse_row(row):
+    """
+    returns the task, the date, the worked minutes and the completeness of
+    the worklog row `row`.  Missing values are None.
+
+    Raises a ValueError if a value cannot be parsed.
+    """
+    task = row.get('task')
+    if task is not None:
+        task = unicode(task).strip() or None
+
+    time = None
+    if row.get('date'):
+        time = utils.parse_date(unicode(row['date']))
+        if time is None:
+            raise ValueError('invalid date {!r}'.format(row['date']))
+
+    minutes = None
+    if row.get('time') not in (None, ''):
+        string = unicode(row['time'])
+        minutes, position = utils.scan_time_delta(string)
+        if position == 0:
+            raise utils.TimeDeltaError(string, 0, 'no time given')
+        minutes = int(minutes) or None
+
+    done = None
+    if row.get('done') not in (None, ''):
+        try:
+            done = float(unicode(row['done']).strip().rstrip('%')) / 100.
+        except ValueError:
+            raise ValueError('invalid done value {!r}'.format(row['done']))
+
+    return task, time, minutes, done
+
+
+def aggregate(rows, source):
+    """
+    returns a dictionary mapping the tasks of the worklog `rows` to their
+    worked minutes, their first date, the date and completeness of their
+    latest entry with a completeness and their worked minutes per date.
+
+    Rows without a task or with values that cannot be parsed are skipped
+    with a warning naming the worklog `source`.
+    """
+    tasks = {}
+    for row in rows:
+        try:
+            task, time, minutes, done = parse_row(row)
+        except ValueError as e:
+            logger.warning('skipping row %r of worklog %s: %s', row, source, e)
+            continue
+        if task is None:
+            logger.warning('worklog %s: row without task: %r', source, row)
+            continue
+        entry = tasks.get(task)
+        if entry is None:
+            entry = tasks[task] = [0, None, None, None, {}]
+        if minutes is not None:
+            entry[0] += minutes
+            entry[4][time] = entry[4].get(time, 0) + minutes
+        if time is not None and (entry[1] is None or time < entry[1]):
+            entry[1] = time
+        # rows of the same day keep the order of the file
+        if done is not None and (
+                entry[3] is None or entry[2] is None
+                or (time is not None and time >= entry[2])):
+            entry[2] = time
+            entry[3] = done
+    return dict(
+        (task, tuple(entry[:4]) + (sorted(entry[4].iteritems()),))
+        for task, entry in tasks.iteritems())
+
+
+def add_entries(tc, submodule, days, time, done):
+    """
+    records the worked minutes per date `days` and the completeness `done`
+    at `time` as entries of the timeline chunk `tc`.
+    """
+    if done is not None and time not in dict(days):
+        days = sorted(days + [(time, 0)])
+    for day, minutes in days:
+        tc.add_entry(submodule, day, minutes, done if day == time else None)
+
+
+def file_signature(path):
+    """
+    returns the modification time and the size of the file `path`, or None
+    if it does not exist.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
+
+
+def worklog_paths(app):
+    return [
+        os.path.join(app.srcdir, path)
+        for path in app.config.timeline_worklogs]
+
+
+def worklogs_signature(app):
+    return tuple(
+        (path, file_signature(path)) for path in worklog_paths(app))
+
+
+def read_worklogs(tcs, paths):
+    """
+    returns the aggregates of the worklogs `paths`, re-reading only the files
+    that changed since they were cached in the container `tcs`.
+    """
+    cache = {}
+    results = []
+    for path in paths:
+        signature = file_signature(path)
+        if signature is None:
+            logger.warning('worklog %s not found', path)
+            continue
+        cached = tcs.worklogs.get(path)
+        if cached is None or cached[0] != signature:
+            cached = (signature, aggregate(iter_rows(path), path))
+        cache[path] = cached
+        results.append(cached[1])
+    tcs.worklogs = cache
+    return results
+
+
+def apply_worklogs(tcs, aggregates):
+    """
+    adds the worklog `aggregates` to the timeline chunks of the container
+    `tcs` that were read since the worklogs were applied the last time.
+    """
+    fresh = set(tcs.chunks).difference(tcs.worklog_chunks)
+    if not fresh:
+        return
+    tcs.update_aliases()
+    for tasks in aggregates:
+        for task, values in sorted(tasks.iteritems()):
+            minutes, start, time, done, days = values
+            try:
+                targets = tcs.get_chunk_id(task)
+            except (KeyError, ValueError):
+                logger.warning('Could not resolve worklog task %s', task)
+                continue
+            for key, submodule in targets:
+                if key not in fresh:
+                    continue
+                tc = tcs.chunks[key]
+                if minutes:
+                    tc.worked_minutes[submodule] = (
+                        tc.get_worked_minutes(submodule) + minutes)
+                if start is not None:
+                    tc.set_start_time(submodule, start)
+                if done is not None:
+                    tc.set_completeness(submodule, done, time)
+                add_entries(tc, submodule, days, time, done)
+    tcs.worklog_chunks.update(fresh)
+
+
+def task_docs(tcs, rows):
+    """
+    returns the documents defining the tasks of the worklog `rows`.
+    """
+    tcs.update_aliases()
+    docs = set()
+    for task in set(row['task'] for row in rows):
+        try:
+            targets = tcs.get_chunk_id(task)
+        except (KeyError, ValueError):
+            continue
+        docs.update(tcs.chunks[key].docname for key, submodule in targets)
+    return docs
+
+
+def outdated_worklog_docs(app, env, added, changed, removed):
+    """
+    returns the documents defining timeline chunks if the worklogs changed
+    since the last build, so the worklogs are applied to fresh chunks, and
+    the documents defining the tasks of new or removed git commits.
+    """
+    # some Sphinx versions pass the builder instead of the environment
+    tcs = getattr(app.env, 'timeline_chunks', None)
+    if tcs is None:
+        return []
+    docs = set()
+    repo = git_worklog_path(app)
+    if repo is not None:
+        docs.update(task_docs(tcs, update_git_commits(tcs, repo)))
+    signature = worklogs_signature(app)
+    if signature != tcs.worklog_signature:
+        tcs.worklog_signature = signature
+        tcs.worklog_chunks = set()
+        docs.update(tcs.docname_chunks)
+    return sorted(docs.difference(removed))
+
+
+def update_worklogs(app, env):
+    """
+    applies the worklogs and the git worklog to the timeline chunks read
+    since the last build.
+    """
+    tcs = getattr(env, 'timeline_chunks', None)
+    if tcs is None or not (
+            app.config.timeline_worklogs or app.config.timeline_git_worklog):
+        return
+    tcs.worklog_signature = worklogs_signature(app)
+    if not set(tcs.chunks).difference(tcs.worklog_chunks):
+        return
+    aggregates = read_worklogs(tcs, worklog_paths(app))
+    repo = git_worklog_path(app)
+    if repo is not None:
+        if tcs.git_head is None:
+            # the first build, later builds read new commits when looking
+            # for outdated documents
+            update_git_commits(tcs, repo)
+        aggregates.append(aggregate(git_rows(tcs.git_commits), repo))
+    apply_worklogs(tcs, aggregates)
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+
+extensions = ['sphinxcontrib.blockdiag', 'sphinxplugin.projecttimeline']
+source_suffix = '.rst'
+master_doc = 'index'
+project = u'parallel'
+copyright = u'2015, test'
+version = '1.0'
+release = '1.0'
+exclude_patterns = ['_build']
@@ -3,13 +3,16 @@
 import pytest
 import re
 import math
+import os
 from docutils import nodes
 from datetime import datetime, timedelta
-from sphinx_testing import with_app
+from sphinx_testing import with_app, TestApp
 from sphinxplugin.timeline_chunk import (
     TimelineChunk, TimelineChunksContainer)
 from sphinxplugin.nodes import TimelineNode
-from sphinxplugin.submodule_node import SubmoduleNode
+from sphinxplugin.submodule_node import SubmoduleNode, combine_work_stats
+from sphinxplugin.graph import strongly_connected_components, find_cycles
+from sphinxplugin import utils
 from sphinxplugin.utils import (
     parse_list_items, add_stats, make_descriptions_from_meta,
     split_name_and_submodule,
@@ -28,6 +31,29 @@ with_svg_app = with_app(
     })
 
 
+@pytest.fixture
+def make_app():
+    """
+    returns a function creating a TestApp on a copy of the test documents
+    `srcdir`, with the config values `confoverrides`.  The diagrams are
+    rendered as SVG by default.  The apps are cleaned up after the test.
+    """
+    apps = []
+
+    def make(srcdir, buildername='html', parallel=0, **confoverrides):
+        confoverrides.setdefault('blockdiag_html_image_format', 'SVG')
+        app = TestApp(
+            srcdir=srcdir, buildername=buildername,
+            copy_srcdir_to_tmpdir=True, parallel=parallel,
+            confoverrides=confoverrides)
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        app.cleanup()
+
+
 @with_svg_app
 def test_build_html(app, status, warning):
     app.builder.build_all()
@@ -125,6 +151,43 @@ def test_parse_worked_on_7(tc_worked_on):
     assert tc.get_worked_minutes(0) == 0
 
 
+def test_parse_worked_on_8(tc_worked_on):
+    tc = tc_worked_on
+    tc._parse_worked_on_line('2015-01-01: 1h 30min, 25 %', 0)
+    tc._parse_worked_on_line('2015-01-02: 1h 30min - 2h 50%', 0)
+    assert tc.completeness[0] == 0.5
+    assert tc.end_times == {}
+    assert tc.worked_minutes[0] == 180
+    tc._parse_worked_on_line('2015-01-03: 1.5min 100%', 0)
+    assert tc.worked_minutes[0] == 181
+    assert tc.end_times[0] == datetime(2015, 1, 3)
+
+
+@pytest.mark.parametrize('line, minutes', [
+    ('2015-01-01: worked 2h 50%', 120),
+    ('2015-01-01: implemented parser, 3 hrs', 180),
+    ('fixed bug: 2h', 120),
+    ('2015-01-01: fixed 3 bugs in 2h', 120),
+    ('2015-01-01: v2 release notes', None)])
+def test_parse_worked_on_text(line, minutes):
+    assert utils.parse_worked_on_line(line)[2] == minutes
+
+
+@pytest.mark.parametrize('string', [
+    '2015-01-01', '2015/3/4', '15/01/01', '05/01/01', '1/1/01', '99-01-01',
+    '13-1-2015', '01/02/2015', ' 1/2/3 ', '31/02/01', 'May 2nd, 2015',
+    '1.2.2015', '30min 90%', '90%'])
+def test_parse_date(string):
+    import dateutil.parser
+    try:
+        expected = dateutil.parser.parse(string)
+    except ValueError:
+        expected = None
+    utils._date_cache.clear()
+    assert utils.parse_date(string) == expected
+    assert utils._date_cache.get(string, 'missing') == expected
+
+
 def test_parse_list_items(get_list):
     p, el = get_list
     assert parse_list_items(p) == []
@@ -205,6 +268,71 @@ def test_time_delta():
         parse_time_delta('')
 
 
+def test_time_delta_units():
+    assert parse_time_delta('1d 2h 30min') == 8 * 60 + 150
+    assert parse_time_delta('1w') == 5 * 8 * 60
+    assert parse_time_delta('0.5d, .25h') == 4 * 60 + 15
+    assert parse_time_delta('1 hour and 15 minutes') == 75
+    assert parse_time_delta('1h30m') == 90
+    assert parse_time_delta('1h30') == 90
+    assert parse_time_delta('1 hr 15') == 75
+    assert parse_time_delta('1,5h') == 90
+    assert parse_time_delta('1.5h, 2h') == 210
+    assert parse_time_delta('3 hrs of work') == 180
+    assert parse_time_delta('2h (estimate)') == 120
+    assert parse_time_delta('about 1h 30min') == 90
+    assert parse_time_delta('1h, -2h') == 60
+    assert utils.scan_time_delta('2h fixing bugs') == (120., 2)
+    assert '1d 2h 30min' in utils._tdelta_cache
+
+    for string, position, reason in [
+            ('', 0, 'no time given'),
+            ('2 parsecs', 2, "unknown unit 'parsecs'"),
+            ('no estimate', 0, 'no time given'),
+            ('0h (done)', 0, 'no time given'),
+            ('1h30 15', 5, "number '15' without a unit"),
+            ('1d 4', 3, "number '4' without a unit"),
+            ('30min 10', 6, "number '10' without a unit")]:
+        with pytest.raises(utils.TimeDeltaError) as excinfo:
+            parse_time_delta(string)
+        assert excinfo.value.position == position
+        assert excinfo.value.reason == reason
+
+
+def test_symbol_table():
+    from sphinxplugin.symbols import SymbolTable
+    symbols = SymbolTable()
+    sid = symbols.intern('task-a', 1)
+    assert symbols.intern_id('task-a (II)') == sid
+    assert symbols.intern_id('task-a') == symbols.intern('task-a', 0) != sid
+    assert symbols.display_id(sid) == 'task-a (II)'
+    assert symbols.blockdiag_id(sid) == 'task-a-II'
+    assert (symbols.name(sid), symbols.submodule(sid)) == ('task-a', 1)
+    assert len(symbols) == 2
+
+    assert symbols.intern('task-b') == 2
+    assert symbols.release(lambda name, sm: name != 'task-a') == set([0, 1])
+    assert len(symbols) == 3
+    assert symbols.intern('task-c') == 0
+    assert symbols.display_id(0) == 'task-c (I)'
+    assert symbols.intern_id('task-a (II)') == 1
+    symbols.release(lambda name, sm: False)
+    assert len(symbols) == 0 and symbols.free == []
+    assert symbols.intern('task-d') == 0
+
+    assert utils.to_roman(4) == 'IV' and utils.from_roman('IV') == 4
+    assert utils.to_roman(1000) == 'M' and utils.from_roman('M') == 1000
+
+
+def test_lru_cache():
+    cache = utils.LRUCache(2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache.get('a') == 1
+    cache['c'] = 3
+    assert 'b' not in cache and 'a' in cache and len(cache) == 2
+
+
 def compute_aliases(tcs):
     tcs.aliases = {}
     tcs.update_aliases()
@@ -238,9 +366,7 @@ def test_work_stats(mock_tcs):
     tcs = mock_tcs
     sn1 = SubmoduleNode(tcs, 'test1 (I)')
     sn1.children.append(SubmoduleNode(tcs, 'test-2 (I)'))
-    stats = {}
-    sn1.compute_work_stats(stats)
-    res = add_stats(stats)
+    res = add_stats(sn1.compute_work_stats())
     assert res['time_req'] == 120
     assert res['minutes_worked'] == 90
     assert res['done'] == 0.5
@@ -295,12 +421,24 @@ def test_resolve_all_dependencies_2(mock_tcs):
     return tcs, tn
 
 
+def blockdiag_lines(submodules):
+    from sphinxplugin.timeline_graph import TimelineGraph
+    from sphinxplugin.backends import BlockdiagBackend
+    for sn in submodules:
+        sn.set_rendered()
+    graph = TimelineGraph.from_submodules(submodules)
+    backend = BlockdiagBackend()
+    return (
+        set(backend.node_line(node_id, node)
+            for node_id, node in graph.nodes.items()),
+        [backend.edge_line(*edge) for edge in graph.edges])
+
+
 def test_blockdiag_edges(test_resolve_all_dependencies_2):
     tcs, tn = test_resolve_all_dependencies_2
     tc1 = tcs.chunks['test1']
     sn1 = tc1.get_submodule(0)
-    lines = []
-    sn1.traverse_edge_lines(lines)
+    nodes, lines = blockdiag_lines([sn1])
 
     assert len(lines) == 1
     assert lines[0] == 'test-2-I -> test1-I'
@@ -310,9 +448,8 @@ def test_blockdiag_edges_2(test_resolve_all_dependencies_2):
     tcs, tn = test_resolve_all_dependencies_2
     tc1 = tcs.chunks['test1']
     sn1 = tc1.get_submodule(0)
-    sn1.important = True
-    lines = []
-    sn1.traverse_edge_lines(lines)
+    sn1.important = sn1.children[0].important = True
+    nodes, lines = blockdiag_lines([sn1])
 
     assert len(lines) == 1
     assert lines[0] == 'test-2-I -> test1-I [color = "red"]'
@@ -320,9 +457,7 @@ def test_blockdiag_edges_2(test_resolve_all_dependencies_2):
 
 def test_blockdiag_nodes(test_resolve_all_dependencies_2):
     tcs, tn = test_resolve_all_dependencies_2
-    nodes = set()
-    for rc in tn.root_chunks:
-        rc.get_blockdiag_nodes(nodes)
+    nodes, lines = blockdiag_lines(tn.root_chunks)
 
     assert len(nodes) == 3
     assert 'test1-I [label = "test1 (I)", href = ":ref:`test1`"]' in nodes
@@ -331,12 +466,10 @@ def test_blockdiag_nodes(test_resolve_all_dependencies_2):
 
 def test_blockdiag_nodes_2(test_resolve_all_dependencies_2):
     tcs, tn = test_resolve_all_dependencies_2
-    nodes = set()
     rc1 = tn.root_chunks[0]
     rc1.important = True
     rc1.group = 'Milestone1'
-    for rc in tn.root_chunks:
-        rc.get_blockdiag_nodes(nodes)
+    nodes, lines = blockdiag_lines(tn.root_chunks)
 
     assert len(nodes) == 3
     assert (
@@ -347,6 +480,22 @@ def test_blockdiag_nodes_2(test_resolve_all_dependencies_2):
     assert 'test-2-I [label = "Test 2 (I)", href = ":ref:`test2`"]' in nodes
 
 
+def test_blockdiag_resolved_hrefs(test_resolve_all_dependencies_2):
+    from StringIO import StringIO
+    from sphinxplugin.timeline_graph import TimelineGraph
+    from sphinxplugin.backends import BlockdiagBackend
+    tcs, tn = test_resolve_all_dependencies_2
+    for rc in tn.root_chunks:
+        rc.set_rendered()
+    graph = TimelineGraph.from_submodules(tn.root_chunks)
+    sink = StringIO()
+    BlockdiagBackend().write_code(graph, sink, {'test1': '#test1'}.get)
+    code = sink.getvalue()
+
+    assert 'test1-I [label = "test1 (I)", href = "#test1"]' in code
+    assert 'test-2-I [label = "Test 2 (I)"]' in code
+
+
 def test_resolve_all_dependencies_3(mock_tcs):
 
     tcs = mock_tcs
@@ -389,11 +538,9 @@ def test_resolve_all_dependencies_5(mock_tcs):
     compute_aliases(tcs)
 
     tn = TimelineNode()
-    tn.resolve_all_dependencies(tcs)
-    with pytest.raises(ValueError):
-        tc1.container = tcs
-        tc2.container = tcs
-        tc1.get_submodule(0)
+    with pytest.raises(ValueError) as excinfo:
+        tn.resolve_all_dependencies(tcs)
+    assert 'test-2 (I) [unknown], test1 (I) [unknown]' in str(excinfo.value)
 
 
 def test_stat_tables(mock_tcs):
@@ -439,3 +586,894 @@ def test_stat_tables(mock_tcs):
 # @with_app(buildername='json', srcdir='tests/docs/basic/')
 # def test_build_json(app, status, warning):
 #     app.builder.build_all()
+
+
+def _make_section(ids, title, parent=None):
+    section = nodes.section(ids=ids)
+    section += nodes.title(text=title)
+    if parent is not None:
+        parent += section
+    return section
+
+
+def test_container_incremental_aliases():
+    tcs = TimelineChunksContainer()
+    outer = _make_section(['outer'], 'Outer')
+    s1 = _make_section(['task-a'], 'Task A', outer)
+    s2 = _make_section(['task-b'], 'Task B', outer)
+    s3 = _make_section(['task-c'], 'Task C', _make_section(['other'], 'O'))
+
+    tc1 = tcs.add_chunk(s1, 'doc1')
+    tc1.parse_requested_time('1 hr')
+    tcs.add_group('mygroup', outer, 'doc1')
+    tc2 = tcs.add_chunk(s2, 'doc1')
+    tcs.add_chunk(s3, 'doc2')
+    tcs.update_aliases()
+
+    assert tcs.aliases['task-a'] == set([('task-a', 1)])
+    assert tcs.aliases['mygroup'] == set([('task-a', 1), ('task-b', 0)])
+
+    tc2.time_deltas = [60, 60]
+    tcs.outdate_aliases(tc2)
+    tcs.update_aliases()
+    assert tcs.aliases['mygroup'] == set([('task-a', 1), ('task-b', 2)])
+
+    # a group of the same section in another document does not apply
+    tcs.add_group('othergroup', outer, 'doc2')
+    tcs.update_aliases()
+    assert 'othergroup' not in tcs.aliases
+
+    tcs.purge('doc2')
+    tcs.update_aliases()
+    assert 'task-c' not in tcs.chunks
+    assert sorted(tcs.aliases) == ['mygroup', 'task-a', 'task-b']
+    assert tcs.docname_chunks == {'doc1': set(['task-a', 'task-b'])}
+
+    tcs.purge('doc1')
+    tcs.update_aliases()
+    assert tcs.chunks == {}
+    assert tcs.aliases == {}
+    assert tcs.alias_index == {}
+    assert tcs.groups == {}
+
+
+def _timeline_snapshot(make_app, srcdir, parallel):
+    app = make_app(srcdir, parallel=parallel)
+    app.builder.build_all()
+    tcs = app.env.timeline_chunks
+    chunks = dict(
+        (key, (tc.docname, tc.title, tc.time_deltas, tc.dependencies,
+               tc.worked_minutes, tc.completeness, tc.start_times))
+        for key, tc in tcs.chunks.iteritems())
+    groups = dict(
+        (name, group['docname']) for name, group in tcs.groups.iteritems())
+    index = (app.outdir / 'index.html').read_text(encoding='utf-8')
+    tables = re.findall(r'<table.*?</table>', index, re.DOTALL)
+    return chunks, groups, tcs.aliases, tables
+
+
+@pytest.mark.parametrize(
+    'srcdir', ['tests/docs/complete', 'tests/docs/parallel'])
+def test_parallel_read_matches_serial(srcdir, make_app):
+    serial = _timeline_snapshot(make_app, srcdir, 0)
+    parallel = _timeline_snapshot(make_app, srcdir, 4)
+    assert len(serial[0]) > 0
+    assert parallel == serial
+
+
+def test_pickled_container_has_no_doctree_nodes(make_app):
+    import pickle
+    app = make_app('tests/docs/parallel')
+    app.builder.build_all()
+    tcs = app.env.timeline_chunks
+    assert len(tcs.groups) > 0
+    data = pickle.dumps(tcs, pickle.HIGHEST_PROTOCOL)
+    assert 'docutils' not in data
+    tcs2 = pickle.loads(data)
+    assert tcs2.aliases == tcs.aliases
+    assert tcs2.section_groups == tcs.section_groups
+
+
+def test_resolve_shared_dependencies():
+    # every layer depends on both submodules of the next layer, so the number
+    # of paths grows exponentially with the number of layers.
+    layers = 30
+    tcs = TimelineChunksContainer()
+    for i in range(layers):
+        tc = TimelineChunk(
+            MockParent({'ids': ['layer{}'.format(i)]}),
+            'layer{}'.format(i), 'layer{}'.format(i), container=tcs)
+        tc.time_deltas = [60, 60]
+        if i + 1 < layers:
+            tc.dependencies = {
+                0: ['layer{}'.format(i + 1)], 1: ['layer{}'.format(i + 1)]}
+        tcs.chunks['layer{}'.format(i)] = tc
+    compute_aliases(tcs)
+
+    tn = TimelineNode()
+    tn.resolve_all_dependencies(tcs)
+    tn.resolve_all_stats(tcs)
+
+    assert len(tn.root_chunks) == 2
+    first = tcs.chunks['layer1'].submodules[0]
+    assert all(rc.children[0] is first for rc in tn.root_chunks)
+    assert sum(len(tc.submodules) for tc in tcs.chunks.values()) == 2 * layers
+    nodes, lines = blockdiag_lines(tn.root_chunks[:1])
+    assert len(lines) == 4 * (layers - 1) - 2
+
+
+def test_strongly_connected_components():
+    graph = {
+        'a': ['b'], 'b': ['c', 'd'], 'c': ['a'], 'd': ['e'], 'e': ['e'],
+        'f': ['d', 'g']}
+    components = strongly_connected_components(graph)
+    assert sorted(sorted(c) for c in components) == [
+        ['a', 'b', 'c'], ['d'], ['e'], ['f'], ['g']]
+    # reverse topological order
+    order = dict((c[0], i) for i, c in enumerate(components))
+    assert order['e'] < order['d'] < order['f']
+    assert find_cycles(graph) == [['a', 'b', 'c'], ['e']]
+
+    chain = dict((i, [i + 1]) for i in range(20000))
+    assert len(strongly_connected_components(chain)) == 20001
+    assert find_cycles(chain) == []
+
+
+def test_resolve_all_dependencies_reports_all_cycles(mock_tcs):
+
+    tcs = mock_tcs
+    tc2 = tcs.chunks['test-2']
+    tc2.time_deltas = [60, 60]
+    tc2.dependencies = {0: ['test1'], 1: ['test-2 (II)']}
+
+    compute_aliases(tcs)
+
+    tn = TimelineNode()
+    with pytest.raises(ValueError) as excinfo:
+        tn.resolve_all_dependencies(tcs)
+    message = str(excinfo.value)
+    assert 'cycle 1: test-2 (I) [unknown], test1 (I) [unknown]' in message
+    assert 'cycle 2: test-2 (II) [unknown]' in message
+
+
+def test_work_stats_shared_dependencies(mock_tcs):
+    tcs = mock_tcs
+    p3 = MockParent({'ids': ['test3']})
+    tcs.chunks['test3'] = TimelineChunk(p3, 'test3', 'test3')
+    tc3 = tcs.chunks['test3']
+    tc3.time_deltas = [120, 60]
+    tc3.worked_minutes = {0: 60}
+    tc3.completeness = {0: 1.}
+    # test1 (I) -> test-2 (I), test3 (I) -> test-2 (I), test3 (II)
+    tcs.chunks['test1'].dependencies = {0: ['test-2', 'test3 (I)']}
+    tc3.dependencies = {0: ['test-2']}
+
+    compute_aliases(tcs)
+    tn = TimelineNode()
+    tn.resolve_all_dependencies(tcs)
+    tn.resolve_all_stats(tcs)
+
+    sn1 = tcs.chunks['test1'].get_submodule(0)
+    total = sn1.total_stats
+    assert sn1.num_descendants == 3
+    assert total['time_req'] == 60 + 60 + 120
+    assert total['minutes_worked'] == 30 + 60 + 60
+    assert total['done_time'] == 30 + 30 + 120
+    assert total['start_time'] == tcs.chunks['test1'].get_start_time(0)
+
+    sn3 = tc3.get_submodule(1)
+    combined = combine_work_stats([sn1, sn3])
+    assert combined['time_req'] == 60 + 60 + 120 + 60
+    assert combine_work_stats([sn1, tc3.get_submodule(0)]) == total
+    res = add_stats(combined)
+    assert abs(res['done'] - 0.6) < 1e-9
+
+
+def test_critical_path(mock_tcs):
+    from sphinxplugin import scheduling
+    tcs = mock_tcs
+    p3 = MockParent({'ids': ['test3']})
+    tcs.chunks['test3'] = TimelineChunk(p3, 'test3', 'test3')
+    tc3 = tcs.chunks['test3']
+    tc3.time_deltas = [240, 60]
+    # test1 (I) -> test-2 (I), test3 (II)
+    tcs.chunks['test1'].dependencies = {0: ['test-2', 'test3 (II)']}
+
+    compute_aliases(tcs)
+    tn = TimelineNode()
+    tn.resolve_all_dependencies(tcs)
+    sn1 = tcs.chunks['test1'].get_submodule(0)
+    sn2 = tcs.chunks['test-2'].get_submodule(0)
+    sn3 = tc3.get_submodule(0)
+    sn4 = tc3.get_submodule(1)
+
+    assert scheduling.schedule(tn.root_chunks) == 4.
+    expected = {
+        sn1: (1., 1.5, 3.5, 4.),
+        sn2: (0., 0.5, 3., 3.5),
+        sn3: (0., 4., 0., 4.),
+        sn4: (0., 1., 2.5, 3.5),
+    }
+    for sn, (es, ef, ls, lf) in expected.items():
+        s = sn.schedule
+        assert (s['es'], s['ef'], s['ls'], s['lf']) == (es, ef, ls, lf)
+        assert s['slack'] == ls - es
+
+    assert scheduling.critical_path([sn1]) == (1.5, set([sn1, sn4]))
+    assert scheduling.critical_path([sn1, sn3]) == (4., set([sn3]))
+
+    tn.milestone_nodes = [[sn1]]
+    tn.deadline_nodes = [[sn3], [sn2]]
+    tn.deadlines = [
+        {'time': datetime(2015, 1, 2)}, {'time': datetime(2015, 1, 2)}]
+    etas = tn.resolve_critical_paths(2, now=datetime(2015, 1, 1))
+    assert etas == ['2015-01-01', '2015-01-03 (at risk)', '2015-01-01']
+    assert [sn.important for sn in [sn1, sn2, sn3, sn4]] == [
+        True, True, True, True]
+
+
+def test_forecast(mock_tcs):
+    pytest.importorskip('numpy')
+    from sphinxplugin import forecast
+    tcs = mock_tcs
+    compute_aliases(tcs)
+    tn = TimelineNode()
+    tn.resolve_all_dependencies(tcs)
+    sn1 = tcs.chunks['test1'].get_submodule(0)
+    sn2 = tcs.chunks['test-2'].get_submodule(0)
+    assert forecast.work_factor(sn1) == 1.
+    assert forecast.work_factor(sn2) == 2.
+
+    # 0.5 hours left on both, with their own work factor of 1 and 2 times
+    # the spread of the observed factors, 1 / sqrt(2) or sqrt(2)
+    res = forecast.forecast([[sn1], [sn2], []], samples=2000, seed=1)
+    assert res == forecast.forecast([[sn1], [sn2], []], 2000, seed=1)
+    assert res[0] == sorted(res[0])
+    assert 1.5 / 2 ** .5 <= res[0][0] and res[0][2] == pytest.approx(
+        1.5 * 2 ** .5)
+    assert 2 ** -.5 <= res[1][0] and res[1][2] == pytest.approx(2 ** .5)
+    assert res[2] == [0., 0., 0.]
+
+    # without recorded work, test1 takes the factor observed on test-2
+    tcs.chunks['test1'].worked_minutes = {}
+    assert forecast.work_factor(sn1) is None
+    assert forecast.forecast([[sn1]], samples=10) == [[2., 2., 2.]]
+    tcs.chunks['test1'].worked_minutes = {0: 30}
+
+    tcs.chunks['test-2'].worked_minutes = {0: 30}
+    assert forecast.forecast([[sn1]], samples=10) == [[1., 1., 1.]]
+
+    tn.milestone_nodes = [[sn1]]
+    tn.deadline_nodes = []
+    tn.deadlines = []
+    assert tn.resolve_forecasts(
+        0.5, 10, 0, now=datetime(2015, 1, 1)) == [
+            ['2015-01-03', '2015-01-03', '2015-01-03']]
+
+
+def test_timeline_chunk_arrays():
+    import pickle
+    import cPickle
+    tc = TimelineChunk(None, 'test1', 'test1', 'index')
+    tc.time_deltas = [60, 120]
+    tc.parse_worked_on('2015-01-01: 1h 30 %', 'II')
+    tc.parse_worked_on('2014-12-24: 30min', 'II')
+    assert tc.completeness == {1: 0.3}
+    assert tc.start_times == {1: datetime(2014, 12, 24)}
+    assert tc.end_times == {}
+    assert tc.worked_minutes == {1: 90}
+    assert list(tc.entries[:4]) == [1, 23667840, 60, 0.3]
+    assert 0 not in tc.worked_minutes and tc.get_worked_minutes(0) == 0
+    with pytest.raises(KeyError):
+        tc.completeness[0]
+    assert not hasattr(tc, '__dict__')
+
+    tc.set_completeness(0, 1, datetime(2015, 1, 2, 10, 30, 15))
+    assert tc.end_times[0] == datetime(2015, 1, 2, 10, 30)
+
+    for module in [pickle, cPickle]:
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            tc2 = module.loads(module.dumps(tc, protocol))
+            assert list(tc2.time_deltas) == [60, 120]
+            for field in ['worked_minutes', 'start_times', 'end_times',
+                          'completeness']:
+                assert getattr(tc2, field) == getattr(tc, field)
+                assert type(getattr(tc2, field)) is type(getattr(tc, field))
+            assert tc2.title == 'test1'
+            assert tc2.entries.tostring() == tc.entries.tostring()
+
+
+def test_descriptions_numpy_matches_python():
+    pytest.importorskip('numpy')
+    import random
+    rnd = random.Random(42)
+    meta = [
+        {'time_req': 60, 'minutes_worked': 0, 'done': 0, 'time_worked': 0},
+        {'time_req': 60, 'minutes_worked': 30, 'done': 0, 'time_worked': 3},
+        {'time_req': 60, 'minutes_worked': 0, 'done': 0.5, 'time_worked': 3},
+        {'time_req': 60, 'minutes_worked': 90, 'done': 1., 'time_worked': 2},
+        {'time_req': 60, 'minutes_worked': 1, 'done': 1e-12,
+         'time_worked': 1e6},
+        {'time_req': 60, 'minutes_worked': 60, 'done': 3.,
+         'time_worked': 1e5},
+        {'time_req': 60, 'minutes_worked': 60, 'done': 0.5,
+         'time_worked': -0.5},
+    ]
+    for i in range(500):
+        meta.append({
+            'time_req': rnd.randint(1, 6000),
+            'minutes_worked': rnd.choice([0, rnd.randint(0, 9000)]),
+            'done': rnd.choice([0., 1., rnd.random()]),
+            'time_worked': rnd.choice([0., rnd.random(), rnd.random() * 200]),
+        })
+    names = ['Task {}'.format(i) for i in range(len(meta))]
+    now = datetime(2015, 3, 1, 12, 30)
+
+    expected = utils._make_descriptions_python(meta, names, now)
+    assert utils._make_descriptions_numpy(meta, names, now) == expected
+    tables = utils.make_descriptions_from_metas(
+        [meta[:3], [], meta[3:]], 'Task', now)
+    assert [len(t) for t in tables] == [3, 0, len(meta) - 3]
+    assert tables[2][0][0] == 'Task 1'
+    assert [row[1:] for row in tables[0] + tables[2]] == [
+        row[1:] for row in expected]
+
+
+@pytest.mark.parametrize('image_format', ['SVG', 'PNG'])
+def test_diagram_cache(image_format, monkeypatch, make_app):
+    from sphinxplugin import rendering
+    app = make_app(
+        'tests/docs/complete', blockdiag_html_image_format=image_format)
+    app.builder.build_all()
+    cache_dir = app.doctreedir / 'timeline_diagrams'
+    ext = image_format.lower()
+    cached = [f for f in cache_dir.listdir() if f.endswith('.' + ext)]
+    assert len(cached) == 1
+    assert not [f for f in cache_dir.listdir() if f.endswith('.diag')]
+    source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+
+    def fail(*args):
+        raise AssertionError('diagram rendered again')
+    monkeypatch.setattr(rendering, '_render_{}'.format(ext), fail)
+    app.builder.build_all()
+    assert (app.outdir / 'index.html').read_text(
+        encoding='utf-8') == source
+    if image_format == 'SVG':
+        assert '<svg' in source
+    else:
+        assert re.search(r'<img src="_images/timeline-\w+.png"', source)
+
+    # the diagram of the changed timeline replaces the old one
+    monkeypatch.undo()
+    index = app.srcdir / 'index.rst'
+    index.write_text(index.read_text(encoding='utf-8').replace(
+        'Milestones\n  ====', 'Goals\n  ===='), encoding='utf-8')
+    app.build()
+    changed = [f for f in cache_dir.listdir() if f.endswith('.' + ext)]
+    assert len(changed) == 1 and changed != cached
+    # an unchanged timeline keeps its diagram
+    app.build()
+    assert changed == [f for f in cache_dir.listdir() if f.endswith('.' + ext)]
+
+
+def test_timeline_graph(test_resolve_all_dependencies_2):
+    from sphinxplugin.timeline_graph import TimelineGraph
+    from sphinxplugin.backends import BlockdiagBackend
+    tcs, tn = test_resolve_all_dependencies_2
+    rc1 = tn.root_chunks[0]
+    rc1.set_rendered()
+    rc1.important = rc1.children[0].important = True
+    rc1.group = 'Milestone0'
+    groups = [{'id': 'Milestone0', 'label': 'Milestone 1', 'color': '#aaa'}]
+    graph = TimelineGraph.from_submodules(tn.root_chunks, groups)
+
+    assert sorted(graph.nodes) == ['test-2-I', 'test1-I']
+    assert graph.edges == [('test-2-I', 'test1-I', True)]
+    code = BlockdiagBackend().code(graph)
+    assert (
+        'test1-I [group = "Milestone0", linecolor = "red", '
+        'label = "test1 (I)", href = ":ref:`test1`"]' in code)
+    assert 'test-2-I -> test1-I [color = "red"]' in code
+    assert 'group Milestone0 {\n\t  label = "Milestone 1"' in code
+
+
+def test_svg_writer_layout():
+    from sphinxplugin.timeline_graph import TimelineGraph
+    from sphinxplugin import svg_writer
+    graph = TimelineGraph()
+    for name in 'abcde':
+        graph.add_node(name, name.upper(), href=name)
+    for source, target in ['ab', 'bc', 'ac', 'dc', 'ce']:
+        graph.add_edge(source, target, source == 'a')
+
+    assert svg_writer.assign_layers(graph) == [
+        ['a', 'd'], ['b'], ['c'], ['e']]
+    svg = svg_writer.write_svg(
+        graph, lambda target: None if target == 'e' else target + '.html')
+    assert svg.startswith('<svg ')
+    assert svg.count('<rect') == 5
+    assert svg.count('marker-end=') == 5
+    assert svg.count('<a xlink:href=') == 4
+
+
+def test_svg_backend_build(make_app):
+    app = make_app('tests/docs/complete', timeline_diagram_backend='svg')
+    app.builder.build_all()
+    source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+    assert '<svg xmlns="http://www.w3.org/2000/svg"' in source
+    assert 'Milestone task (I)' in source
+    assert not (app.doctreedir / 'timeline_diagrams').exists()
+
+
+def test_worklog(make_app):
+    app = make_app(
+        'tests/docs/parallel', timeline_worklogs=['work.csv', 'work.jsonl'])
+    (app.srcdir / 'work.csv').write_text(
+        u'task,date,time,done\n'
+        u'migrations,2015-02-01,1h,\n'
+        u'Migrations,2015-01-30,30min,50%\n'
+        u'server (II),2015-02-05,2h 15min,25\n'
+        u'unknown task,2015-02-05,1h,\n'
+        u'migrations,2015-02-01,1h,n/a\n'
+        u'migrations,someday,1h,\n'
+        u'migrations,2015-02-01,lots,\n')
+    (app.srcdir / 'work.jsonl').write_text(
+        u'{"task": "migrations", "date": "2015-02-02", "time": 0.5,'
+        u' "done": 100}\n')
+    app.builder.build_all()
+    warnings = app._warning.getvalue()
+    assert 'Could not resolve worklog task unknown task' in warnings
+    assert warnings.count('work.csv: ') == 3
+    assert "invalid done value u'n/a'" in warnings
+    tcs = app.env.timeline_chunks
+    migrations = tcs.chunks['migrations']
+    assert migrations.get_worked_minutes(0) == 120
+    assert migrations.get_completeness(0) == 1.
+    assert migrations.get_start_time(0) == datetime(2015, 1, 30)
+    assert migrations.get_end_time(0) == datetime(2015, 2, 2)
+    server = tcs.chunks['server']
+    assert server.get_worked_minutes(0) == 180
+    assert server.get_worked_minutes(1) == 135
+    assert server.get_completeness(1) == 0.25
+
+    # unchanged worklogs are neither re-read nor added twice
+    cached = tcs.worklogs
+    (app.srcdir / 'database.rst').write_text(
+        (app.srcdir / 'database.rst').read_text() + u'\n')
+    app.builder.build_update()
+    assert tcs.worklogs == cached
+    assert tcs.chunks['migrations'].get_worked_minutes(0) == 120
+    assert tcs.chunks['server'].get_worked_minutes(1) == 135
+
+    (app.srcdir / 'work.jsonl').write_text(u'')
+    app.builder.build_update()
+    assert tcs.chunks['migrations'].get_worked_minutes(0) == 90
+    assert tcs.chunks['migrations'].get_completeness(0) == .5
+    assert tcs.chunks['server'].get_worked_minutes(1) == 135
+
+
+@pytest.mark.parametrize('row, message', [
+    ({'task': 'a', 'done': 'n/a'}, "invalid done value 'n/a'"),
+    ({'task': 'a', 'date': 'someday'}, "invalid date 'someday'"),
+    ({'task': 'a', 'time': 'lots'},
+     "Could not parse the time string u'lots': no time given at position 0"),
+])
+def test_worklog_row_errors(row, message):
+    from sphinxplugin.worklog import parse_row
+    with pytest.raises(ValueError) as excinfo:
+        parse_row(row)
+    assert str(excinfo.value) == message
+
+
+def test_entry_store(make_app):
+    from sphinxplugin.entry_store import EntryStore
+    app = make_app(
+        'tests/docs/parallel',
+        timeline_entry_store='timeline/entries.bin',
+        timeline_worklogs=['work.csv'])
+    (app.srcdir / 'work.csv').write_text(
+        u'task,date,time,done\n'
+        u'migrations,2015-02-01,1h,\n'
+        u'migrations,2015-02-01,30min,\n'
+        u'migrations,2015-02-03,,100%\n')
+    app.builder.build_all()
+    path = app.outdir / 'timeline' / 'entries.bin'
+    with EntryStore(path) as store:
+        assert store.tasks == sorted(app.env.timeline_chunks.chunks)
+        assert list(store.iter_entries('server')) == [
+            (0, datetime(2015, 2, 2), 120, pytest.approx(0.4)),
+            (0, datetime(2015, 2, 3), 60, pytest.approx(0.6))]
+        assert list(store.iter_entries('migrations')) == [
+            (0, datetime(2015, 2, 1), 90, None),
+            (0, datetime(2015, 2, 3), 0, 1.)]
+        assert list(store.iter_entries('widgets')) == []
+        assert len(store) == sum(
+            len(tc.entries) // 4
+            for tc in app.env.timeline_chunks.chunks.values())
+        assert len(store.buffer('server')) == 40
+
+        pytest.importorskip('numpy')
+        entries = store.entries('server')
+        assert entries.base is store.map
+        assert list(entries['minutes']) == [120, 60]
+        assert list(entries['task']) == [store.ids['server']] * 2
+
+
+def test_entry_store_rebuild(make_app):
+    from sphinxplugin.entry_store import EntryStore
+    app = make_app(
+        'tests/docs/parallel',
+        timeline_entry_store='timeline/entries.bin',
+        timeline_worklogs=['work.csv'])
+    (app.srcdir / 'work.csv').write_text(
+        u'task,date,time,done\n'
+        u'migrations,2015-02-01,90min,\n')
+    app.builder.build_all()
+    path = app.outdir / 'timeline' / 'entries.bin'
+
+    # a reader of the previous store is not affected by a rebuild
+    with EntryStore(path) as store:
+        (app.srcdir / 'work.csv').write_text(
+            u'task,date,time,done\n'
+            u'migrations,2015-02-01,5h,\n')
+        app.builder.build_all()
+        assert list(store.iter_entries('migrations'))[0][2] == 90
+    with EntryStore(path) as store:
+        assert list(store.iter_entries('migrations')) == [
+            (0, datetime(2015, 2, 1), 300, None)]
+    assert sorted(os.listdir(app.outdir / 'timeline')) == [
+        'entries.bin', 'entries.bin.idx']
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('Project timeline (II) 2h 60%', ('Project timeline (II)', '2h', '60')),
+    ('milestone 2 1.5 hrs', ('milestone 2', '1.5 hrs', None)),
+    ('milestone 2 3h', ('milestone 2', '3h', None)),
+    ('server (II): 2 hrs 30 min 25 %', ('server (II)', '2 hrs 30 min', '25')),
+    ('layout 100%', ('layout', None, '100')),
+])
+def test_split_trailer(value, expected):
+    from sphinxplugin.git_worklog import split_trailer
+    assert split_trailer(value) == expected
+
+
+def test_git_worklog(make_app):
+    import subprocess
+    app = make_app('tests/docs/parallel', timeline_git_worklog='.')
+
+    def commit(message, date):
+        env = dict(os.environ, GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date)
+        subprocess.check_call(
+            ['git', '-c', 'user.name=test', '-c', 'user.email=test@test',
+             'commit', '-q', '--allow-empty', '-m', message],
+            cwd=app.srcdir, env=env)
+
+    subprocess.check_call(['git', 'init', '-q'], cwd=app.srcdir)
+    commit('Add migrations\n\nWorked-on: migrations 1h 50%',
+           '2015-02-01T12:00:00')
+    commit('Fix the server\n\nWorked-on: server (II) 2h\n'
+           'Worked-on: migrations: 30min', '2015-02-03T12:00:00')
+    app.builder.build_all()
+    tcs = app.env.timeline_chunks
+    migrations = tcs.chunks['migrations']
+    assert migrations.get_worked_minutes(0) == 90
+    assert migrations.get_completeness(0) == .5
+    assert migrations.get_start_time(0) == datetime(2015, 2, 1)
+    assert tcs.chunks['server'].get_worked_minutes(1) == 120
+    assert len(tcs.git_commits) == 2
+    cached = dict(tcs.git_commits)
+
+    commit('Finish migrations\n\nWorked-on: migrations 15min 100%',
+           '2015-02-04T12:00:00')
+    read = dict(app.env.all_docs)
+    app.builder.build_update()
+    # only the document of the task and the timeline reading it
+    assert set(
+        name for name, mtime in app.env.all_docs.iteritems()
+        if mtime != read.get(name)) == set(['database', 'index'])
+    assert tcs.chunks['migrations'].get_worked_minutes(0) == 105
+    assert tcs.chunks['migrations'].get_completeness(0) == 1.
+    assert tcs.chunks['server'].get_worked_minutes(1) == 120
+    assert len(tcs.git_commits) == 3
+    for sha, value in cached.iteritems():
+        assert tcs.git_commits[sha] is value
+
+
+def test_git_worklog_failure(tmpdir, monkeypatch):
+    import subprocess
+    from sphinxplugin import git_worklog
+    repo = str(tmpdir)
+    subprocess.check_call(['git', 'init', '-q'], cwd=repo)
+    subprocess.check_call(
+        ['git', '-c', 'user.name=test', '-c', 'user.email=test@test',
+         'commit', '-q', '--allow-empty', '-m',
+         'Start\n\nWorked-on: task 1h'], cwd=repo)
+    with pytest.raises(git_worklog.GitError):
+        list(git_worklog.iter_commits(repo, ['no-such-revision']))
+
+    def failing(repo, revisions):
+        yield ('0' * 40, 0, [u'task 2h'])
+        raise git_worklog.GitError('git log failed')
+    monkeypatch.setattr(git_worklog, 'iter_commits', failing)
+    tcs = TimelineChunksContainer()
+    assert git_worklog.read_git_worklog(tcs, repo) == []
+    assert tcs.git_head is None and tcs.git_commits == {}
+
+
+def test_sqlite_store(make_app):
+    from sphinxplugin.sqlite_store import TimelineStore
+    app = make_app('tests/docs/parallel', timeline_sqlite='timeline.sqlite')
+    app.builder.build_all()
+    store = TimelineStore(app.outdir / 'timeline.sqlite')
+    assert store.documents() == set(
+        ['backend', 'database', 'docs', 'frontend', 'release',
+         'research'])
+    assert store.resolve_alias('Backend work') == ['api', 'server']
+    assert [row[:2] for row in store.open_tasks_blocking(2)] == [
+        ('api', 0), ('layout', 0), ('server', 0), ('server', 1),
+        ('user-documentation', 1), ('widgets', 0)]
+    assert [row[0] for row in store.open_tasks_blocking(
+        1, 'deadline')] == ['api', 'layout', 'server', 'widgets']
+    assert store.hours_logged(
+        datetime(2015, 2, 1), datetime(2015, 2, 8)) == 3.5
+    assert store.connection.execute(
+        'SELECT total_requested FROM stats WHERE chunk = ?',
+        ('migrations',)).fetchall() == [(360,)]
+
+    # a document read again is replaced in the store
+    (app.srcdir / 'database.rst').write_text(
+        (app.srcdir / 'database.rst').read_text().replace(
+            '2 hrs', '3 hrs'))
+    app.builder.build_update()
+    assert store.connection.execute(
+        'SELECT requested FROM submodules WHERE chunk = ?',
+        ('migrations',)).fetchall() == [(180,)]
+    assert store.connection.execute(
+        'SELECT COUNT(*) FROM entries WHERE chunk = ?',
+        ('database-schema',)).fetchall() == [(2,)]
+    store.close()
+
+
+def test_timeline_builder(make_app):
+    import csv
+    import json
+    app = make_app('tests/docs/parallel', buildername='timeline')
+    app.builder.build_all()
+    assert sorted(os.listdir(app.outdir)) == [
+        'milestones.csv', 'submodules.csv', 'timeline.jsonl']
+    with open(app.outdir / 'timeline.jsonl') as f:
+        records = [json.loads(line) for line in f]
+    submodules = dict(
+        (r['id'], r) for r in records if r['type'] == 'submodule')
+    assert submodules['server (II)']['dependencies'] == [
+        'database-schema (I)']
+    assert submodules['server (I)']['worked_hours'] == 3.
+    assert submodules['server (I)']['done'] == .6
+    assert submodules['api (I)']['total_requested_hours'] == 9.
+    assert submodules['widgets (I)']['critical']
+    edges = set(
+        (r['from'], r['to']) for r in records if r['type'] == 'edge')
+    assert ('layout (I)', 'widgets (I)') in edges
+    deadlines = [r for r in records if r['type'] == 'deadline']
+    assert len(deadlines) == 1
+    assert deadlines[0]['at_risk']
+    assert deadlines[0]['tasks'] == ['widgets (I)']
+
+    with open(app.outdir / 'milestones.csv', 'rb') as f:
+        rows = list(csv.DictReader(f))
+    assert [(r['kind'], r['number']) for r in rows] == [
+        ('milestone', '1'), ('milestone', '2'), ('deadline', '1')]
+    assert float(rows[2]['requested_hours']) == deadlines[0][
+        'requested_hours']
+    with open(app.outdir / 'submodules.csv', 'rb') as f:
+        assert len(list(csv.DictReader(f))) == len(submodules)
+
+
+def test_incremental_stats(mock_tcs):
+    tcs = mock_tcs
+    p3 = MockParent({'ids': ['test3']})
+    tcs.chunks['test3'] = TimelineChunk(p3, 'test3', 'test3')
+    tcs.chunks['test3'].time_deltas = [30]
+    compute_aliases(tcs)
+
+    def resolve():
+        tn = TimelineNode()
+        tn.resolve_all_dependencies(tcs)
+        tn.resolve_all_stats(tcs)
+        return dict(
+            (key, tc.get_submodule(0).total_stats)
+            for key, tc in tcs.chunks.iteritems())
+
+    first = resolve()
+    assert sorted(tcs.stats_cache) == sorted(
+        sn.symbol for sn in tcs.submodule_nodes)
+    second = resolve()
+    for key in first:
+        assert second[key] is first[key]
+
+    # only the changed chunk and the chunks depending on it are recomputed
+    tcs.chunks['test-2'].worked_minutes = {0: 90}
+    third = resolve()
+    assert third['test3'] is first['test3']
+    assert third['test-2'] is not first['test-2']
+    assert third['test1'] is not first['test1']
+    assert third['test1']['minutes_worked'] == 30 + 90
+    assert tcs.chunks['test-2'].stats[0]['minutes_worked'] == 90
+
+    # as are chunks whose dependencies changed
+    tcs.chunks['test3'].dependencies = {0: ['test-2']}
+    fourth = resolve()
+    assert fourth['test1'] is third['test1']
+    assert fourth['test3']['time_req'] == 90
+    assert fourth['test3']['minutes_worked'] == 90
+
+    # the ids of removed chunks are reused, so renames do not grow the table
+    for i in range(10):
+        tcs._remove_chunk('renamed{}'.format(i - 1) if i else 'test3')
+        name = 'renamed{}'.format(i)
+        tc = TimelineChunk(MockParent({'ids': [name]}), name, name)
+        tc.time_deltas = [30 + i]
+        tc.dependencies = {0: ['test-2']}
+        tcs._register_chunk(name, tc)
+        tcs.update_aliases()
+        stats = resolve()
+        assert stats[name]['time_req'] == 90 + i
+        assert stats['test1'] is fourth['test1']
+        assert len(tcs.symbols) == 3
+
+
+def test_stat_table_cache(make_app):
+    app = make_app('tests/docs/parallel')
+    app.builder.build_all()
+    tcs = app.env.timeline_chunks
+    tables = dict(tcs.table_cache)
+    assert 'benchmarks' in tables and 'release-notes' in tables
+
+    (app.srcdir / 'research.rst').write_text(
+        (app.srcdir / 'research.rst').read_text().replace(
+            '90 min', '2 hrs'))
+    app.builder.build_all()
+    tcs = app.env.timeline_chunks
+    assert tcs.table_cache['release-notes'] is tables['release-notes']
+    assert tcs.table_cache['benchmarks'] is not tables['benchmarks']
+    assert tcs.table_cache['benchmarks'][1][0][1] == '2.00 h'
+
+
+def test_timeline_registry(make_app):
+    app = make_app('tests/docs/parallel')
+    app.builder.build_all()
+    tcs = app.env.timeline_chunks
+    assert tcs.timeline_docs == set(['index'])
+    assert tcs.timeline_reads['index'] == set(
+        ['backend', 'database', 'docs', 'frontend', 'release'])
+    assert tcs.table_docs['database'] == set(
+        ['database-schema', 'migrations'])
+    assert tcs.outdated_docs(set(), set(['research']), set()) == set()
+    assert tcs.outdated_docs(set(), set(['database']), set()) == set(
+        ['index'])
+    assert tcs.outdated_docs(set(['new']), set(), set()) == set(
+        ['index'])
+
+    def rebuild(docname, old, new):
+        path = app.srcdir / (docname + '.rst')
+        path.write_text(path.read_text().replace(old, new))
+        read = dict(app.env.all_docs)
+        app.builder.build_update()
+        return set(
+            name for name, mtime in app.env.all_docs.iteritems()
+            if mtime != read.get(name))
+
+    assert rebuild('database', '1 hrs 100%', '2 hrs 100%') == set(
+        ['database', 'index'])
+    assert rebuild('research', '1 hrs 50%', '1 hrs 60%') == set(
+        ['research'])
+
+
+def test_timeline_snapshot(make_app):
+    import pickle
+    from sphinxplugin.processing import TimelineSnapshot
+    app = make_app('tests/docs/parallel', parallel=2)
+    app.builder.build_all()
+    tcs = app.env.timeline_chunks
+    snapshot = app.env.timeline_snapshot
+    assert isinstance(snapshot, TimelineSnapshot)
+    assert sorted(snapshot.timelines) == ['index']
+    graph = snapshot.timelines['index'].graph
+    assert graph.nodes['widgets-I']['important']
+    assert len(snapshot.timelines['index'].rows) == 3
+    assert sorted(snapshot.tables) == sorted(
+        key for keys in tcs.table_docs.itervalues() for key in keys)
+
+    # the submodule nodes are not kept after the resolution
+    assert tcs.submodule_nodes == []
+    copy = pickle.loads(pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL))
+    assert copy.tables == snapshot.tables
+    assert copy.timelines['index'].rows == snapshot.timelines[
+        'index'].rows
+    assert copy.timelines['index'].graph.nodes == graph.nodes
+
+    # pages written before the timeline page have their stat tables
+    backend = (app.outdir / 'backend.html').read_text(encoding='utf-8')
+    assert 'Requested time' in backend
+
+
+def test_render_jobs(tmpdir):
+    from sphinxplugin import rendering
+    config = rendering.RenderConfig(False, False, None, None)
+    codes = [
+        'blockdiag {{ a{0} -> b{0} -> c{0} }}\n'.format(i) for i in range(3)]
+    caches = []
+    for workers in [1, 2]:
+        cache = rendering.DiagramCache(str(tmpdir.join(str(workers))))
+        jobs = [cache.write_code('SVG', config, lambda sink: sink.write(code))
+                for code in codes]
+        jobs = [(key, 'SVG', codename) for key, codename in jobs]
+        rendering.render_jobs(cache, config, jobs, workers)
+        caches.append([cache.read(key, 'svg') for key, _, _ in jobs])
+        assert not any(os.path.exists(job[2]) for job in jobs)
+    assert caches[0] == caches[1]
+    assert all('<svg' in svg for svg in caches[1])
+
+
+def test_render_workers(make_app):
+    app = make_app('tests/docs/complete', timeline_render_workers=2)
+    app.builder.build_all()
+    cache_dir = app.doctreedir / 'timeline_diagrams'
+    assert len([f for f in cache_dir.listdir() if f.endswith('.svg')]) == 1
+    source = (app.outdir / 'index.html').read_text(encoding='utf-8')
+    assert '<svg' in source
+
+
+def test_blockdiag_write_code(test_resolve_all_dependencies_2):
+    from StringIO import StringIO
+    from sphinxplugin.timeline_graph import TimelineGraph
+    from sphinxplugin.backends import BlockdiagBackend
+    tcs, tn = test_resolve_all_dependencies_2
+    for rc in tn.root_chunks:
+        rc.set_rendered()
+    graph = TimelineGraph.from_submodules(tn.root_chunks)
+    backend = BlockdiagBackend()
+    sink = StringIO()
+    backend.write_code(graph, sink)
+    assert sink.getvalue() == backend.code(graph)
+    lines = list(backend.iter_lines(graph))
+    assert len(lines) == 2 + len(graph.nodes) + len(graph.edges)
+
+
+def test_edge_lines_deep_chain():
+    # deeper than the recursion limit
+    length = 3000
+    tcs = TimelineChunksContainer()
+    for i in range(length):
+        name = 'chain{}'.format(i)
+        tc = TimelineChunk(
+            MockParent({'ids': [name]}), name, name, container=tcs)
+        tc.time_deltas = [60]
+        if i + 1 < length:
+            tc.dependencies = {0: ['chain{}'.format(i + 1)]}
+        tcs.chunks[name] = tc
+    compute_aliases(tcs)
+
+    tn = TimelineNode()
+    tn.resolve_all_dependencies(tcs)
+    nodes, lines = blockdiag_lines(tn.root_chunks)
+    assert len(lines) == length - 1
+    assert lines[0] == 'chain1-I -> chain0-I'
+
+
+def test_own_stats_sum(test_resolve_all_dependencies_2):
+    from sphinxplugin.submodule_node import OwnStats
+    tcs, tn = test_resolve_all_dependencies_2
+    tcs.chunks['test1'].worked_minutes = {1: 45}
+    own_stats = OwnStats(tcs)
+    mask = 0
+    for sn in tcs.submodule_nodes:
+        mask |= 1 << sn.symbol
+    summed = own_stats.sum(mask)
+    assert summed['time_req'] == sum(
+        tc.get_requested_time(sm) for tc in tcs.chunks.values()
+        for sm in range(tc.num_submodules()))
+    assert summed['minutes_worked'] == 60 + 45
+    assert summed['start_time'] == tcs.chunks['test1'].get_start_time(0)
+    own_stats.arrays = None
+    assert own_stats.sum(mask) == summed